@@ -51,6 +51,7 @@ def create_app(config_name=None):
     from routes.debug import debug_bp
     from routes.documents import documents_bp
     from routes.database import database_bp
+    from routes.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -70,6 +71,7 @@ def create_app(config_name=None):
     app.register_blueprint(debug_bp, url_prefix='/api/debug')
     app.register_blueprint(documents_bp, url_prefix='/api/documents')
     app.register_blueprint(database_bp, url_prefix='/api/database')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
     
     # Register template routes
     from routes.templates import templates_bp
@@ -161,6 +163,10 @@ def create_app(config_name=None):
         except Exception as e:
             print(f"Error creating database tables: {str(e)}")
     
+    if app.config.get('SMS_DISPATCHER_THREAD'):
+        from services.sms_outbox import start_dispatcher_thread
+        start_dispatcher_thread(app)
+    
     return app
 
 if __name__ == '__main__':
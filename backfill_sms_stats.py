@@ -0,0 +1,22 @@
+"""
+Backfill script to build the sms_daily_stats rollup from the SMS log history
+"""
+from app import create_app
+from models import db
+from services.sms_stats import backfill_sms_stats
+
+def backfill():
+    """Rebuild sms_daily_stats from sms_logs (stop the SMS dispatchers first)"""
+    app = create_app()
+    with app.app_context():
+        try:
+            print("📝 Building daily SMS statistics from sms_logs...")
+            written = backfill_sms_stats()
+            print(f"✅ Wrote {written} daily statistics rows!")
+            
+        except Exception as e:
+            print(f"❌ Error during backfill: {e}")
+            db.session.rollback()
+
+if __name__ == '__main__':
+    backfill()
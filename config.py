@@ -18,6 +18,24 @@ class Config:
     # File upload configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = 'static/uploads'
+    
+    # Report card rendering (0 = one worker per CPU, capped at 4; 1 = render in the job thread)
+    REPORT_CARD_WORKERS = int(os.environ.get('REPORT_CARD_WORKERS') or 0)
+    
+    # BulkSMSBD gateway (requests per second and burst are per process; 0 = unlimited)
+    SMS_API_KEY = os.environ.get('BULKSMSBD_API_KEY') or 'gsOKLO6XtKsANCvgPHNt'
+    SMS_SENDER_ID = os.environ.get('BULKSMSBD_SENDER_ID') or '8809617628909'
+    SMS_API_URL = os.environ.get('BULKSMSBD_API_URL') or 'http://bulksmsbd.net/api/smsapi'
+    SMS_BALANCE_URL = os.environ.get('BULKSMSBD_BALANCE_URL') or 'http://bulksmsbd.net/api/getBalanceApi'
+    SMS_RATE_PER_SECOND = float(os.environ.get('SMS_RATE_PER_SECOND') or 30)
+    SMS_RATE_BURST = int(os.environ.get('SMS_RATE_BURST') or 30)
+    SMS_MAX_WORKERS = int(os.environ.get('SMS_MAX_WORKERS') or 8)
+    SMS_TIMEOUT = int(os.environ.get('SMS_TIMEOUT') or 30)
+    SMS_MULTI_RECIPIENT_CHUNK = int(os.environ.get('SMS_MULTI_RECIPIENT_CHUNK') or 100)  # Numbers per one-to-many request
+    SMS_COALESCE_MAX_SEGMENTS = int(os.environ.get('SMS_COALESCE_MAX_SEGMENTS') or 2)  # Longest merged message to one number
+
+    # Queued SMS are sent by sms_dispatcher.py; set to true to also run a dispatcher thread in each app process
+    SMS_DISPATCHER_THREAD = os.environ.get('SMS_DISPATCHER_THREAD', 'false').lower() == 'true'
 
 class DevelopmentConfig(Config):
     """Development configuration with SQLite"""
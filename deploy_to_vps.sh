@@ -30,16 +30,21 @@ cat <<'INSTRUCTIONS'
 4. Restart the Flask/Gunicorn service:
    ─────────────────────────────────────────────────────────────
    Option A - If using systemd service:
-   sudo systemctl restart saro
-   sudo systemctl status saro
+   sudo systemctl restart saro saro-sms
+   sudo systemctl status saro saro-sms
 
    Option B - If using supervisor:
-   sudo supervisorctl restart saro
-   sudo supervisorctl status saro
+   sudo supervisorctl restart saro saro-sms
+   sudo supervisorctl status saro saro-sms
 
    Option C - If running manually:
    pkill -f gunicorn
+   pkill -f sms_dispatcher.py
    gunicorn --config gunicorn.conf.py app:app --daemon
+   nohup python sms_dispatcher.py > sms_dispatcher.log 2>&1 &
+
+   SMS are only sent while the SMS dispatcher (sms_dispatcher.py,
+   service saro-sms) is running, so restart it with the web service.
 
 5. Check logs if service doesn't start:
    ─────────────────────────────────────────────────────────────
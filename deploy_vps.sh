@@ -17,12 +17,14 @@ NC='\033[0m' # No Color
 PROJECT_DIR="/var/www/saroyarsir"
 VENV_DIR="$PROJECT_DIR/venv"
 SERVICE_NAME="saro"
+SMS_SERVICE_NAME="saro-sms"
 
 echo -e "${YELLOW}Step 1: Stopping existing services...${NC}"
 pkill -f "flask run" || true
 pkill -f "python run.py" || true
 pkill -f "gunicorn" || true
 sudo systemctl stop $SERVICE_NAME 2>/dev/null || true
+sudo systemctl stop $SMS_SERVICE_NAME 2>/dev/null || true
 
 echo -e "${GREEN}✓ Services stopped${NC}"
 
@@ -89,11 +91,34 @@ WantedBy=multi-user.target
 EOF
 echo -e "${GREEN}✓ Service file created${NC}"
 
-echo -e "${YELLOW}Step 10: Enabling and starting service...${NC}"
+# SMS are queued in sms_outbox by the web workers and only sent by this dispatcher
+sudo tee /etc/systemd/system/$SMS_SERVICE_NAME.service > /dev/null <<EOF
+[Unit]
+Description=SmartGardenHub SMS Dispatcher
+After=network.target $SERVICE_NAME.service
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory=$PROJECT_DIR
+Environment="PATH=$VENV_DIR/bin"
+Environment="PYTHONUNBUFFERED=1"
+ExecStart=$VENV_DIR/bin/python sms_dispatcher.py
+TimeoutStopSec=30
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+echo -e "${GREEN}✓ SMS dispatcher service file created${NC}"
+
+echo -e "${YELLOW}Step 10: Enabling and starting services...${NC}"
 sudo systemctl daemon-reload
-sudo systemctl enable $SERVICE_NAME
+sudo systemctl enable $SERVICE_NAME $SMS_SERVICE_NAME
 sudo systemctl start $SERVICE_NAME
-echo -e "${GREEN}✓ Service started${NC}"
+sudo systemctl start $SMS_SERVICE_NAME
+echo -e "${GREEN}✓ Services started${NC}"
 
 echo ""
 echo "========================================"
@@ -102,12 +127,15 @@ echo "========================================"
 echo ""
 echo "📊 Service Status:"
 sudo systemctl status $SERVICE_NAME --no-pager
+sudo systemctl status $SMS_SERVICE_NAME --no-pager
 echo ""
 echo "📝 Useful Commands:"
 echo "  View logs:        sudo journalctl -u $SERVICE_NAME -f"
 echo "  Restart service:  sudo systemctl restart $SERVICE_NAME"
 echo "  Stop service:     sudo systemctl stop $SERVICE_NAME"
 echo "  Check status:     sudo systemctl status $SERVICE_NAME"
+echo "  SMS dispatcher:   sudo systemctl restart $SMS_SERVICE_NAME"
+echo "  SMS logs:         sudo journalctl -u $SMS_SERVICE_NAME -f"
 echo ""
 echo "🌐 Application URL: http://your-vps-ip:5000"
 echo ""
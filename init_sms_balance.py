@@ -1,38 +1,28 @@
 #!/usr/bin/env python3
 """
-Initialize SMS Balance in Settings
-Set the starting balance to 989 SMS
+Initialize SMS Balance
+Set the starting balance to 989 SMS in the balance ledger
 """
 
 from app import create_app, db
-from models import Settings
+from models import SmsBalanceEntry
+from services.sms_balance import get_sms_balance, set_sms_balance
 
 app = create_app()
 
 def init_sms_balance():
     with app.app_context():
-        # Check if balance setting exists
-        balance_setting = Settings.query.filter_by(key='sms_balance').first()
-        
-        if balance_setting:
-            print(f"Current SMS balance: {balance_setting.value.get('balance', 0)}")
+        # Check if the ledger has any entries
+        if db.session.query(SmsBalanceEntry.id).first():
+            print(f"Current SMS balance: {get_sms_balance()}")
             response = input("Do you want to update it to 989? (y/n): ")
             if response.lower() == 'y':
-                balance_setting.value = {'balance': 989}
-                db.session.commit()
+                set_sms_balance(989)
                 print("✅ SMS balance updated to 989")
             else:
                 print("❌ Balance not changed")
         else:
-            # Create new balance setting
-            balance_setting = Settings(
-                key='sms_balance',
-                value={'balance': 989},
-                category='sms',
-                description='Current SMS balance - tracks locally'
-            )
-            db.session.add(balance_setting)
-            db.session.commit()
+            set_sms_balance(989)
             print("✅ SMS balance initialized to 989")
 
 if __name__ == "__main__":
@@ -40,4 +30,4 @@ if __name__ == "__main__":
     print("=" * 50)
     init_sms_balance()
     print("=" * 50)
-    print("Done! Balance is now stored locally in Settings table")
+    print("Done! Balance is now stored locally in the sms_balance_ledger table")
@@ -0,0 +1,40 @@
+"""
+Migration script to add soft-delete columns to monthly_exams table
+"""
+from app import create_app
+from models import db
+from sqlalchemy import text
+
+def migrate():
+    """Add is_deleted and deleted_at columns to monthly_exams table"""
+    app = create_app()
+    with app.app_context():
+        try:
+            # Check which columns already exist
+            from sqlalchemy import inspect
+            inspector = inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('monthly_exams')]
+            
+            if 'is_deleted' in columns and 'deleted_at' in columns:
+                print("✅ Soft-delete columns already exist in monthly_exams table")
+                return
+            
+            if 'is_deleted' not in columns:
+                print("📝 Adding 'is_deleted' column to monthly_exams table...")
+                db.session.execute(
+                    text('ALTER TABLE monthly_exams ADD COLUMN is_deleted BOOLEAN NOT NULL DEFAULT FALSE')
+                )
+            if 'deleted_at' not in columns:
+                print("📝 Adding 'deleted_at' column to monthly_exams table...")
+                db.session.execute(
+                    text('ALTER TABLE monthly_exams ADD COLUMN deleted_at DATETIME NULL')
+                )
+            db.session.commit()
+            print("✅ Successfully added soft-delete columns!")
+            
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate()
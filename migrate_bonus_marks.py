@@ -0,0 +1,22 @@
+"""
+Migration script to move bonus marks from Settings JSON blobs into the monthly_bonus_marks table
+"""
+from app import create_app
+from models import db
+from services.bonus_marks import migrate_settings_bonus_marks
+
+def migrate():
+    """Copy monthly_exam_bonus_<id> settings into monthly_bonus_marks and remove them"""
+    app = create_app()
+    with app.app_context():
+        try:
+            print("📝 Moving bonus marks from settings to monthly_bonus_marks...")
+            migrated = migrate_settings_bonus_marks()
+            print(f"✅ Migrated {migrated} bonus mark entries!")
+            
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,33 @@
+"""
+Migration script to move the SMS balance from Settings into the sms_balance_ledger table
+"""
+from app import create_app
+from models import db
+from sqlalchemy import text
+from services.sms_balance import ensure_opening_balance, get_sms_balance
+
+def migrate():
+    """Add the cost column to sms_outbox and open the ledger with the current Settings balance"""
+    app = create_app()
+    with app.app_context():
+        try:
+            from sqlalchemy import inspect
+            inspector = inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('sms_outbox')]
+            
+            if 'cost' not in columns:
+                print("📝 Adding 'cost' column to sms_outbox table...")
+                db.session.execute(text('ALTER TABLE sms_outbox ADD COLUMN cost INTEGER NOT NULL DEFAULT 1'))
+                db.session.commit()
+            
+            print("📝 Opening SMS balance ledger from settings...")
+            if ensure_opening_balance():
+                db.session.commit()
+            print(f"✅ SMS balance ledger ready, balance: {get_sms_balance()}")
+            
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,56 @@
+"""
+Migration script to add the phone search column and keyset pagination indexes to sms_logs
+"""
+from app import create_app
+from models import db, SmsLog
+from sqlalchemy import text, update
+
+BACKFILL_CHUNK_SIZE = 1000
+
+def migrate():
+    """Add and backfill sms_logs.phone_normalized, then create the sms_logs indexes"""
+    app = create_app()
+    with app.app_context():
+        try:
+            from sqlalchemy import inspect
+            inspector = inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('sms_logs')]
+
+            if 'phone_normalized' not in columns:
+                print("📝 Adding 'phone_normalized' column to sms_logs table...")
+                db.session.execute(text('ALTER TABLE sms_logs ADD COLUMN phone_normalized VARCHAR(20) NULL'))
+                db.session.commit()
+
+            print("📝 Backfilling normalized phone numbers...")
+            backfilled = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(SmsLog.id, SmsLog.phone_number).filter(
+                    SmsLog.id > last_id, SmsLog.phone_normalized.is_(None)
+                ).order_by(SmsLog.id).limit(BACKFILL_CHUNK_SIZE).all()
+                if not rows:
+                    break
+                # ORM bulk UPDATE by primary key: one executemany per chunk
+                db.session.execute(update(SmsLog), [
+                    {'id': log_id, 'phone_normalized': SmsLog.normalize_phone(phone_number)}
+                    for log_id, phone_number in rows
+                ])
+                db.session.commit()
+                backfilled += len(rows)
+                last_id = rows[-1].id
+            print(f"   {backfilled} logs backfilled")
+
+            existing = {index['name'] for index in inspect(db.engine).get_indexes('sms_logs')}
+            for index in SmsLog.__table__.indexes:
+                if index.name not in existing:
+                    print(f"📝 Creating index {index.name}...")
+                    index.create(db.engine)
+
+            print("✅ sms_logs indexes ready!")
+
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            db.session.rollback()
+
+if __name__ == '__main__':
+    migrate()
@@ -6,6 +6,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
 from enum import Enum
 from sqlalchemy import Numeric
+from sqlalchemy.orm import validates
 import json
 
 db = SQLAlchemy()
@@ -322,11 +323,33 @@ class SmsLog(db.Model):
     cost = db.Column(Numeric(5, 2), default=0.00)
     sent_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Digits after the 880/0 prefix (1XXXXXXXXX), kept in sync with phone_number for prefix search
+    phone_normalized = db.Column(db.String(20), nullable=True, index=True)
     
     # Relationships
     user = db.relationship('User', back_populates='sms_logs', foreign_keys=[user_id])
     sent_by_user = db.relationship('User', foreign_keys=[sent_by])
     
+    # Newest-first listing and keyset pagination on (created_at, id), optionally per status or sender
+    __table_args__ = (
+        db.Index('ix_sms_logs_created', 'created_at', 'id'),
+        db.Index('ix_sms_logs_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_sms_logs_sender_created', 'sent_by', 'created_at', 'id'),
+    )
+    
+    @staticmethod
+    def normalize_phone(phone):
+        """Search key of a phone number or number prefix: digits without the 88 country code or leading 0"""
+        digits = ''.join(char for char in str(phone or '') if char.isdigit())
+        if digits.startswith('88'):
+            digits = digits[2:]
+        return digits.lstrip('0')
+    
+    @validates('phone_number')
+    def _sync_phone_normalized(self, key, phone_number):
+        self.phone_normalized = SmsLog.normalize_phone(phone_number)
+        return phone_number
+    
     def __repr__(self):
         return f'<SmsLog {self.phone_number}: {self.status}>'
 
@@ -356,6 +379,25 @@ class Attendance(db.Model):
     def __repr__(self):
         return f'<Attendance {self.user_id} - {self.date}: {self.status}>'
 
+class Holiday(db.Model):
+    """Non-class day excluded from working-day counts"""
+    __tablename__ = 'holidays'
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), nullable=True)  # None = applies to all batches
+    title = db.Column(db.String(255), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    batch = db.relationship('Batch')
+
+    __table_args__ = (db.UniqueConstraint('date', 'batch_id', name='unique_holiday_date_batch'),)
+
+    def __repr__(self):
+        return f'<Holiday {self.date}: {self.title}>'
+
 class MonthlyResult(db.Model):
     """Monthly result calculation model"""
     __tablename__ = 'monthly_results'
@@ -479,6 +521,8 @@ class MonthlyExam(db.Model):
     show_results = db.Column(db.Boolean, default=False)
     show_on_homepage = db.Column(db.Boolean, default=False)  # Feature top 3 students on homepage
     result_published_at = db.Column(db.DateTime, nullable=True)
+    is_deleted = db.Column(db.Boolean, default=False, nullable=False)  # Hidden while its data is purged in the background
+    deleted_at = db.Column(db.DateTime, nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -596,6 +640,52 @@ class MonthlyRanking(db.Model):
     def __repr__(self):
         return f'<MonthlyRanking {self.position} - User {self.user_id}>'
 
+class MonthlyRankingSnapshot(db.Model):
+    """Cached comprehensive ranking table for a monthly exam"""
+    __tablename__ = 'monthly_ranking_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    monthly_exam_id = db.Column(db.Integer, db.ForeignKey('monthly_exams.id'), nullable=False, unique=True)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped by every write that affects the ranking
+    snapshot_version = db.Column(db.Integer, nullable=True)  # Version the stored payload was computed at
+    payload = db.Column(db.JSON, nullable=True)  # {'individual_exams': [...], 'rankings': [...]}
+    computed_at = db.Column(db.DateTime, nullable=True)
+    invalidated_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationships
+    monthly_exam = db.relationship('MonthlyExam')
+
+    @property
+    def is_fresh(self):
+        """Whether the stored payload reflects the latest version"""
+        return self.payload is not None and self.snapshot_version == self.version
+
+    def __repr__(self):
+        return f'<MonthlyRankingSnapshot exam={self.monthly_exam_id} v{self.version}>'
+
+
+class MonthlyBonusMark(db.Model):
+    """Teacher-added bonus marks for a student in a monthly exam"""
+    __tablename__ = 'monthly_bonus_marks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    monthly_exam_id = db.Column(db.Integer, db.ForeignKey('monthly_exams.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bonus_marks = db.Column(db.Float, nullable=False, default=0)
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    monthly_exam = db.relationship('MonthlyExam')
+    user = db.relationship('User', foreign_keys=[user_id])
+
+    # The unique index also serves per-exam lookups (leading monthly_exam_id column)
+    __table_args__ = (db.UniqueConstraint('monthly_exam_id', 'user_id', name='unique_monthly_bonus_mark'),)
+
+    def __repr__(self):
+        return f'<MonthlyBonusMark exam={self.monthly_exam_id} user={self.user_id}: {self.bonus_marks}>'
+
 
 class Document(db.Model):
     """PDF/Document storage for online exams and study materials"""
@@ -643,4 +733,115 @@ class Document(db.Model):
             'download_count': self.download_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class BackgroundJob(db.Model):
+    """Long-running task run outside the request, with progress tracking"""
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)  # report_cards, ...
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    params = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    creator = db.relationship('User', foreign_keys=[created_by])
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type}: {self.status}>'
+    
+    @property
+    def progress(self):
+        """Completion percentage"""
+        if self.status == 'completed':
+            return 100.0
+        return round(self.processed / self.total * 100, 1) if self.total else 0.0
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class SmsOutbox(db.Model):
+    """SMS waiting to be sent by the dispatcher, written in the same transaction as its SmsLog"""
+    __tablename__ = 'sms_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sms_log_id = db.Column(db.Integer, db.ForeignKey('sms_logs.id'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('background_jobs.id'), nullable=True, index=True)
+    phone_number = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    charge_sender = db.Column(db.Boolean, nullable=False, default=False)  # Deduct from the sender's sms_count
+    cost = db.Column(db.Integer, nullable=False, default=1)  # SMS credits, reserved when queued
+    claim_token = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    sms_log = db.relationship('SmsLog')
+    job = db.relationship('BackgroundJob')
+    
+    # The dispatcher polls for due rows by status and next attempt time
+    __table_args__ = (db.Index('ix_sms_outbox_due', 'status', 'next_attempt_at'),)
+    
+    def __repr__(self):
+        return f'<SmsOutbox {self.id} {self.phone_number}: {self.status}>'
+
+
+class SmsBalanceEntry(db.Model):
+    """Append-only SMS credit movement; the account balance is the sum of all deltas"""
+    __tablename__ = 'sms_balance_ledger'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    delta = db.Column(db.Integer, nullable=False)  # Credits added (+) or used/reserved (-)
+    kind = db.Column(db.String(20), nullable=False)  # opening, credit, adjustment, reserve, settle, debit, checkpoint
+    job_id = db.Column(db.Integer, db.ForeignKey('background_jobs.id'), nullable=True, index=True)
+    reference = db.Column(db.String(64), nullable=True, unique=True)  # Makes one-off entries idempotent
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<SmsBalanceEntry {self.id} {self.kind}: {self.delta:+d}>'
+
+
+class SmsDailyStat(db.Model):
+    """Rollup of SMS outcomes per day, sender and status, maintained by the SMS dispatcher"""
+    __tablename__ = 'sms_daily_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC day the SMS was sent (sent) or created (failed)
+    sent_by = db.Column(db.Integer, nullable=False, default=0)  # Sender user id, 0 for system messages
+    status = db.Column(db.String(20), nullable=False)  # sent, failed
+    count = db.Column(db.Integer, nullable=False, default=0)
+    cost = db.Column(db.Integer, nullable=False, default=0)  # SMS credits used
+    
+    __table_args__ = (db.UniqueConstraint('day', 'sent_by', 'status', name='unique_sms_daily_stat'),)
+    
+    def __repr__(self):
+        return f'<SmsDailyStat {self.day} {self.sent_by} {self.status}: {self.count}>'
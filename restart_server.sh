@@ -5,9 +5,9 @@ cd /workspaces/saro
 pkill -f "python.*app.py" 2>/dev/null || true
 sleep 1
 
-# Start new server
+# Start new server; queued SMS are sent by a dispatcher thread inside it
 echo "Starting Flask server..."
-python3 app.py > /tmp/server.log 2>&1 &
+SMS_DISPATCHER_THREAD=true python3 app.py > /tmp/server.log 2>&1 &
 SERVER_PID=$!
 
 sleep 3
@@ -2,9 +2,16 @@
 Attendance Management Routes - Enhanced for Mobile & PC Responsiveness
 """
 from flask import Blueprint, request
-from models import db, Attendance, User, Batch, UserRole, AttendanceStatus
+from models import db, Attendance, User, Batch, Holiday, UserRole, AttendanceStatus
 from utils.auth import login_required, require_role, get_current_user
 from utils.response import success_response, error_response
+from services.ranking_service import invalidate_rankings_for_batch_month
+from services.calendar_service import get_month_bounds, get_working_dates
+from services.sms_balance import reserve_sms_credits
+from services.sms_outbox import create_sms_job, enqueue_sms
+from services.sms_coalesce import SmsDraft, coalesce_sms
+from services.sms_segments import cost_sms_batch
+from services.sms_templates import compile_template, resolve_template
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, extract
 import calendar
@@ -81,6 +88,52 @@ def get_attendance():
     except Exception as e:
         return error_response(f'Failed to retrieve attendance: {str(e)}', 500)
 
+def queue_attendance_sms(notifications, batch, attendance_date, current_user, limit=None, charge_sender=False):
+    """
+    Queue attendance SMS to each student's guardian and own phone in the caller's transaction.
+
+    notifications is a list of (student, status). Messages to the same number
+    (siblings sharing a guardian phone) are coalesced into one; at most limit
+    messages are queued and their credits reserved. Returns the SMS job, or
+    None if nothing was queued.
+    """
+    from flask import session
+    custom_templates = session.get('custom_templates')
+    # Resolve and compile both templates once per job; the loop below only fills them in
+    templates = {
+        key: compile_template(resolve_template(f'attendance_{key}', custom_templates))
+        for key in ('present', 'absent')
+    }
+    formatted_date = attendance_date.strftime('%d/%m/%Y')
+
+    drafts = []
+    for student, status in notifications:
+        # Get the appropriate template based on attendance status
+        template = templates['present' if status.lower() == 'present' else 'absent']
+        variables = {
+            'student_name': student.full_name,
+            'batch_name': batch.name,
+            'date': formatted_date
+        }
+        # Guardian/parent phone and the student's own phone; coalescing drops duplicates
+        for phone in sorted({phone for phone in (student.guardian_phone, student.phone) if phone}):
+            drafts.append(SmsDraft(phone, template.text, variables, student.id))
+
+    compiled = {template.text: template for template in templates.values()}
+    messages = coalesce_sms(drafts, render=lambda text, values: compiled[text].render(values))[:limit]
+    if not messages:
+        return None
+
+    job = create_sms_job(created_by=current_user.id, params={
+        'source': 'attendance', 'batch_id': batch.id, 'date': attendance_date.isoformat()
+    })
+    for sms in messages:
+        enqueue_sms(sms.phone, sms.message, user_id=sms.user_id, sent_by=current_user.id, job=job,
+                    charge_sender=charge_sender, cost=sms.cost)
+
+    reserve_sms_credits(job, cost_sms_batch(sms.message for sms in messages)['segments'])
+    return job
+
 @attendance_bp.route('/bulk', methods=['POST'])
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
@@ -149,98 +202,24 @@ def bulk_mark_attendance():
                     'action': 'created'
                 })
         
-        db.session.commit()
-        
-        # Send SMS notifications if requested
-        sms_sent = 0
-        sms_sent_numbers = []
+        # Queue SMS notifications in the same transaction so they go out only if the attendance is saved
+        sms_job = None
         if send_sms and attendance_updates:
-            # Import SMS sending function (no balance check - API handles it)
-            from routes.sms import send_sms_via_api
-            from models import SmsLog, SmsStatus
-            
-            for update in attendance_updates:
-                student = update['student']
-                status = update['status']
-                
-                # Prepare SMS message using templates
-                from flask import session
-                custom_templates = session.get('custom_templates', {})
-                
-                # Get the appropriate template based on attendance status
-                if status.lower() == 'present':
-                    template = custom_templates.get('attendance_present', 'Dear Parent, {student_name} was PRESENT today in {batch_name} on {date}. Keep up the good work!')
-                else:  # absent
-                    template = custom_templates.get('attendance_absent', 'Dear Parent, {student_name} was ABSENT today in {batch_name} on {date}. Please ensure regular attendance.')
-                
-                # Replace template variables with actual data
-                message = template.format(
-                    student_name=student.full_name,
-                    batch_name=batch.name,
-                    date=attendance_date.strftime('%d/%m/%Y')
-                )
-                
-                # Collect phone numbers to send SMS
-                phone_numbers = []
-                
-                # Add guardian/parent phone number if exists
-                if hasattr(student, 'guardian_phone') and student.guardian_phone:
-                    phone_numbers.append(student.guardian_phone)
-                
-                # Add student's own phone number
-                if student.phone:
-                    phone_numbers.append(student.phone)
-                
-                # Remove duplicates
-                phone_numbers = list(set(phone_numbers))
-                
-                # Send SMS to each phone number
-                for phone in phone_numbers:
-                    if not phone:
-                        continue
-                    
-                    # Check if teacher still has SMS balance
-                    if current_user.sms_count <= 0:
-                        break
-                    
-                    try:
-                        # Send SMS
-                        result = send_sms_via_api(phone, message)
-                        
-                        # Calculate SMS cost based on message content
-                        from routes.sms import calculate_sms_cost, deduct_sms_balance
-                        sms_cost = calculate_sms_cost(message) if result.get('success') else 0
-                        
-                        # Create SMS log
-                        sms_log = SmsLog(
-                            user_id=student.id,
-                            phone_number=phone,
-                            message=message,
-                            status=SmsStatus.SENT if result.get('success') else SmsStatus.FAILED,
-                            sent_by=current_user.id,
-                            api_response=result,
-                            cost=sms_cost,
-                            sent_at=datetime.utcnow() if result.get('success') else None
-                        )
-                        db.session.add(sms_log)
-                        
-                        if result.get('success'):
-                            # Deduct from local balance
-                            deduct_sms_balance(sms_cost)
-                            sms_sent += 1
-                            sms_sent_numbers.append(phone)
-                            # Deduct 1 SMS from teacher's balance
-                            current_user.sms_count -= 1
-                            
-                    except Exception as sms_error:
-                        print(f"Failed to send SMS to {phone}: {sms_error}")
-            
-            # Commit SMS logs and balance update
-            db.session.commit()
+            sms_job = queue_attendance_sms(
+                [(update['student'], update['status']) for update in attendance_updates],
+                batch, attendance_date, current_user,
+                limit=max(0, current_user.sms_count or 0), charge_sender=True
+            )
+        
+        # Attendance marks feed the monthly exam ranking for this batch and month
+        invalidate_rankings_for_batch_month(batch_id, attendance_date.month, attendance_date.year)
+        db.session.commit()
         
         response_data = {
             'attendance_marked': len(attendance_updates),
-            'sms_sent': sms_sent,
+            'sms_queued': sms_job.total if sms_job else 0,
+            'sms_job_id': sms_job.id if sms_job else None,
+            'sms_progress_url': f'/api/jobs/{sms_job.id}' if sms_job else None,
             'sms_balance': current_user.sms_count,
             'date': attendance_date.isoformat(),
             'batch_name': batch.name
@@ -325,99 +304,29 @@ def bulk_mark_attendance_send_absent_sms():
             if status.lower() == 'absent':
                 absent_students.append(user)
         
-        db.session.commit()
-        
-        # Send SMS only to absent students
-        sms_sent = 0
-        sms_failed = 0
-        
+        # Queue SMS only to absent students, in the same transaction as the attendance
+        sms_job = None
         if absent_students:
-            # Check teacher's SMS balance
-            # Import SMS sending function (no balance check - API handles it)
-            from routes.sms import send_sms_via_api
-            from models import SmsLog, SmsStatus
-            
-            for student in absent_students:
-                # Get absent message template
-                from flask import session
-                custom_templates = session.get('custom_templates', {})
-                template = custom_templates.get(
-                    'attendance_absent', 
-                    'Dear Parent, {student_name} was ABSENT today in {batch_name} on {date}. Please ensure regular attendance.'
-                )
-                
-                # Replace template variables with actual data
-                message = template.format(
-                    student_name=student.full_name,
-                    batch_name=batch.name,
-                    date=attendance_date.strftime('%d/%m/%Y')
-                )
-                
-                # Collect phone numbers to send SMS
-                phone_numbers = []
-                
-                # Add guardian/parent phone number if exists
-                if hasattr(student, 'guardian_phone') and student.guardian_phone:
-                    phone_numbers.append(student.guardian_phone)
-                
-                # Add student's own phone number
-                if student.phone:
-                    phone_numbers.append(student.phone)
-                
-                # Remove duplicates
-                phone_numbers = list(set(phone_numbers))
-                
-                # Send SMS to each phone number
-                for phone in phone_numbers:
-                    if not phone:
-                        continue
-                    
-                    try:
-                        # Send SMS
-                        result = send_sms_via_api(phone, message)
-                        
-                        # Calculate SMS cost based on message content
-                        from routes.sms import calculate_sms_cost, deduct_sms_balance
-                        sms_cost = calculate_sms_cost(message) if result.get('success') else 0
-                        
-                        # Create SMS log
-                        sms_log = SmsLog(
-                            user_id=student.id,
-                            phone_number=phone,
-                            message=message,
-                            status=SmsStatus.SENT if result.get('success') else SmsStatus.FAILED,
-                            sent_by=current_user.id,
-                            api_response=result,
-                            cost=sms_cost,
-                            sent_at=datetime.utcnow() if result.get('success') else None
-                        )
-                        db.session.add(sms_log)
-                        
-                        if result.get('success'):
-                            # Deduct from local balance
-                            deduct_sms_balance(sms_cost)
-                            sms_sent += 1
-                        else:
-                            sms_failed += 1
-                            
-                    except Exception as sms_error:
-                        print(f"Failed to send SMS to {phone}: {sms_error}")
-                        sms_failed += 1
-            
-            # Commit SMS logs and balance update
-            db.session.commit()
+            sms_job = queue_attendance_sms(
+                [(student, 'absent') for student in absent_students], batch, attendance_date, current_user
+            )
+        
+        # Attendance marks feed the monthly exam ranking for this batch and month
+        invalidate_rankings_for_batch_month(batch_id, attendance_date.month, attendance_date.year)
+        db.session.commit()
         
         response_data = {
             'attendance_marked': len(attendance_updates),
             'absent_count': len(absent_students),
-            'sms_sent': sms_sent,
-            'sms_failed': sms_failed,
+            'sms_queued': sms_job.total if sms_job else 0,
+            'sms_job_id': sms_job.id if sms_job else None,
+            'sms_progress_url': f'/api/jobs/{sms_job.id}' if sms_job else None,
             'sms_balance': current_user.sms_count,
             'date': attendance_date.isoformat(),
             'batch_name': batch.name
         }
         
-        return success_response('Attendance marked and SMS sent to absent students', response_data)
+        return success_response('Attendance marked and SMS queued for absent students', response_data)
         
     except Exception as e:
         db.session.rollback()
@@ -462,13 +371,10 @@ def get_monthly_attendance():
             Batch.id == batch_id
         ).order_by(User.first_name, User.last_name).all()
         
-        # Get days in month
-        days_in_month = calendar.monthrange(year, month)[1]
-        days = list(range(1, days_in_month + 1))
-        
-        # Get attendance records for the month
-        start_date = datetime(year, month, 1).date()
-        end_date = datetime(year, month, days_in_month).date()
+        # Get days in month and the batch's class days
+        start_date, end_date = get_month_bounds(month, year)
+        days = list(range(1, end_date.day + 1))
+        class_dates = get_working_dates(batch, month, year)
         
         attendance_records = Attendance.query.filter(
             and_(
@@ -505,7 +411,9 @@ def get_monthly_attendance():
             'month': month,
             'year': year,
             'month_name': calendar.month_name[month],
-            'batch_name': batch.name
+            'batch_name': batch.name,
+            'class_days': [class_date.day for class_date in class_dates],
+            'working_days': len(class_dates)
         }
         
         return success_response('Monthly attendance retrieved', month_data)
@@ -574,3 +482,104 @@ def get_attendance_summary():
         
     except Exception as e:
         return error_response(f'Failed to retrieve attendance summary: {str(e)}', 500)
+
+@attendance_bp.route('/holidays', methods=['GET'])
+@login_required
+def get_holidays():
+    """List holidays, optionally filtered by batch, month and year"""
+    try:
+        batch_id = request.args.get('batch_id', type=int)
+        month = request.args.get('month', type=int)
+        year = request.args.get('year', type=int)
+        
+        query = Holiday.query
+        
+        if batch_id:
+            # Batch-specific holidays plus those that apply to every batch
+            query = query.filter((Holiday.batch_id == batch_id) | (Holiday.batch_id.is_(None)))
+        
+        if month and year:
+            start_date, end_date = get_month_bounds(month, year)
+            query = query.filter(Holiday.date >= start_date, Holiday.date <= end_date)
+        elif year:
+            query = query.filter(extract('year', Holiday.date) == year)
+        
+        holidays = query.order_by(Holiday.date).all()
+        
+        return success_response('Holidays retrieved', [serialize_holiday(h) for h in holidays])
+        
+    except Exception as e:
+        return error_response(f'Failed to retrieve holidays: {str(e)}', 500)
+
+@attendance_bp.route('/holidays', methods=['POST'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def create_holiday():
+    """Add a holiday for one batch or, without batchId, for all batches"""
+    try:
+        data = request.get_json() or {}
+        date_str = data.get('date')
+        batch_id = data.get('batchId')
+        
+        if not date_str:
+            return error_response('Date is required', 400)
+        
+        try:
+            holiday_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return error_response('Invalid date format. Use YYYY-MM-DD', 400)
+        
+        if batch_id and not Batch.query.get(batch_id):
+            return error_response('Batch not found', 404)
+        
+        existing = Holiday.query.filter_by(date=holiday_date, batch_id=batch_id).first()
+        if existing:
+            return error_response('Holiday already exists for this date', 409)
+        
+        holiday = Holiday(
+            date=holiday_date,
+            batch_id=batch_id,
+            title=data.get('title'),
+            created_by=get_current_user().id
+        )
+        db.session.add(holiday)
+        
+        # Working-day counts feed attendance marks in monthly rankings
+        invalidate_rankings_for_batch_month(batch_id, holiday_date.month, holiday_date.year)
+        db.session.commit()
+        
+        return success_response('Holiday added successfully', serialize_holiday(holiday), 201)
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'Failed to add holiday: {str(e)}', 500)
+
+@attendance_bp.route('/holidays/<int:holiday_id>', methods=['DELETE'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def delete_holiday(holiday_id):
+    """Remove a holiday"""
+    try:
+        holiday = Holiday.query.get(holiday_id)
+        if not holiday:
+            return error_response('Holiday not found', 404)
+        
+        invalidate_rankings_for_batch_month(holiday.batch_id, holiday.date.month, holiday.date.year)
+        db.session.delete(holiday)
+        db.session.commit()
+        
+        return success_response('Holiday removed successfully')
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'Failed to remove holiday: {str(e)}', 500)
+
+def serialize_holiday(holiday):
+    """Serialize holiday to dict"""
+    return {
+        'id': holiday.id,
+        'date': holiday.date.isoformat(),
+        'batch_id': holiday.batch_id,
+        'batch_name': holiday.batch.name if holiday.batch else None,
+        'title': holiday.title
+    }
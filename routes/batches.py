@@ -6,6 +6,7 @@ from flask import Blueprint, request
 from models import db, Batch, User, UserRole, user_batches
 from utils.auth import login_required, require_role, get_current_user
 from utils.response import success_response, error_response, paginated_response, serialize_batch
+from services.ranking_service import invalidate_rankings_for_batches
 from sqlalchemy import or_
 from datetime import datetime, date
 from decimal import Decimal
@@ -192,6 +193,9 @@ def update_batch(batch_id):
         if not data:
             return error_response('Request data is required', 400)
         
+        # Attendance marks in rankings count the class days between these dates
+        schedule = (batch.class_days, batch.start_date, batch.end_date)
+        
         # Check if new name conflicts with existing batch
         if 'name' in data and data['name'].strip() != batch.name:
             existing_batch = Batch.query.filter(
@@ -264,6 +268,8 @@ def update_batch(batch_id):
             return error_response('End date must be after start date', 400)
         
         batch.updated_at = datetime.utcnow()
+        if (batch.class_days, batch.start_date, batch.end_date) != schedule:
+            invalidate_rankings_for_batches([batch.id])
         db.session.commit()
         
         batch_data = serialize_batch(batch)
@@ -321,7 +327,8 @@ def get_batch_students(batch_id):
         
         # Find most recent monthly exam for this batch with finalized rankings
         most_recent_exam = MonthlyExam.query.filter_by(
-            batch_id=batch_id
+            batch_id=batch_id,
+            is_deleted=False
         ).order_by(
             MonthlyExam.year.desc(),
             MonthlyExam.month.desc()
@@ -393,8 +400,9 @@ def add_student_to_batch(batch_id):
         if batch in student.batches:
             return error_response('Student is already enrolled in this batch', 409)
         
-        # Add student to batch
+        # Add student to batch; the batch's rankings now include them
         student.batches.append(batch)
+        invalidate_rankings_for_batches([batch.id])
         db.session.commit()
         
         return success_response('Student added to batch successfully')
@@ -423,8 +431,9 @@ def remove_student_from_batch(batch_id, student_id):
         if batch not in student.batches:
             return error_response('Student is not enrolled in this batch', 404)
         
-        # Remove student from batch
+        # Remove student from batch and from its rankings
         student.batches.remove(batch)
+        invalidate_rankings_for_batches([batch.id])
         db.session.commit()
         
         return success_response('Student removed from batch successfully')
@@ -520,6 +529,8 @@ def archive_batch(batch_id):
                 student.archive_reason = f"Archived with batch: {batch.name}"
                 archived_students_count += 1
         
+        # Archived students drop out of the batch's rankings
+        invalidate_rankings_for_batches([batch.id])
         db.session.commit()
         
         return success_response('Batch and students archived successfully', {
@@ -572,6 +583,8 @@ def restore_batch(batch_id):
                         student.archive_reason = None
                         restored_students_count += 1
         
+        # Restored students are ranked again
+        invalidate_rankings_for_batches([batch.id])
         db.session.commit()
         
         return success_response('Batch restored successfully', {
@@ -0,0 +1,29 @@
+"""
+Background Job Routes
+Progress polling for long-running jobs
+"""
+from flask import Blueprint
+from models import BackgroundJob, UserRole
+from utils.auth import require_role
+from utils.response import success_response, error_response
+import logging
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def get_job(job_id):
+    """Get a background job's status and progress"""
+    try:
+        job = BackgroundJob.query.get(job_id)
+        if not job:
+            return error_response('Job not found', 404)
+        
+        return success_response('Job status retrieved', job.to_dict())
+        
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        return error_response(f'Failed to get job status: {str(e)}', 500)
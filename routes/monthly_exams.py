@@ -2,18 +2,37 @@
 Monthly Exam System Routes
 Ranking, GPA calculation, merit lists, and performance analytics
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file, stream_with_context
 from models import (db, MonthlyExam, IndividualExam, MonthlyMark, Batch, User, 
-                   UserRole, Settings, SmsLog, SmsStatus, Attendance, AttendanceStatus, MonthlyRanking)
+                   UserRole, Attendance, AttendanceStatus, MonthlyRanking,
+                   BackgroundJob)
 from utils.auth import login_required, require_role, get_current_user
 from utils.response import success_response, error_response
-from services.sms_service import send_bulk_notification
+from services.background_jobs import create_job, start_job
+from services.sms_balance import reserve_sms_credits
+from services.sms_outbox import create_sms_job, enqueue_sms
+from services.sms_templates import compile_template, get_default_template, resolve_template
+from services.bonus_marks import get_bonus_marks, save_bonus_marks
+from services.exam_deletion import EXAM_DELETE_JOB, purge_monthly_exam, soft_delete_monthly_exam
+from services.exam_analytics import get_batch_exam_comparison, get_exam_analytics_data
+from services.grading import calculate_grade_and_gpa, grade_percentages
+from services.homepage_feed import get_homepage_feed, refresh_homepage_feed
+from services.result_export import (ResultExportError, iter_exam_ids, iter_file_chunks, stream_results_csv,
+                                    write_results_xlsx)
+from services.marks_import import MarksImportError, import_marks_grid, iter_upload_rows
+from services.marks_service import (build_mark_rows, get_existing_mark_user_ids, parse_marks_value,
+                                    upsert_monthly_marks)
+from services.roll_numbers import RollNumberError, allocate_roll_numbers
+from services.report_cards import REPORT_CARD_JOB, generate_report_cards, get_report_card_path
+from services.ranking_service import (compute_comprehensive_ranking,
+                                      get_ranking_snapshot,
+                                      invalidate_ranking_snapshots, invalidate_ranking_and_next_month,
+                                      refresh_ranking_rows, save_final_rankings)
 from sqlalchemy import func, desc, case, and_, or_
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 import calendar
 import logging
-import requests
 import os
 import re
 
@@ -62,7 +81,7 @@ def get_monthly_exams():
         month = request.args.get('month', type=int)
         year = request.args.get('year', type=int) or datetime.now().year
         
-        query = MonthlyExam.query
+        query = MonthlyExam.query.filter(MonthlyExam.is_deleted == False)
         
         # Students can now see ALL exams from all batches
         # No filtering by user role - removed batch restriction for students
@@ -131,6 +150,8 @@ def create_monthly_exam():
             year=year
         ).first()
         
+        if existing and existing.is_deleted:
+            return error_response('The previous monthly exam for this month is still being deleted. Please try again shortly.', 409)
         if existing:
             return error_response('Monthly exam already exists for this month', 400)
         
@@ -254,6 +275,7 @@ def submit_marks():
                 )
                 db.session.add(monthly_mark)
         
+        invalidate_ranking_snapshots({entry['monthly_exam_id'] for entry in marks_data})
         db.session.commit()
         
         # Recalculate rankings
@@ -277,7 +299,7 @@ def get_comprehensive_monthly_ranking(exam_id):
         current_user = get_current_user()
         
         # Get monthly exam
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -287,212 +309,7 @@ def get_comprehensive_monthly_ranking(exam_id):
             if monthly_exam.batch_id not in user_batch_ids:
                 return error_response('Access denied', 403)
         
-        # Get all individual exams for this monthly exam
-        individual_exams = IndividualExam.query.filter_by(
-            monthly_exam_id=exam_id
-        ).order_by(IndividualExam.order_index).all()
-        
-        # Get all students in the batch (exclude archived students)
-        batch_students = User.query.join(
-            User.batches
-        ).filter(
-            User.role == UserRole.STUDENT,
-            User.is_active == True,
-            User.is_archived == False,
-            Batch.id == monthly_exam.batch_id
-        ).all()
-        
-        # Calculate comprehensive rankings
-        rankings = []
-        
-        for student in batch_students:
-            # Get existing ranking to get roll number and previous position
-            existing_ranking = MonthlyRanking.query.filter_by(
-                monthly_exam_id=exam_id,
-                user_id=student.id
-            ).first()
-            
-            # Get individual exam marks
-            individual_marks = {}
-            total_exam_marks = 0
-            total_possible_marks = 0
-            exam_count = len(individual_exams)
-            passed_exams = 0
-            
-            for exam in individual_exams:
-                mark = MonthlyMark.query.filter_by(
-                    monthly_exam_id=exam_id,
-                    individual_exam_id=exam.id,
-                    user_id=student.id
-                ).first()
-                
-                if mark:
-                    individual_marks[exam.id] = {
-                        'exam_title': exam.title,
-                        'subject': exam.subject,
-                        'marks_obtained': mark.marks_obtained,
-                        'total_marks': mark.total_marks,
-                        'percentage': round((mark.marks_obtained / mark.total_marks * 100), 2) if mark.total_marks > 0 else 0,
-                        'is_absent': mark.is_absent,
-                        'grade': calculate_grade_and_gpa((mark.marks_obtained / mark.total_marks * 100) if mark.total_marks > 0 else 0)[0]
-                    }
-                    if not mark.is_absent:
-                        total_exam_marks += mark.marks_obtained
-                        if mark.marks_obtained >= (mark.total_marks * 0.4):  # 40% pass mark
-                            passed_exams += 1
-                    total_possible_marks += mark.total_marks
-                else:
-                    individual_marks[exam.id] = {
-                        'exam_title': exam.title,
-                        'subject': exam.subject,
-                        'marks_obtained': 0,
-                        'total_marks': exam.marks,
-                        'percentage': 0,
-                        'is_absent': True,
-                        'grade': 'F'
-                    }
-                    total_possible_marks += exam.marks
-            
-            # Calculate attendance marks (1 mark per present day in the month)
-            # Only count attendance from the SAME MONTH as the exam
-            attendance_marks = 0
-            total_days = 0
-            max_attendance_marks = 0
-            
-            if monthly_exam.start_date and monthly_exam.end_date:
-                # Get the first and last day of the exam's month
-                exam_month = monthly_exam.month
-                exam_year = monthly_exam.year
-                
-                # First day of the month
-                month_start = datetime(exam_year, exam_month, 1).date()
-                
-                # Last day of the month
-                if exam_month == 12:
-                    month_end = datetime(exam_year + 1, 1, 1).date() - timedelta(days=1)
-                else:
-                    month_end = datetime(exam_year, exam_month + 1, 1).date() - timedelta(days=1)
-                
-                # Count total working days in this specific month (Monday to Friday)
-                current_date = month_start
-                
-                while current_date <= month_end:
-                    # Count only weekdays (Monday to Friday)
-                    if current_date.weekday() < 5:  # 0-4 are Monday to Friday
-                        total_days += 1
-                    current_date += timedelta(days=1)
-                
-                max_attendance_marks = total_days  # Maximum possible attendance marks for the month
-                
-                # Count present days ONLY in this specific month
-                present_count = Attendance.query.filter(
-                    Attendance.user_id == student.id,
-                    Attendance.batch_id == monthly_exam.batch_id,
-                    Attendance.date >= month_start,
-                    Attendance.date <= month_end,
-                    Attendance.status == AttendanceStatus.PRESENT
-                ).count()
-                attendance_marks = present_count
-            
-            # Calculate attendance percentage
-            attendance_percentage = (attendance_marks / total_days * 100) if total_days > 0 else 0
-            
-            # Calculate final totals (NO BONUS - just exam marks + attendance marks)
-            final_total = total_exam_marks + attendance_marks
-            total_possible = total_possible_marks + max_attendance_marks  # Total possible including max attendance
-            
-            # Calculate simple percentage based on obtained vs total possible
-            percentage = (final_total / total_possible * 100) if total_possible > 0 else 0
-            
-            # Calculate grade and GPA based on final percentage
-            grade, gpa = calculate_grade_and_gpa(percentage)
-            exam_gpa = calculate_grade_and_gpa((total_exam_marks / total_possible_marks * 100) if total_possible_marks > 0 else 0)[1]
-            
-            # Get previous month ranking for comparison and roll number
-            previous_position = None
-            previous_roll_number = None
-            
-            if existing_ranking and existing_ranking.previous_position:
-                previous_position = existing_ranking.previous_position
-            
-            # Always try to find previous month ranking for roll number inheritance
-            prev_month = monthly_exam.month - 1 if monthly_exam.month > 1 else 12
-            prev_year = monthly_exam.year if monthly_exam.month > 1 else monthly_exam.year - 1
-            
-            prev_exam = MonthlyExam.query.filter_by(
-                batch_id=monthly_exam.batch_id,
-                month=prev_month,
-                year=prev_year
-            ).first()
-            
-            if prev_exam:
-                prev_ranking = MonthlyRanking.query.filter_by(
-                    monthly_exam_id=prev_exam.id,
-                    user_id=student.id,
-                    is_final=True
-                ).first()
-                if prev_ranking:
-                    previous_position = prev_ranking.position
-                    previous_roll_number = prev_ranking.roll_number
-            
-            # Determine roll number: use existing, or inherit from previous month, or None
-            current_roll_number = None
-            if existing_ranking and existing_ranking.roll_number:
-                current_roll_number = existing_ranking.roll_number
-            elif previous_roll_number:
-                current_roll_number = previous_roll_number  # Inherit from previous month
-            
-            ranking_data = {
-                'user_id': student.id,
-                'student_name': student.full_name,
-                'student_phone': student.phoneNumber,
-                'roll_number': current_roll_number,
-                'individual_marks': individual_marks,
-                'total_exam_marks': total_exam_marks,
-                'total_possible_marks': total_possible_marks,
-                'attendance_marks': attendance_marks,
-                'max_attendance_marks': max_attendance_marks,
-                'total_attendance_days': total_days,
-                'attendance_percentage': round(attendance_percentage, 2),
-                'final_total': final_total,
-                'total_possible': total_possible,
-                'percentage': round(percentage, 2),
-                'grade': grade,
-                'gpa': round(gpa, 2),
-                'exam_gpa': round(exam_gpa, 2),
-                'passed_exams': passed_exams,
-                'total_exams': exam_count,
-                'previous_position': previous_position
-            }
-            
-            rankings.append(ranking_data)
-        
-        # Sort by final percentage (descending), then by total marks, then by name
-        rankings.sort(key=lambda x: (-x['percentage'], -x['final_total'], x['student_name']))
-        
-        # Assign positions and calculate position changes
-        for idx, rank in enumerate(rankings):
-            current_position = idx + 1
-            rank['current_position'] = current_position
-            rank['position'] = current_position  # For compatibility
-            
-            # Calculate position change
-            if rank['previous_position']:
-                rank['position_change'] = rank['previous_position'] - current_position
-                if rank['position_change'] > 0:
-                    rank['position_trend'] = 'up'
-                elif rank['position_change'] < 0:
-                    rank['position_trend'] = 'down'
-                else:
-                    rank['position_trend'] = 'same'
-            else:
-                rank['position_change'] = None
-                rank['position_trend'] = 'new'
-        
-        # Filter out archived students from rankings before returning
-        # (in case any old data exists)
-        active_student_ids = [s.id for s in batch_students]
-        rankings = [r for r in rankings if r['user_id'] in active_student_ids]
+        individual_exams, rankings = get_ranking_snapshot(monthly_exam)
         
         # If student, only return their data and nearby rankings
         if current_user.role == UserRole.STUDENT:
@@ -510,7 +327,7 @@ def get_comprehensive_monthly_ranking(exam_id):
                 
                 return success_response('Student comprehensive ranking retrieved', {
                     'monthly_exam': serialize_monthly_exam(monthly_exam),
-                    'individual_exams': [{'id': e.id, 'title': e.title, 'subject': e.subject, 'marks': e.marks} for e in individual_exams],
+                    'individual_exams': individual_exams,
                     'student_position': current_pos,
                     'total_students': len(rankings),
                     'nearby_rankings': nearby_rankings
@@ -521,7 +338,7 @@ def get_comprehensive_monthly_ranking(exam_id):
         # For teachers/admin, return full comprehensive ranking
         return success_response('Comprehensive monthly ranking retrieved', {
             'monthly_exam': serialize_monthly_exam(monthly_exam),
-            'individual_exams': [{'id': e.id, 'title': e.title, 'subject': e.subject, 'marks': e.marks} for e in individual_exams],
+            'individual_exams': individual_exams,
             'rankings': rankings,
             'total_students': len(rankings)
         })
@@ -530,6 +347,62 @@ def get_comprehensive_monthly_ranking(exam_id):
         logger.error(f"Error getting comprehensive monthly ranking: {e}")
         return error_response(f'Failed to retrieve comprehensive ranking: {str(e)}', 500)
 
+@monthly_exams_bp.route('/<int:exam_id>/results/export', methods=['GET'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def export_monthly_results(exam_id):
+    """Stream the comprehensive result sheet of a monthly exam as CSV or XLSX"""
+    monthly_exam = get_monthly_exam(exam_id)
+    if not monthly_exam:
+        return error_response('Monthly exam not found', 404)
+    
+    filename = f"results_{monthly_exam.batch_id}_{monthly_exam.year}_{monthly_exam.month:02d}"
+    return build_results_export_response([exam_id], filename)
+
+@monthly_exams_bp.route('/results/export', methods=['GET'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def export_month_results():
+    """Stream the result sheets of every batch's monthly exam for a month"""
+    month = request.args.get('month', type=int)
+    year = request.args.get('year', type=int)
+    
+    if not month or not year or not 1 <= month <= 12:
+        return error_response('Valid month and year are required', 400)
+    
+    batch_ids = [int(b) for b in request.args.get('batch_ids', '').split(',') if b.strip().isdigit()]
+    exam_ids = iter_exam_ids(month, year, batch_ids or None)
+    if not exam_ids:
+        return error_response('No monthly exams found for this month', 404)
+    
+    return build_results_export_response(exam_ids, f"results_{year}_{month:02d}")
+
+def build_results_export_response(exam_ids, filename):
+    """Streaming download response for result sheets in the requested format"""
+    export_format = request.args.get('format', 'csv').lower()
+    
+    try:
+        if export_format == 'csv':
+            response = current_app.response_class(
+                stream_with_context(stream_results_csv(exam_ids)),
+                mimetype='text/csv; charset=utf-8'
+            )
+        elif export_format == 'xlsx':
+            response = current_app.response_class(
+                iter_file_chunks(write_results_xlsx(exam_ids)),
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+        else:
+            return error_response('Format must be csv or xlsx', 400)
+    except ResultExportError as export_error:
+        return error_response(str(export_error), 400)
+    except Exception as e:
+        logger.error(f"Error exporting results: {e}")
+        return error_response(f'Failed to export results: {str(e)}', 500)
+    
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
 @monthly_exams_bp.route('/<int:exam_id>/update-bonus', methods=['POST'])
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
@@ -541,44 +414,21 @@ def update_bonus_marks(exam_id):
         if not data or 'bonus_data' not in data:
             return error_response('Bonus data is required', 400)
         
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
         bonus_data = data['bonus_data']  # List of {user_id, bonus_marks}
-        updated_count = 0
-        
-        # For now, we'll store bonus marks in the Settings table as JSON
-        # Key format: "monthly_exam_bonus_{exam_id}"
-        bonus_key = f"monthly_exam_bonus_{exam_id}"
-        
-        # Get existing bonus data or create new
-        bonus_setting = Settings.query.filter_by(key=bonus_key).first()
-        if not bonus_setting:
-            bonus_setting = Settings(
-                key=bonus_key,
-                value={},
-                description=f"Bonus marks for Monthly Exam {monthly_exam.title}",
-                category="exam_bonus",
-                updated_by=get_current_user().id
-            )
-            db.session.add(bonus_setting)
-        
-        # Update bonus marks
-        current_bonus = bonus_setting.value or {}
         
+        bonus_by_user = {}
         for entry in bonus_data:
-            user_id = str(entry.get('user_id'))
-            bonus_marks = float(entry.get('bonus_marks', 0))
-            
+            user_id = entry.get('user_id')
             if user_id:
-                current_bonus[user_id] = bonus_marks
-                updated_count += 1
+                bonus_by_user[int(user_id)] = float(entry.get('bonus_marks', 0))
         
-        bonus_setting.value = current_bonus
-        bonus_setting.updated_at = datetime.utcnow()
-        bonus_setting.updated_by = get_current_user().id
+        updated_count = save_bonus_marks(exam_id, bonus_by_user, updated_by=get_current_user().id)
         
+        invalidate_ranking_snapshots([exam_id])
         db.session.commit()
         
         return success_response('Bonus marks updated successfully', {
@@ -595,53 +445,28 @@ def update_bonus_marks(exam_id):
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
 def assign_roll_numbers(exam_id):
-    """Assign roll numbers to students for monthly exam"""
+    """Assign roll numbers from explicit assignments or an allocation rule (inherit, position)"""
     try:
-        from models import MonthlyRanking
-        
         data = request.get_json()
-        if not data or 'roll_assignments' not in data:
-            return error_response('Roll assignments data is required', 400)
+        if not data or ('roll_assignments' not in data and 'rule' not in data):
+            return error_response('Roll assignments data or an allocation rule is required', 400)
         
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
-        roll_assignments = data['roll_assignments']  # List of {user_id, roll_number}
-        updated_count = 0
+        roll_assignments = data.get('roll_assignments')  # List of {user_id, roll_number}
+        if roll_assignments is not None and not isinstance(roll_assignments, list):
+            return error_response('roll_assignments must be a list', 400)
         
-        for assignment in roll_assignments:
-            user_id = assignment.get('user_id')
-            roll_number = assignment.get('roll_number')
-            
-            if not user_id or not roll_number:
-                continue
-            
-            # Check if user is in the batch
-            user = User.query.get(user_id)
-            if not user or monthly_exam.batch_id not in [b.id for b in user.batches]:
-                continue
-            
-            # Create or update MonthlyRanking record
-            ranking = MonthlyRanking.query.filter_by(
-                monthly_exam_id=exam_id,
-                user_id=user_id
-            ).first()
-            
-            if not ranking:
-                ranking = MonthlyRanking(
-                    monthly_exam_id=exam_id,
-                    user_id=user_id,
-                    position=0,  # Will be updated when rankings are calculated
-                    roll_number=roll_number
-                )
-                db.session.add(ranking)
-            else:
-                ranking.roll_number = roll_number
-                ranking.updated_at = datetime.utcnow()
-            
-            updated_count += 1
+        try:
+            updated_count = allocate_roll_numbers(monthly_exam, assignments=roll_assignments, rule=data.get('rule'))
+        except RollNumberError as roll_error:
+            db.session.rollback()
+            return error_response(str(roll_error), 400)
         
+        invalidate_ranking_and_next_month(monthly_exam)
+        refresh_homepage_feed()
         db.session.commit()
         
         return success_response('Roll numbers assigned successfully', {
@@ -660,45 +485,14 @@ def assign_roll_numbers(exam_id):
 def auto_assign_roll_numbers(exam_id):
     """Auto-assign roll numbers based on current ranking"""
     try:
-        from models import MonthlyRanking
-        
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
-        # Get current comprehensive ranking
-        ranking_response = get_comprehensive_monthly_ranking(exam_id)
-        if not ranking_response.json.get('success'):
-            return error_response('Failed to get current rankings', 500)
-        
-        rankings = ranking_response.json['data']['rankings']
-        updated_count = 0
-        
-        for rank_data in rankings:
-            user_id = rank_data['user_id']
-            position = rank_data['position']
-            
-            # Create or update MonthlyRanking record with roll number = position
-            ranking = MonthlyRanking.query.filter_by(
-                monthly_exam_id=exam_id,
-                user_id=user_id
-            ).first()
-            
-            if not ranking:
-                ranking = MonthlyRanking(
-                    monthly_exam_id=exam_id,
-                    user_id=user_id,
-                    position=position,
-                    roll_number=position
-                )
-                db.session.add(ranking)
-            else:
-                ranking.roll_number = position
-                ranking.position = position
-                ranking.updated_at = datetime.utcnow()
-            
-            updated_count += 1
+        updated_count = allocate_roll_numbers(monthly_exam, rule='position')
         
+        invalidate_ranking_and_next_month(monthly_exam)
+        refresh_homepage_feed()
         db.session.commit()
         
         return success_response('Roll numbers auto-assigned based on ranking', {
@@ -717,92 +511,19 @@ def auto_assign_roll_numbers(exam_id):
 def generate_monthly_ranking(exam_id):
     """Generate and save final monthly rankings to database"""
     try:
-        from models import MonthlyRanking
-        
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
-        # Get comprehensive ranking data (same as the display function)
-        ranking_response_tuple = get_comprehensive_monthly_ranking(exam_id)
-        ranking_response, status_code = ranking_response_tuple
+        # Get comprehensive ranking data (same engine as the display endpoint)
+        rankings = compute_comprehensive_ranking(monthly_exam)
         
-        if status_code != 200:
-            return error_response('Failed to calculate rankings', 500)
-            
-        ranking_data = ranking_response.get_json()
-        if not ranking_data.get('success'):
-            return error_response('Failed to calculate rankings', 500)
-            
-        rankings = ranking_data['data']['rankings']
-        updated_count = 0
-        
-        # Find previous month's exam to get roll numbers
-        prev_month = monthly_exam.month - 1 if monthly_exam.month > 1 else 12
-        prev_year = monthly_exam.year if monthly_exam.month > 1 else monthly_exam.year - 1
-        
-        prev_exam = MonthlyExam.query.filter_by(
-            batch_id=monthly_exam.batch_id,
-            month=prev_month,
-            year=prev_year
-        ).first()
-        
-        # Build a map of user_id to previous roll number
-        prev_roll_map = {}
-        if prev_exam:
-            print(f"\n🔍 Found previous exam: {prev_exam.month}/{prev_exam.year} (ID: {prev_exam.id})")
-            prev_rankings = MonthlyRanking.query.filter_by(
-                monthly_exam_id=prev_exam.id,
-                is_final=True
-            ).all()
-            print(f"📋 Previous rankings count: {len(prev_rankings)}")
-            for pr in prev_rankings:
-                if pr.roll_number:
-                    prev_roll_map[pr.user_id] = pr.roll_number
-                    print(f"  User {pr.user_id} had roll number: {pr.roll_number}")
-        else:
-            print(f"\n⚠️  No previous exam found for {prev_month}/{prev_year}")
-        
-        print(f"📊 Previous roll map: {prev_roll_map}")
-        
-        # Clear existing rankings for this exam
-        MonthlyRanking.query.filter_by(monthly_exam_id=exam_id).delete()
-        
-        # Create new ranking records and assign roll numbers from previous month
-        for idx, rank_data in enumerate(rankings):
-            # ALWAYS use previous month's roll number map, ignore current roll_number
-            user_id = rank_data['user_id']
-            
-            # Inherit from previous month or assign new roll number
-            if user_id in prev_roll_map:
-                roll_number = prev_roll_map[user_id]
-                print(f"✅ User {user_id}: Inherited roll {roll_number} from previous month")
-            else:
-                # New student: assign roll number based on current rank
-                roll_number = idx + 1
-                print(f"🆕 User {user_id}: New student, assigned roll {roll_number}")
-            
-            ranking = MonthlyRanking(
-                monthly_exam_id=exam_id,
-                user_id=rank_data['user_id'],
-                position=rank_data['position'],
-                roll_number=roll_number,  # Use previous month's roll or auto-assigned
-                total_exam_marks=rank_data['total_exam_marks'],
-                total_possible_marks=rank_data['total_possible_marks'],
-                attendance_marks=rank_data['attendance_marks'],
-                bonus_marks=0,  # No bonus marks as requested
-                final_total=rank_data['final_total'],
-                max_possible_total=rank_data['total_possible'],
-                percentage=rank_data['percentage'],
-                grade=rank_data['grade'],
-                gpa=rank_data['gpa'],
-                exam_gpa=rank_data['exam_gpa'],
-                previous_position=rank_data.get('previous_position'),
-                is_final=True
-            )
-            db.session.add(ranking)
-            updated_count += 1
+        # Upsert final ranking rows; roll numbers are inherited from the previous month
+        updated_count = save_final_rankings(monthly_exam, rankings)
+        logger.info(f"Saved {updated_count} final rankings for monthly exam {exam_id}")
         
+        invalidate_ranking_and_next_month(monthly_exam)
+        refresh_homepage_feed()
         db.session.commit()
         
         return success_response('Monthly rankings generated and saved successfully', {
@@ -816,12 +537,70 @@ def generate_monthly_ranking(exam_id):
         logger.error(f"Error generating monthly ranking: {e}")
         return error_response(f'Failed to generate ranking: {str(e)}', 500)
 
+@monthly_exams_bp.route('/<int:exam_id>/report-cards', methods=['POST'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def generate_report_cards_job(exam_id):
+    """Start a background job rendering one PDF report card per ranked student"""
+    try:
+        monthly_exam = get_monthly_exam(exam_id)
+        if not monthly_exam:
+            return error_response('Monthly exam not found', 404)
+        
+        rankings_count = MonthlyRanking.query.filter_by(monthly_exam_id=exam_id, is_final=True).count()
+        if not rankings_count:
+            return error_response('No final rankings found. Please generate the ranking first.', 400)
+        
+        current_user = get_current_user()
+        job = create_job(REPORT_CARD_JOB, params={'monthly_exam_id': exam_id},
+                         created_by=current_user.id, total=rankings_count)
+        db.session.commit()
+        
+        app = current_app._get_current_object()
+        start_job(app, job.id, lambda job_id: generate_report_cards(job_id, exam_id))
+        
+        return success_response('Report card generation started', {
+            'job_id': job.id,
+            'total': rankings_count,
+            'progress_url': f'/api/jobs/{job.id}',
+            'download_url': f'/api/monthly-exams/report-cards/jobs/{job.id}/download'
+        }, 202)
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error starting report card generation: {e}")
+        return error_response(f'Failed to start report card generation: {str(e)}', 500)
+
+
+@monthly_exams_bp.route('/report-cards/jobs/<int:job_id>/download', methods=['GET'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def download_report_cards(job_id):
+    """Download the ZIP of a completed report card job"""
+    try:
+        job = BackgroundJob.query.get(job_id)
+        if not job or job.job_type != REPORT_CARD_JOB:
+            return error_response('Report card job not found', 404)
+        if job.status != 'completed':
+            return error_response(f'Report cards are not ready (status: {job.status})', 409)
+        
+        path = get_report_card_path(job.id)
+        if not os.path.exists(path):
+            return error_response('Report card archive is no longer available', 410)
+        
+        return send_file(path, mimetype='application/zip', as_attachment=True,
+                         download_name=(job.result or {}).get('filename', f'report_cards_{job.id}.zip'))
+        
+    except Exception as e:
+        logger.error(f"Error downloading report cards: {e}")
+        return error_response(f'Failed to download report cards: {str(e)}', 500)
+
 @monthly_exams_bp.route('/<int:exam_id>/rankings-status', methods=['GET'])
 @login_required
 def check_rankings_status(exam_id):
     """Check if rankings have been generated and saved for this exam"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -849,7 +628,7 @@ def check_rankings_status(exam_id):
 def toggle_homepage_feature(exam_id):
     """Toggle whether this exam's top 3 students appear on homepage"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -858,6 +637,7 @@ def toggle_homepage_feature(exam_id):
         
         # Update the flag
         monthly_exam.show_on_homepage = show_on_homepage
+        refresh_homepage_feed()
         db.session.commit()
         
         message = 'Top 3 students will now appear on homepage' if show_on_homepage else 'Removed from homepage featured results'
@@ -888,7 +668,7 @@ def get_merit_list(exam_id):
     try:
         top_count = request.args.get('top', type=int, default=10)
         
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -925,83 +705,24 @@ def get_merit_list(exam_id):
 def get_exam_analytics(exam_id):
     """Get performance analytics for monthly exam"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
-        # Get all marks for this exam
-        marks = (db.session.query(MonthlyMark)
-                .filter_by(monthly_exam_id=exam_id)
-                .all())
-        
-        if not marks:
+        # All figures are aggregated in SQL
+        analytics = get_exam_analytics_data(monthly_exam)
+        if analytics is None:
             return error_response('No marks data available', 404)
         
-        # Calculate analytics
-        total_students = len(set(mark.user_id for mark in marks))
-        
-        # Overall performance
-        all_percentages = [mark.percentage for mark in marks if not mark.is_absent]
-        
-        if all_percentages:
-            avg_percentage = sum(all_percentages) / len(all_percentages)
-            highest_percentage = max(all_percentages)
-            lowest_percentage = min(all_percentages)
-        else:
-            avg_percentage = highest_percentage = lowest_percentage = 0
-        
-        # Pass/Fail statistics
-        pass_threshold = (monthly_exam.pass_marks / monthly_exam.total_marks) * 100
-        passed_count = sum(1 for p in all_percentages if p >= pass_threshold)
-        failed_count = len(all_percentages) - passed_count
-        absent_count = sum(1 for mark in marks if mark.is_absent)
+        analytics_data = {'monthly_exam': serialize_monthly_exam(monthly_exam)}
+        analytics_data.update(analytics)
         
-        # Grade distribution
-        grade_distribution = {}
-        for mark in marks:
-            if not mark.is_absent:
-                grade = mark.grade or 'F'
-                grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
-        
-        # Subject-wise performance
-        subjects = list(set(
-            exam.subject for exam in monthly_exam.individual_exams
-        ))
-        
-        subject_analytics = {}
-        for subject in subjects:
-            subject_marks = [
-                mark for mark in marks 
-                if mark.individual_exam.subject == subject and not mark.is_absent
-            ]
-            
-            if subject_marks:
-                subject_percentages = [mark.percentage for mark in subject_marks]
-                subject_analytics[subject] = {
-                    'average': sum(subject_percentages) / len(subject_percentages),
-                    'highest': max(subject_percentages),
-                    'lowest': min(subject_percentages),
-                    'students_count': len(subject_marks)
-                }
-        
-        analytics_data = {
-            'monthly_exam': serialize_monthly_exam(monthly_exam),
-            'overall_statistics': {
-                'total_students': total_students,
-                'average_percentage': round(avg_percentage, 2),
-                'highest_percentage': round(highest_percentage, 2),
-                'lowest_percentage': round(lowest_percentage, 2),
-                'pass_percentage': round((passed_count / total_students * 100), 2) if total_students > 0 else 0
-            },
-            'performance_breakdown': {
-                'passed': passed_count,
-                'failed': failed_count,
-                'absent': absent_count,
-                'total': total_students
-            },
-            'grade_distribution': grade_distribution,
-            'subject_wise_performance': subject_analytics
-        }
+        # Optional comparison with the batch's previous monthly exams
+        compare_months = request.args.get('compare_months', type=int, default=0)
+        if compare_months and compare_months > 1:
+            analytics_data['monthly_comparison'] = get_batch_exam_comparison(
+                monthly_exam, months=min(compare_months, 24)
+            )
         
         return success_response('Analytics retrieved successfully', analytics_data)
         
@@ -1015,7 +736,7 @@ def get_exam_analytics(exam_id):
 def publish_results(exam_id):
     """Publish monthly exam results"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -1026,10 +747,9 @@ def publish_results(exam_id):
         monthly_exam.show_results = True
         monthly_exam.result_published_at = datetime.utcnow()
         
-        db.session.commit()
-        
-        # Send notifications to students (optional)
+        # Queue notifications to students (optional) in the same transaction
         send_notifications = request.get_json().get('send_notifications', False)
+        sms_job = None
         
         if send_notifications:
             batch = monthly_exam.batch
@@ -1037,14 +757,27 @@ def publish_results(exam_id):
             
             message = f"প্রিয় শিক্ষার্থী, {monthly_exam.title} এর ফলাফল প্রকাশিত হয়েছে। আপনার ফলাফল দেখতে লগইন করুন।"
             
-            try:
-                send_bulk_notification(students, message, 'result')
-            except Exception as e:
-                logger.warning(f"Failed to send result notifications: {e}")
+            current_user = get_current_user()
+            for student in students:
+                phone = validate_phone_number(student.phoneNumber or '')
+                if not phone:
+                    continue
+                if sms_job is None:
+                    sms_job = create_sms_job(created_by=current_user.id, params={
+                        'source': 'results_published', 'monthly_exam_id': exam_id
+                    })
+                enqueue_sms(phone, message, user_id=student.id, sent_by=current_user.id, job=sms_job)
+            
+            if sms_job is not None:
+                reserve_sms_credits(sms_job)
+        
+        db.session.commit()
         
         return success_response('Results published successfully', {
             'monthly_exam': serialize_monthly_exam(monthly_exam),
-            'notifications_sent': send_notifications
+            'notifications_sent': send_notifications,
+            'sms_job_id': sms_job.id if sms_job else None,
+            'sms_progress_url': f'/api/jobs/{sms_job.id}' if sms_job else None
         })
         
     except Exception as e:
@@ -1059,7 +792,7 @@ def get_individual_exams(exam_id):
     try:
         current_user = get_current_user()
         
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -1117,7 +850,7 @@ def create_individual_exam(exam_id):
         if missing_fields:
             return error_response(f'Missing required fields: {", ".join(missing_fields)}', 400)
         
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -1155,6 +888,7 @@ def create_individual_exam(exam_id):
         monthly_exam.total_marks = new_total
         monthly_exam.pass_marks = int(new_total * 0.33)  # Update pass marks to 33% of new total
         
+        invalidate_ranking_snapshots([exam_id])
         db.session.commit()
         
         return success_response('Individual exam created successfully', {
@@ -1212,7 +946,7 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
         
         # Validate monthly exam exists
         try:
-            monthly_exam = MonthlyExam.query.get(exam_id)
+            monthly_exam = get_monthly_exam(exam_id)
             if not monthly_exam:
                 logger.error(f"Monthly exam not found: {exam_id}")
                 return error_response('Monthly exam not found', 404)
@@ -1235,7 +969,6 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
             return error_response(f'Database error: {str(db_error)}', 500)
         
         students_data = data['students']  # List of student mark entries
-        saved_count = 0
         errors = []  # Track any errors
         sms_notifications = []  # Track SMS notifications to send
         
@@ -1244,131 +977,78 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
             logger.error("Empty students data provided")
             return error_response('At least one student mark is required', 400)
         
+        # Validate entries in memory first
+        valid_entries = []
         for idx, student_entry in enumerate(students_data):
+            # Validate student entry structure
+            if not isinstance(student_entry, dict):
+                errors.append(f"Student entry {idx + 1}: Must be an object")
+                continue
+            
+            user_id = student_entry.get('user_id')
+            
+            # Validate user_id
+            if not user_id:
+                errors.append(f"Student entry {idx + 1}: user_id is required")
+                continue
             try:
-                # Validate student entry structure
-                if not isinstance(student_entry, dict):
-                    errors.append(f"Student entry {idx + 1}: Must be an object")
-                    continue
-                
-                user_id = student_entry.get('user_id')
-                marks_obtained = student_entry.get('marks_obtained')
-                
-                # Validate user_id
-                if not user_id:
-                    errors.append(f"Student entry {idx + 1}: user_id is required")
-                    continue
-                
-                # Validate marks_obtained
-                if marks_obtained is None or marks_obtained == '':
-                    errors.append(f"Student entry {idx + 1}: marks_obtained is required")
-                    continue
-                
-                # Convert and validate marks
-                try:
-                    marks_obtained = float(marks_obtained)
-                    if marks_obtained < 0:
-                        errors.append(f"Student entry {idx + 1}: marks cannot be negative")
-                        continue
-                    if marks_obtained > individual_exam.marks:
-                        errors.append(f"Student entry {idx + 1}: marks ({marks_obtained}) cannot exceed total marks ({individual_exam.marks})")
-                        continue
-                except (ValueError, TypeError) as e:
-                    errors.append(f"Student entry {idx + 1}: invalid marks format ({marks_obtained})")
-                    continue
-                
-                # Validate user exists
-                try:
-                    user = User.query.get(user_id)
-                    if not user:
-                        errors.append(f"Student entry {idx + 1}: student not found (ID: {user_id})")
-                        continue
-                except Exception as db_error:
-                    error_msg = f"Student entry {idx + 1}: database error while fetching student {user_id}: {str(db_error)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
-                    continue
+                user_id = int(user_id)
+            except (ValueError, TypeError):
+                errors.append(f"Student entry {idx + 1}: invalid user_id ({user_id})")
+                continue
             
-                # Check if mark already exists
-                try:
-                    existing_mark = MonthlyMark.query.filter_by(
-                        monthly_exam_id=exam_id,
-                        individual_exam_id=individual_exam_id,
-                        user_id=user_id
-                    ).first()
-                except Exception as db_error:
-                    error_msg = f"Student entry {idx + 1}: database error while checking existing marks: {str(db_error)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
-                    continue
-                
-                # Calculate percentage, grade, and GPA
-                percentage = (marks_obtained / individual_exam.marks) * 100 if individual_exam.marks > 0 else 0
-                grade, gpa = calculate_grade_and_gpa(percentage)
-                
-                # Prepare SMS notification data
-                sms_notifications.append({
-                    'student': user,
-                    'marks_obtained': marks_obtained,
-                    'total_marks': individual_exam.marks,
-                    'percentage': percentage,
-                    'grade': grade,
-                    'subject': individual_exam.subject,
-                    'exam_title': individual_exam.title
-                })
-                
-                if existing_mark:
-                    # Update existing mark
-                    existing_mark.marks_obtained = marks_obtained
-                    existing_mark.total_marks = individual_exam.marks
-                    existing_mark.percentage = percentage
-                    existing_mark.grade = grade
-                    existing_mark.gpa = gpa
-                    existing_mark.is_absent = False  # No absent option
-                    existing_mark.remarks = ''      # No remarks option
-                    existing_mark.updated_at = datetime.utcnow()
-                    logger.info(f"Updated mark for user {user_id}: {marks_obtained}/{individual_exam.marks}")
-                else:
-                    # Create new mark
-                    monthly_mark = MonthlyMark(
-                        monthly_exam_id=exam_id,
-                        individual_exam_id=individual_exam_id,
-                        user_id=user_id,
-                        marks_obtained=marks_obtained,
-                        total_marks=individual_exam.marks,
-                        percentage=percentage,
-                        grade=grade,
-                        gpa=gpa,
-                        is_absent=False,  # No absent option
-                        remarks=''        # No remarks option
-                    )
-                    db.session.add(monthly_mark)
-                    logger.info(f"Created new mark for user {user_id}: {marks_obtained}/{individual_exam.marks}")
-                
-                saved_count += 1
-                
-            except Exception as entry_error:
-                error_msg = f"Student entry {idx + 1}: {str(entry_error)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
+            # Convert and validate marks
+            marks_obtained, marks_error = parse_marks_value(student_entry.get('marks_obtained'), individual_exam.marks)
+            if marks_error:
+                errors.append(f"Student entry {idx + 1}: {marks_error}")
+                continue
+            
+            valid_entries.append((idx, user_id, marks_obtained))
+        
+        # Prefetch students and existing marks with one query each
+        entry_user_ids = {user_id for _, user_id, _ in valid_entries}
+        try:
+            users_by_id = {
+                user.id: user for user in User.query.filter(User.id.in_(entry_user_ids)).all()
+            } if entry_user_ids else {}
+            existing_keys = get_existing_mark_user_ids(exam_id, [individual_exam_id], entry_user_ids)
+        except Exception as db_error:
+            logger.error(f"Database error while loading students and marks: {str(db_error)}")
+            return error_response(f'Database error: {str(db_error)}', 500)
+        
+        marks_by_user = {}
+        for idx, user_id, marks_obtained in valid_entries:
+            if user_id not in users_by_id:
+                errors.append(f"Student entry {idx + 1}: student not found (ID: {user_id})")
                 continue
+            marks_by_user[user_id] = marks_obtained  # Last entry for a student wins
+        
+        # Calculate percentage, grade, and GPA for all rows at once
+        mark_rows = build_mark_rows(exam_id, individual_exam, marks_by_user)
+        saved_count = len(mark_rows)  # One row per student, however often they were listed
+        
+        for row in mark_rows:
+            # Prepare SMS notification data
+            sms_notifications.append({
+                'student': users_by_id[row['user_id']],
+                'marks_obtained': row['marks_obtained'],
+                'total_marks': individual_exam.marks,
+                'percentage': row['percentage'],
+                'grade': row['grade'],
+                'subject': individual_exam.subject,
+                'exam_title': individual_exam.title
+            })
+        
+        updated_count = sum(1 for user_id in marks_by_user if (individual_exam_id, user_id) in existing_keys)
+        logger.info(f"Prepared {len(mark_rows)} marks ({updated_count} updates, {len(mark_rows) - updated_count} new)")
         
         # If there were validation errors, return them
         if errors and saved_count == 0:
             return error_response(f'Validation errors: {"; ".join(errors[:5])}', 400)
         
-        # Commit database changes
-        try:
-            db.session.commit()
-            logger.info(f"Successfully saved {saved_count} marks to database")
-        except Exception as db_error:
-            db.session.rollback()
-            logger.error(f"Database commit failed: {str(db_error)}")
-            return error_response(f'Failed to save marks to database: {str(db_error)}', 500)
-        
-        # Send SMS notifications after successful save
+        # Queue SMS notifications in the same transaction as the marks
         current_user = get_current_user()
-        sms_sent_count = 0
+        sms_job = None
         sms_failed_count = 0
         sms_errors = []
         
@@ -1379,35 +1059,41 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
             exam_template_message = get_sms_template('exam_result')
             
             for notification in sms_notifications:
-                try:
-                    student = notification['student']
-                    
-                    # Determine phone number to send to (prefer parent/guardian phone)
-                    target_phone = get_target_phone(student)
-                    
-                    if not target_phone:
-                        sms_errors.append(f"No valid phone number for {student.full_name}")
-                        sms_failed_count += 1
-                        continue
-                    
-                    # Generate message using template
-                    message = generate_exam_result_message(exam_template_message, notification)
-                    
-                    # Send SMS
-                    sms_result = send_sms_notification(target_phone, message, current_user)
-                    if sms_result.get('success'):
-                        sms_sent_count += 1
-                        logger.info(f"SMS sent successfully to {target_phone} for {student.full_name}")
-                    else:
-                        error_msg = sms_result.get('error', 'Unknown SMS error')
-                        sms_errors.append(f"SMS failed for {student.full_name}: {error_msg}")
-                        sms_failed_count += 1
-                            
-                except Exception as sms_error:
-                    error_msg = f"SMS error for {student.full_name}: {str(sms_error)}"
-                    logger.warning(error_msg)
-                    sms_errors.append(error_msg)
+                student = notification['student']
+                
+                # Determine phone number to send to (prefer parent/guardian phone)
+                target_phone = get_target_phone(student)
+                
+                if not target_phone:
+                    sms_errors.append(f"No valid phone number for {student.full_name}")
                     sms_failed_count += 1
+                    continue
+                
+                # Generate message using template
+                message = generate_exam_result_message(exam_template_message, notification)
+                
+                if sms_job is None:
+                    sms_job = create_sms_job(created_by=current_user.id, params={
+                        'source': 'exam_marks', 'monthly_exam_id': exam_id, 'individual_exam_id': individual_exam_id
+                    })
+                sms_result = send_sms_notification(target_phone, message, current_user, user_id=student.id, job=sms_job)
+                if not sms_result.get('success'):
+                    sms_errors.append(f"SMS failed for {student.full_name}: {sms_result.get('error')}")
+                    sms_failed_count += 1
+            
+            if sms_job is not None:
+                reserve_sms_credits(sms_job)
+        
+        # Commit database changes
+        try:
+            upsert_monthly_marks(mark_rows)
+            refresh_ranking_rows(monthly_exam, list(marks_by_user))
+            db.session.commit()
+            logger.info(f"Successfully saved {saved_count} marks to database")
+        except Exception as db_error:
+            db.session.rollback()
+            logger.error(f"Database commit failed: {str(db_error)}")
+            return error_response(f'Failed to save marks to database: {str(db_error)}', 500)
         
         # Prepare response data
         response_data = {
@@ -1423,8 +1109,10 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
         # Add SMS info if SMS was attempted
         if send_sms:
             response_data.update({
-                'sms_sent': sms_sent_count,
+                'sms_queued': sms_job.total if sms_job else 0,
                 'sms_failed': sms_failed_count,
+                'sms_job_id': sms_job.id if sms_job else None,
+                'sms_progress_url': f'/api/jobs/{sms_job.id}' if sms_job else None,
                 'remaining_sms_balance': current_user.sms_count
             })
             
@@ -1446,13 +1134,57 @@ def submit_individual_exam_marks(exam_id, individual_exam_id):
         logger.error(f"Unexpected error saving individual exam marks: {str(e)}")
         return error_response(f'An unexpected error occurred while saving marks: {str(e)}', 500)
 
+@monthly_exams_bp.route('/<int:exam_id>/marks/import', methods=['POST'])
+@login_required
+@require_role(UserRole.TEACHER, UserRole.SUPER_USER)
+def import_monthly_exam_marks(exam_id):
+    """Import a roll number x paper marks grid (CSV or XLSX) for all papers of a monthly exam"""
+    try:
+        monthly_exam = get_monthly_exam(exam_id)
+        if not monthly_exam:
+            return error_response('Monthly exam not found', 404)
+        
+        if 'file' not in request.files:
+            return error_response('No file provided', 400)
+        
+        upload = request.files['file']
+        if not upload.filename:
+            return error_response('No file selected', 400)
+        
+        try:
+            rows = iter_upload_rows(upload.filename, upload.stream)
+            summary = import_marks_grid(monthly_exam, rows)
+        except MarksImportError as import_error:
+            db.session.rollback()
+            return error_response(str(import_error), 400)
+        except UnicodeDecodeError:
+            db.session.rollback()
+            return error_response('CSV file must be UTF-8 encoded', 400)
+        
+        invalidate_ranking_snapshots([exam_id])
+        db.session.commit()
+        
+        error_count = len(summary['row_errors'])
+        message = f"Imported {summary['imported_count']} marks"
+        if error_count:
+            message += f' ({error_count} rows with errors)'
+        
+        summary['row_errors'] = summary['row_errors'][:200]  # Limit report size
+        summary['error_count'] = error_count
+        return success_response(message, summary)
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error importing marks for monthly exam {exam_id}: {e}")
+        return error_response(f'Failed to import marks: {str(e)}', 500)
+
 @monthly_exams_bp.route('/<int:exam_id>/individual-exams/<int:individual_exam_id>/marks', methods=['GET'])
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
 def get_individual_exam_marks(exam_id, individual_exam_id):
     """Get existing marks for an individual exam"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -1500,7 +1232,7 @@ def get_individual_exam_marks(exam_id, individual_exam_id):
 def delete_individual_exam(exam_id, individual_exam_id):
     """Delete an individual exam and update monthly exam total"""
     try:
-        monthly_exam = MonthlyExam.query.get(exam_id)
+        monthly_exam = get_monthly_exam(exam_id)
         if not monthly_exam:
             return error_response('Monthly exam not found', 404)
         
@@ -1527,6 +1259,7 @@ def delete_individual_exam(exam_id, individual_exam_id):
         monthly_exam.total_marks = new_total
         monthly_exam.pass_marks = int(new_total * 0.33) if new_total > 0 else 0
         
+        invalidate_ranking_snapshots([exam_id])
         db.session.commit()
         
         return success_response('Individual exam deleted successfully', {
@@ -1542,59 +1275,61 @@ def delete_individual_exam(exam_id, individual_exam_id):
 @monthly_exams_bp.route('/<int:exam_id>', methods=['DELETE'])
 @login_required
 def delete_monthly_exam(exam_id):
-    """Delete a monthly exam period and all associated data"""
+    """
+    Delete a monthly exam period and all associated data.
+
+    The exam is hidden at once through its soft-delete flag; its rows are
+    removed by a background job in small transactions. Pass cascade=true to
+    also delete entered marks.
+    """
     try:
         current_user = get_current_user()
-        print(f"DELETE request for monthly exam {exam_id} by user {current_user.id}")
         
-        # Use query instead of session.get for better debugging
+        # Include soft-deleted exams so an interrupted purge can be restarted
         monthly_exam = MonthlyExam.query.filter_by(id=exam_id).first()
-        
         if not monthly_exam:
-            print(f"ERROR: Monthly exam {exam_id} not found in database")
-            # Check if it ever existed
-            all_exams = MonthlyExam.query.all()
-            print(f"Available monthly exams: {[e.id for e in all_exams]}")
             return error_response('Monthly exam not found. It may have been already deleted.', 404)
         
-        print(f"Found monthly exam: {monthly_exam.title} (ID: {monthly_exam.id})")
-        
         # Check if user has permission
         if current_user.role not in [UserRole.SUPER_USER, UserRole.TEACHER]:
             return error_response('Permission denied', 403)
         
-        # Check if any marks have been entered
-        marks_count = MonthlyMark.query.filter_by(monthly_exam_id=exam_id).count()
-        print(f"Marks count for exam {exam_id}: {marks_count}")
-        if marks_count > 0:
-            return error_response('Cannot delete exam period. Marks have been entered. Please delete all marks first.', 400)
-        
-        # Delete associated data
-        # Delete rankings
-        rankings_deleted = MonthlyRanking.query.filter_by(monthly_exam_id=exam_id).delete()
-        print(f"Deleted {rankings_deleted} rankings")
-        
-        # Delete individual exams
-        individual_deleted = IndividualExam.query.filter_by(monthly_exam_id=exam_id).delete()
-        print(f"Deleted {individual_deleted} individual exams")
-        
-        # Delete the monthly exam
-        db.session.delete(monthly_exam)
+        # Entered marks are only deleted on explicit request
+        cascade = request.args.get('cascade', 'false').lower() == 'true'
+        if not cascade and not monthly_exam.is_deleted:
+            has_marks = db.session.query(MonthlyMark.id).filter_by(monthly_exam_id=exam_id).first() is not None
+            if has_marks:
+                return error_response('Cannot delete exam period. Marks have been entered. Please delete all marks first.', 400)
+        
+        was_featured = monthly_exam.show_on_homepage
+        soft_delete_monthly_exam(monthly_exam)
+        # The next month's previous positions and inherited roll numbers came from this exam
+        invalidate_ranking_and_next_month(monthly_exam)
+        if was_featured:
+            refresh_homepage_feed()
+        job = create_job(EXAM_DELETE_JOB, params={'monthly_exam_id': exam_id}, created_by=current_user.id)
         db.session.commit()
         
-        print(f"Successfully deleted monthly exam {exam_id}")
-        return success_response('Monthly exam period deleted successfully')
+        app = current_app._get_current_object()
+        start_job(app, job.id, lambda job_id: purge_monthly_exam(job_id, exam_id))
+        
+        logger.info(f"Monthly exam {exam_id} marked deleted by user {current_user.id}; purge job {job.id}")
+        return success_response('Monthly exam period deleted successfully', {
+            'job_id': job.id,
+            'progress_url': f'/api/jobs/{job.id}'
+        }, 202)
         
     except Exception as e:
         db.session.rollback()
-        print(f"ERROR deleting monthly exam {exam_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
         current_app.logger.error(f'Error deleting monthly exam: {str(e)}')
         return error_response(f'Failed to delete monthly exam: {str(e)}', 500)
 
 # Helper functions
 
+def get_monthly_exam(exam_id):
+    """Monthly exam by id, or None if it does not exist or is being deleted"""
+    return MonthlyExam.query.filter_by(id=exam_id, is_deleted=False).first()
+
 def serialize_monthly_exam(exam):
     """Serialize monthly exam to dict"""
     return {
@@ -1618,33 +1353,10 @@ def serialize_monthly_exam(exam):
         'created_at': exam.created_at.isoformat()
     }
 
-def calculate_grade_and_gpa(percentage):
-    """Calculate grade and GPA based on percentage"""
-    if percentage >= 80:
-        return 'A+', 5.00
-    elif percentage >= 70:
-        return 'A', 4.00
-    elif percentage >= 60:
-        return 'A-', 3.50
-    elif percentage >= 50:
-        return 'B', 3.00
-    elif percentage >= 40:
-        return 'C', 2.00
-    elif percentage >= 33:
-        return 'D', 1.00
-    else:
-        return 'F', 0.00
-
 def get_bonus_marks_for_exam(exam_id, user_id):
     """Get bonus marks for a student in a monthly exam"""
     try:
-        bonus_key = f"monthly_exam_bonus_{exam_id}"
-        bonus_setting = Settings.query.filter_by(key=bonus_key).first()
-        
-        if bonus_setting and bonus_setting.value:
-            return float(bonus_setting.value.get(str(user_id), 0))
-        
-        return 0
+        return get_bonus_marks(exam_id, [user_id]).get(user_id, 0)
     except Exception as e:
         logger.error(f"Error getting bonus marks: {e}")
         return 0
@@ -1666,22 +1378,25 @@ def calculate_monthly_rankings(exam_id, return_data=False):
             .all()
         )
         
-        # Calculate overall percentage and rank
+        # Calculate overall percentage, graded for all students at once
+        student_totals = [student for student in student_totals if student.total_marks > 0]
+        overall_percentages = [
+            (student.total_obtained / student.total_marks) * 100 for student in student_totals
+        ]
+        overall_grades, overall_gpas = grade_percentages(overall_percentages)
+        
         rankings = []
-        for student in student_totals:
-            if student.total_marks > 0:
-                overall_percentage = (student.total_obtained / student.total_marks) * 100
-                overall_grade, overall_gpa = calculate_grade_and_gpa(overall_percentage)
-                
-                rankings.append({
-                    'user_id': student.user_id,
-                    'total_obtained': student.total_obtained,
-                    'total_marks': student.total_marks,
-                    'percentage': round(overall_percentage, 2),
-                    'grade': overall_grade,
-                    'gpa': round(overall_gpa, 2),
-                    'absent_count': student.absent_count or 0
-                })
+        for student, overall_percentage, overall_grade, overall_gpa in zip(
+                student_totals, overall_percentages, overall_grades, overall_gpas):
+            rankings.append({
+                'user_id': student.user_id,
+                'total_obtained': student.total_obtained,
+                'total_marks': student.total_marks,
+                'percentage': round(overall_percentage, 2),
+                'grade': overall_grade,
+                'gpa': round(overall_gpa, 2),
+                'absent_count': student.absent_count or 0
+            })
         
         # Sort by percentage (descending) and assign ranks
         rankings.sort(key=lambda x: (-x['percentage'], x['user_id']))
@@ -1768,39 +1483,14 @@ def validate_phone_number(phone):
 def get_sms_template(template_type):
     """Get SMS template with fallback to default templates"""
     try:
-        # Try to get custom template from session first
+        # Session override first, then the template saved in Settings (cached per process)
         from flask import session
-        custom_templates = session.get('custom_templates', {})
-        custom_template = custom_templates.get(template_type)
-        
-        if custom_template:
-            return custom_template
-        
-        # Try to get template from Settings table
-        template_key = f"sms_template_{template_type}"
-        template_setting = Settings.query.filter_by(key=template_key).first()
-        
-        if template_setting and template_setting.value:
-            return template_setting.value.get('message', get_default_template(template_type))
-        
-        # Return default template
-        return get_default_template(template_type)
+        return resolve_template(template_type, session.get('custom_templates', {}))
         
     except Exception as e:
         logger.warning(f"Error getting SMS template: {e}")
         return get_default_template(template_type)
 
-def get_default_template(template_type):
-    """Get default short SMS templates (Bangla, optimized for 1 SMS)"""
-    templates = {
-        'exam_result': "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}",
-        'attendance_present': "{student_name} উপস্থিত ({batch_name})",
-        'attendance_absent': "{student_name} অনুপস্থিত {date} ({batch_name})",
-        'fee_reminder': "{student_name} এর ফি {amount}৳ বকেয়া। শেষ তারিখ {due_date}",
-        'general': "{student_name}: {message}"
-    }
-    return templates.get(template_type, templates['general'])
-
 def get_target_phone(student):
     """Get the target phone number for SMS (prefer guardian phone)"""
     try:
@@ -1838,8 +1528,12 @@ def generate_exam_result_message(template, notification):
             'date': datetime.now().strftime('%d/%m')  # Short date format DD/MM
         }
         
-        # Format the template (short Bangla: "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}")
-        message = template.format(**variables)
+        # Fill the compiled template (short Bangla: "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}")
+        compiled = compile_template(template)
+        missing = compiled.missing(variables)
+        if missing:
+            raise KeyError(missing[0])
+        message = compiled.render(variables)
         
         # New short template fits in 1 SMS (100 chars for mixed Bangla/English)
         return message
@@ -1849,130 +1543,46 @@ def generate_exam_result_message(template, notification):
         # Ultimate fallback
         return f"{notification['student'].first_name} scored {int(notification['marks_obtained'])}/{int(notification['total_marks'])} marks in {notification['subject']}"
 
-def send_sms_notification(phone, message, current_user):
-    """Send SMS notification and log the attempt"""
-    try:
-        # Use the BulkSMSBD API
-        api_key = "gsOKLO6XtKsANCvgPHNt"
-        sender_id = "8809617628909"
-        api_url = "http://bulksmsbd.net/api/smsapi"
-        
-        # Format phone number
-        formatted_phone = validate_phone_number(phone)
-        if not formatted_phone:
-            return {'success': False, 'error': 'Invalid phone number format'}
-        
-        # Prepare API payload
-        payload = {
-            'api_key': api_key,
-            'type': 'text',
-            'number': formatted_phone,
-            'senderid': sender_id,
-            'message': message
-        }
-        
-        # Create SMS log entry
-        sms_log = SmsLog(
-            phone_number=formatted_phone,
-            message=message,
-            sent_by=current_user.id,
-            status=SmsStatus.PENDING
-        )
-        
-        # Find user by phone number for logging
+def send_sms_notification(phone, message, current_user, user_id=None, job=None):
+    """Queue an SMS notification for the SMS dispatcher; the caller commits"""
+    formatted_phone = validate_phone_number(phone)
+    if not formatted_phone:
+        return {'success': False, 'error': 'Invalid phone number format'}
+    
+    # Find user by phone number for logging
+    if user_id is None:
         user = User.query.filter_by(phoneNumber=formatted_phone).first()
-        if user:
-            sms_log.user_id = user.id
-        
-        # Send SMS
-        response = requests.post(api_url, data=payload, timeout=30)
-        
-        if response.status_code == 200:
-            # Check if response contains success indicator
-            response_text = response.text.lower()
-            if 'success' in response_text or 'sent' in response_text:
-                sms_log.status = SmsStatus.SENT
-                sms_log.sent_at = datetime.utcnow()
-                sms_log.cost = 1  # Default cost
-                
-                # Deduct SMS count from user
-                current_user.sms_count = max(0, current_user.sms_count - 1)
-                
-                db.session.add(sms_log)
-                db.session.commit()
-                
-                return {'success': True, 'message_id': None, 'cost': 1}
-            else:
-                sms_log.status = SmsStatus.FAILED
-                sms_log.api_response = {'error': response.text}
-                db.session.add(sms_log)
-                db.session.commit()
-                
-                return {'success': False, 'error': response.text}
-        else:
-            sms_log.status = SmsStatus.FAILED
-            sms_log.api_response = {'error': f'HTTP {response.status_code}: {response.text}'}
-            db.session.add(sms_log)
-            db.session.commit()
-            
-            return {'success': False, 'error': f'HTTP {response.status_code}: {response.text}'}
+        user_id = user.id if user else None
     
-    except requests.exceptions.Timeout:
-        return {'success': False, 'error': 'SMS API timeout'}
-    except requests.exceptions.ConnectionError:
-        return {'success': False, 'error': 'SMS API connection error'}
-    except Exception as e:
-        return {'success': False, 'error': f'SMS API error: {str(e)}'}
+    enqueue_sms(formatted_phone, message, user_id=user_id, sent_by=current_user.id, job=job, charge_sender=True)
+    return {'success': True, 'queued': True}
 
 
 @monthly_exams_bp.route('/homepage-top-performers', methods=['GET'])
 def get_homepage_top_performers():
     """Get top 3 students from all monthly exams featured on homepage"""
     try:
-        # Find all monthly exams that are marked to show on homepage
-        featured_exams = MonthlyExam.query.filter_by(show_on_homepage=True).all()
-        
-        if not featured_exams:
-            return success_response('No featured exams', {'featured_results': []})
+        # Served from the precomputed feed; refreshed when rankings or featured exams change
+        feed = get_homepage_feed()
+        featured_results = feed['featured_results']
         
-        featured_results = []
+        if not featured_results:
+            response, status = success_response('No featured exams', {'featured_results': []})
+        else:
+            response, status = success_response('Featured top performers retrieved', {
+                'featured_results': featured_results,
+                'count': len(featured_results)
+            })
         
-        for exam in featured_exams:
-            # Get top 3 rankings for this exam
-            top_rankings = MonthlyRanking.query.filter_by(
-                monthly_exam_id=exam.id,
-                is_final=True
-            ).order_by(MonthlyRanking.position.asc()).limit(3).all()
-            
-            if top_rankings:
-                top_students = []
-                for ranking in top_rankings:
-                    student = User.query.get(ranking.user_id)
-                    if student:
-                        top_students.append({
-                            'position': ranking.position,
-                            'student_name': student.full_name,
-                            'student_phone': student.phoneNumber,
-                            'roll_number': ranking.roll_number,
-                            'total_marks': ranking.final_total,
-                            'total_possible': ranking.max_possible_total,
-                            'percentage': round(ranking.percentage, 2) if ranking.percentage else 0,
-                            'grade': ranking.grade
-                        })
-                
-                featured_results.append({
-                    'exam_id': exam.id,
-                    'exam_title': exam.title,
-                    'month': exam.month,
-                    'year': exam.year,
-                    'batch_name': exam.batch.name if exam.batch else 'N/A',
-                    'top_students': top_students
-                })
+        if feed.get('etag'):
+            response.set_etag(feed['etag'])
+            response.last_modified = datetime.fromisoformat(feed['generated_at'])
+            response.cache_control.public = True
+            response.cache_control.max_age = 60
+            response = response.make_conditional(request)
+            status = response.status_code
         
-        return success_response('Featured top performers retrieved', {
-            'featured_results': featured_results,
-            'count': len(featured_results)
-        })
+        return response, status
         
     except Exception as e:
         logger.error(f"Error getting homepage top performers: {e}")
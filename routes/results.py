@@ -3,9 +3,11 @@ Results Management Routes
 Monthly result calculation and reporting
 """
 from flask import Blueprint, request
-from models import db, MonthlyResult, User, Batch, ExamSubmission, Attendance, Fee, UserRole, AttendanceStatus, FeeStatus
+from models import (db, MonthlyResult, User, Batch, Exam, ExamSubmission, Attendance, Fee, UserRole,
+                    AttendanceStatus, FeeStatus, SubmissionStatus)
 from utils.auth import login_required, require_role, get_current_user, check_batch_access
 from utils.response import success_response, error_response, paginated_response
+from services.calendar_service import get_month_bounds, get_working_dates
 from sqlalchemy import or_, and_, func, extract, case
 from datetime import datetime, date
 import calendar
@@ -166,9 +168,10 @@ def calculate_monthly_results():
             return error_response('No active students found in this batch', 404)
         
         # Calculate date range for the month
-        start_date = date(year, month, 1)
-        last_day = calendar.monthrange(year, month)[1]
-        end_date = date(year, month, last_day)
+        start_date, end_date = get_month_bounds(month, year)
+        # Attendance is a share of the batch's class days, as in the monthly rankings
+        working_dates = set(get_working_dates(batch, month, year))
+        working_days = len(working_dates)
         
         calculated_results = []
         
@@ -186,11 +189,10 @@ def calculate_monthly_results():
                 ExamSubmission.exam
             ).filter(
                 ExamSubmission.user_id == student.id,
-                ExamSubmission.status == 'submitted',
+                ExamSubmission.status == SubmissionStatus.SUBMITTED,
                 func.date(ExamSubmission.submitted_at) >= start_date,
-                func.date(ExamSubmission.submitted_at) <= end_date
-            ).join(
-                ExamSubmission.exam.batches.any(Batch.id == batch_id)
+                func.date(ExamSubmission.submitted_at) <= end_date,
+                Exam.batches.any(Batch.id == batch_id)
             ).all()
             
             # Calculate exam statistics
@@ -207,9 +209,12 @@ def calculate_monthly_results():
                 Attendance.date <= end_date
             ).all()
             
-            if attendance_records:
-                present_count = len([a for a in attendance_records if a.status in [AttendanceStatus.PRESENT, AttendanceStatus.LATE]])
-                attendance_percentage = (present_count / len(attendance_records) * 100)
+            if attendance_records and working_days > 0:
+                # Only class days count; a record on a holiday or an off day would push the share past 100%
+                present_count = len([a for a in attendance_records
+                                     if a.date in working_dates
+                                     and a.status in [AttendanceStatus.PRESENT, AttendanceStatus.LATE]])
+                attendance_percentage = (present_count / working_days * 100)
             else:
                 attendance_percentage = 0
             
@@ -3,17 +3,26 @@ SMS Management Routes
 SMS sending, template management, and notification system
 """
 from flask import Blueprint, request, jsonify, session
-from models import db, SmsLog, User, Batch, UserRole, SmsStatus, user_batches
+from models import db, SmsDailyStat, SmsLog, User, Batch, UserRole, SmsStatus, user_batches
 from utils.auth import login_required, require_role, get_current_user
-from utils.response import success_response, error_response, paginated_response
-from sqlalchemy import or_, func, extract
+from utils.response import success_response, error_response, paginated_response, cursor_paginated_response
+from services.sms_balance import get_sms_balance as get_ledger_balance, reserve_sms_credits
+from services.sms_gateway import get_gateway
+from services.sms_coalesce import SmsDraft, coalesce_sms
+from services.sms_outbox import create_sms_job, enqueue_sms
+from services.sms_segments import cost_sms_batch, max_units, measure_sms, sms_segments
+from services.sms_stats import NO_SENDER
+from services.sms_templates import compile_template, get_user_templates, invalidate_sms_templates
+from sqlalchemy import and_, or_, func, extract
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date, timedelta
-import requests
 import os
 import re
 
 sms_bp = Blueprint('sms', __name__)
 
+MAX_MESSAGE_SEGMENTS = 1  # Messages and templates must fit in a single SMS
+
 BASE_SMS_TEMPLATES = [
     {
         'id': 'attendance_present',
@@ -43,8 +52,9 @@ BASE_SMS_TEMPLATES = [
 
 
 def build_template_payload(template_def, override_message=None):
-    """Create template payload with character count, applying overrides if provided."""
+    """Create template payload with SMS length, applying overrides if provided."""
     message = override_message if override_message is not None else template_def['default_message']
+    stats = measure_sms(message)
     return {
         'id': template_def['id'],
         'name': template_def['name'],
@@ -52,7 +62,10 @@ def build_template_payload(template_def, override_message=None):
         'variables': template_def.get('variables', []),
         'editable': template_def.get('editable', True),
         'message': message,
-        'char_count': count_sms_characters(message)
+        'placeholders': list(compile_template(message).placeholders),
+        'char_count': stats['units'],
+        'encoding': stats['encoding'],
+        'sms_count': stats['segments']
     }
 
 
@@ -76,17 +89,11 @@ def get_template_payload(template_id):
 
 def get_all_templates():
     """Return all templates with database and session overrides applied."""
-    from models import SmsTemplate
-    
     user_id = session.get('user_id')
     custom_templates = session.get('custom_templates', {})
     
-    # Load saved templates from database if user is logged in
-    db_templates = {}
-    if user_id:
-        saved_templates = SmsTemplate.query.filter_by(created_by=user_id, is_active=True).all()
-        for template in saved_templates:
-            db_templates[template.name] = template.content
+    # Saved templates of the logged in user (cached per process)
+    db_templates = get_user_templates(user_id) if user_id else {}
     
     # Merge: Database templates take precedence, then session, then defaults
     return [
@@ -97,81 +104,14 @@ def get_all_templates():
         for template_def in BASE_SMS_TEMPLATES
     ]
 
-def count_sms_characters(text):
-    """
-    Count SMS characters where Bengali characters count as 2.3x English
-    Bengali Unicode ranges: 0x0980-0x09FF
-    """
-    bengali_count = 0
-    english_count = 0
-    
-    for char in text:
-        # Check if character is Bengali (Unicode range 0x0980-0x09FF)
-        if '\u0980' <= char <= '\u09FF':
-            bengali_count += 1
-        else:
-            english_count += 1
-    
-    # Total weighted character count (Bengali = 2.3x English)
-    total_weighted = (bengali_count * 2.3) + english_count
-    return int(total_weighted)
-
-def calculate_sms_cost(message):
-    """
-    Calculate SMS cost based on message content:
-    - English only (120 chars = 1 SMS)
-    - Bangla only (65 chars = 1 SMS, considering 2.3x multiplier)
-    - Mixed (100 chars weighted = 1 SMS)
-    """
-    bengali_count = 0
-    english_count = 0
-    
-    for char in message:
-        if '\u0980' <= char <= '\u09FF':
-            bengali_count += 1
-        else:
-            english_count += 1
-    
-    # Determine message type
-    if bengali_count == 0:
-        # English only: 120 chars = 1 SMS
-        sms_count = max(1, (english_count + 119) // 120)
-    elif english_count == 0:
-        # Bangla only: 65 chars = 1 SMS
-        sms_count = max(1, (bengali_count + 64) // 65)
-    else:
-        # Mixed: 100 weighted chars = 1 SMS
-        weighted_total = (bengali_count * 2.3) + english_count
-        sms_count = max(1, int((weighted_total + 99) // 100))
-    
-    return sms_count
-
-def deduct_sms_balance(sms_count):
-    """Deduct SMS count from local balance in settings"""
-    try:
-        from models import Settings
-        
-        balance_setting = Settings.query.filter_by(key='sms_balance').first()
-        if not balance_setting:
-            # Initialize with default balance
-            balance_setting = Settings(
-                key='sms_balance',
-                value={'balance': 989},
-                category='sms',
-                description='Current SMS balance'
-            )
-            db.session.add(balance_setting)
-        
-        current_balance = balance_setting.value.get('balance', 0) if balance_setting.value else 0
-        new_balance = max(0, current_balance - sms_count)
-        
-        balance_setting.value = {'balance': new_balance}
-        db.session.commit()
-        
-        return new_balance
-    except Exception as e:
-        print(f"Error deducting balance: {e}")
-        return 0
+def message_length_error(message):
+    """Error text if a message needs more than MAX_MESSAGE_SEGMENTS SMS, otherwise None"""
+    stats = measure_sms(message)
+    if stats['segments'] <= MAX_MESSAGE_SEGMENTS:
+        return None
+    limit = max_units(stats['encoding'], MAX_MESSAGE_SEGMENTS)
+    return (f"Message exceeds the single SMS limit ({stats['units']}/{limit} {stats['encoding']} characters, "
+            f"{stats['segments']} SMS)")
 
 def validate_phone_number(phone):
     """Validate and format phone number"""
@@ -191,87 +131,8 @@ def validate_phone_number(phone):
     return None
 
 def send_sms_via_api(phone, message):
-    """Send SMS using BulkSMSBD API - Hardcoded Configuration"""
-    try:
-        # Hardcoded SMS API Configuration - DO NOT CHANGE
-        api_key = 'gsOKLO6XtKsANCvgPHNt'
-        sender_id = '8809617628909'
-        api_url = 'http://bulksmsbd.net/api/smsapi'
-        
-        # Format phone number - remove any spaces or special characters
-        formatted_phone = phone.strip().replace(' ', '').replace('-', '').replace('+', '')
-        
-        # Ensure phone starts with 88 for Bangladesh
-        if formatted_phone.startswith('0'):
-            formatted_phone = '88' + formatted_phone
-        elif not formatted_phone.startswith('88'):
-            formatted_phone = '88' + formatted_phone
-        
-        # Build URL with GET parameters
-        params = {
-            'api_key': api_key,
-            'type': 'text',
-            'number': formatted_phone,
-            'senderid': sender_id,
-            'message': message
-        }
-        
-        print(f"📤 Sending SMS to {formatted_phone}...")
-        print(f"🔗 URL: {api_url}")
-        print(f"📋 Params: {params}")
-        
-        # Send SMS using GET request
-        response = requests.get(api_url, params=params, timeout=30)
-        
-        print(f"📡 Response Status: {response.status_code}")
-        print(f"📄 Response Text: {response.text}")
-        
-        if response.status_code == 200:
-            try:
-                # Parse JSON response
-                response_data = response.json()
-                response_code = response_data.get('response_code')
-                success_message = response_data.get('success_message', '')
-                error_message = response_data.get('error_message', '')
-                
-                print(f"📊 Response Code: {response_code}")
-                
-                # BulkSMSBD success codes (typically 200 or 202)
-                if response_code in [200, 202]:
-                    print(f"✅ SMS sent successfully to {formatted_phone}")
-                    return {
-                        'success': True,
-                        'message_id': success_message,
-                        'cost': 1
-                    }
-                else:
-                    print(f"❌ SMS API error (code {response_code}): {error_message}")
-                    return {
-                        'success': False,
-                        'error': error_message or f"API Error Code: {response_code}"
-                    }
-            except ValueError:
-                # Not JSON response - treat as error
-                print(f"❌ Invalid JSON response: {response.text}")
-                return {
-                    'success': False,
-                    'error': 'Invalid API response format'
-                }
-        else:
-            error_msg = f'HTTP {response.status_code}: {response.text}'
-            print(f"❌ SMS API HTTP error: {error_msg}")
-            return {'success': False, 'error': error_msg}
-    
-    except requests.exceptions.Timeout:
-        print(f"❌ SMS API timeout for {phone}")
-        return {'success': False, 'error': 'SMS API timeout'}
-    except Exception as e:
-        print(f"❌ SMS API exception: {str(e)}")
-        return {'success': False, 'error': str(e)}
-    except requests.exceptions.ConnectionError:
-        return {'success': False, 'error': 'SMS API connection error'}
-    except Exception as e:
-        return {'success': False, 'error': f'SMS API error: {str(e)}'}
+    """Send SMS through the shared BulkSMSBD gateway client"""
+    return get_gateway().send(phone, message)
 
 @sms_bp.route('/send', methods=['POST'])
 @login_required
@@ -292,10 +153,9 @@ def send_sms():
         if not message:
             return error_response('Message is required', 400)
         
-        # Validate character count (Bengali = 2, English = 1, max = 130)
-        char_count = count_sms_characters(message)
-        if char_count > 130:
-            return error_response(f'Message exceeds character limit. Current: {char_count}/130 characters', 400)
+        length_error = message_length_error(message)
+        if length_error:
+            return error_response(length_error, 400)
         
         # Collect phone numbers
         phone_numbers = []
@@ -320,55 +180,28 @@ def send_sms():
         if not phone_numbers:
             return error_response('No valid phone numbers found', 400)
         
-        # Send SMS to each recipient (no balance check - API handles it)
-        sent_count = 0
-        failed_count = 0
-        sms_logs = []
-        
+        # Queue one SMS per recipient; the SMS dispatcher sends them (no balance check - API handles it)
+        users_by_phone = {
+            user.phoneNumber: user.id for user in User.query.filter(User.phoneNumber.in_(phone_numbers)).all()
+        }
+        job = create_sms_job(created_by=current_user.id, params={'source': 'send'})
+        cost = sms_segments(message)
         for phone in phone_numbers:
-            # Create SMS log entry
-            sms_log = SmsLog(
-                phone_number=phone,
-                message=message,
-                sent_by=current_user.id,
-                status=SmsStatus.PENDING
-            )
-            
-            # Find user by phone number
-            user = User.query.filter_by(phone=phone).first()
-            if user:
-                sms_log.user_id = user.id
-            
-            # Send SMS
-            result = send_sms_via_api(phone, message)
-            
-            if result['success']:
-                sms_log.status = SmsStatus.SENT
-                sms_log.sent_at = datetime.utcnow()
-                sms_log.api_response = result
-                sms_log.cost = result.get('cost', 1)
-                sent_count += 1
-            else:
-                sms_log.status = SmsStatus.FAILED
-                sms_log.api_response = result
-                failed_count += 1
-            
-            db.session.add(sms_log)
-            sms_logs.append(sms_log)
-        
-        # Update user's SMS count
-        current_user.sms_count -= sent_count
+            enqueue_sms(phone, message, user_id=users_by_phone.get(phone), sent_by=current_user.id,
+                        job=job, charge_sender=True, cost=cost)
         
+        reserve_sms_credits(job, cost * len(phone_numbers))
         db.session.commit()
         
         result_data = {
+            'job_id': job.id,
+            'progress_url': f'/api/jobs/{job.id}',
             'total_recipients': len(phone_numbers),
-            'sent_count': sent_count,
-            'failed_count': failed_count,
+            'queued_count': len(phone_numbers),
             'remaining_sms_balance': current_user.sms_count
         }
         
-        return success_response(f'SMS sent to {sent_count} recipients', result_data)
+        return success_response(f'Queued SMS for {len(phone_numbers)} recipients', result_data, 202)
         
     except Exception as e:
         db.session.rollback()
@@ -393,10 +226,9 @@ def send_batch_sms():
         if not message:
             return error_response('Message is required', 400)
         
-        # Validate character count (Bengali = 2, English = 1, max = 130)
-        char_count = count_sms_characters(message)
-        if char_count > 130:
-            return error_response(f'Message exceeds character limit. Current: {char_count}/130 characters', 400)
+        length_error = message_length_error(message)
+        if length_error:
+            return error_response(length_error, 400)
         
         if not batch_ids:
             return error_response('At least one batch must be selected', 400)
@@ -434,54 +266,29 @@ def send_batch_sms():
         if not phone_numbers:
             return error_response('No valid phone numbers found in selected batches', 400)
         
-        # Send SMS to each recipient (no balance check - API handles it)
-        sent_count = 0
-        failed_count = 0
-        
+        # Queue one SMS per recipient; the SMS dispatcher sends them (no balance check - API handles it)
+        users_by_phone = {
+            user.phoneNumber: user.id for user in User.query.filter(User.phoneNumber.in_(phone_numbers)).all()
+        }
+        job = create_sms_job(created_by=current_user.id, params={'source': 'send_batch', 'batch_ids': batch_ids})
+        cost = sms_segments(message)
         for phone in phone_numbers:
-            # Create SMS log entry
-            sms_log = SmsLog(
-                phone_number=phone,
-                message=message,
-                sent_by=current_user.id,
-                status=SmsStatus.PENDING
-            )
-            
-            # Find user by phone number
-            user = User.query.filter_by(phone=phone).first()
-            if user:
-                sms_log.user_id = user.id
-            
-            # Send SMS
-            result = send_sms_via_api(phone, message)
-            
-            if result['success']:
-                sms_log.status = SmsStatus.SENT
-                sms_log.sent_at = datetime.utcnow()
-                sms_log.api_response = result
-                sms_log.cost = result.get('cost', 1)
-                sent_count += 1
-            else:
-                sms_log.status = SmsStatus.FAILED
-                sms_log.api_response = result
-                failed_count += 1
-            
-            db.session.add(sms_log)
-        
-        # Update user's SMS count
-        current_user.sms_count -= sent_count
+            enqueue_sms(phone, message, user_id=users_by_phone.get(phone), sent_by=current_user.id,
+                        job=job, charge_sender=True, cost=cost)
         
+        reserve_sms_credits(job, cost * len(phone_numbers))
         db.session.commit()
         
         result_data = {
+            'job_id': job.id,
+            'progress_url': f'/api/jobs/{job.id}',
             'total_recipients': len(phone_numbers),
-            'sent_count': sent_count,
-            'failed_count': failed_count,
+            'queued_count': len(phone_numbers),
             'batches': [{'id': b.id, 'name': b.name} for b in batches],
             'remaining_sms_balance': current_user.sms_count
         }
         
-        return success_response(f'Batch SMS sent to {sent_count} recipients', result_data)
+        return success_response(f'Queued batch SMS for {len(phone_numbers)} recipients', result_data, 202)
         
     except Exception as e:
         db.session.rollback()
@@ -491,10 +298,17 @@ def send_batch_sms():
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
 def get_sms_logs():
-    """Get SMS logs with pagination and filtering"""
+    """
+    Get SMS logs, newest first, with filtering.
+    
+    Pages are keyset-based: pass the returned next_cursor as ?cursor= to get
+    the next page. ?page= still selects an OFFSET page (with a total count)
+    for old clients, but gets slow deep into a large log.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        page = request.args.get('page', type=int)
+        cursor = request.args.get('cursor')
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
         
         status = request.args.get('status')
         phone = request.args.get('phone', '').strip()
@@ -502,84 +316,108 @@ def get_sms_logs():
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         
-        query = SmsLog.query
+        query = SmsLog.query.options(joinedload(SmsLog.sent_by_user), joinedload(SmsLog.user))
         
         # Filter by status
         if status and status in [s.value for s in SmsStatus]:
             query = query.filter(SmsLog.status == SmsStatus(status))
         
-        # Filter by phone number
-        if phone:
-            query = query.filter(SmsLog.phone_number.ilike(f'%{phone}%'))
+        # Filter by phone number prefix (e.g. 0171, 8801711 or 1711), as an index range
+        phone_key = SmsLog.normalize_phone(phone)
+        if phone_key:
+            query = query.filter(SmsLog.phone_normalized >= phone_key,
+                                 SmsLog.phone_normalized < phone_key[:-1] + chr(ord(phone_key[-1]) + 1))
         
         # Filter by sender
         if sent_by:
             query = query.filter(SmsLog.sent_by == sent_by)
         
-        # Filter by date range
+        # Filter by date range: half-open datetime range on created_at so the index applies
         if date_from:
             try:
-                from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-                query = query.filter(func.date(SmsLog.created_at) >= from_date)
+                from_date = datetime.strptime(date_from, '%Y-%m-%d')
+                query = query.filter(SmsLog.created_at >= from_date)
             except ValueError:
                 return error_response('Invalid date_from format. Use YYYY-MM-DD', 400)
         
         if date_to:
             try:
-                to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-                query = query.filter(func.date(SmsLog.created_at) <= to_date)
+                to_date = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+                query = query.filter(SmsLog.created_at < to_date)
             except ValueError:
                 return error_response('Invalid date_to format. Use YYYY-MM-DD', 400)
         
-        # Join with sender user info
-        query = query.join(User, SmsLog.sent_by == User.id, isouter=True)
-        
-        # Order by creation time
-        query = query.order_by(SmsLog.created_at.desc())
-        
-        # Paginate
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
-        
-        logs = []
-        for log in pagination.items:
-            log_data = {
-                'id': log.id,
-                'phone_number': log.phone_number,
-                'message': log.message,
-                'status': log.status.value,
-                'cost': float(log.cost) if log.cost else 0,
-                'sent_at': log.sent_at.isoformat() if log.sent_at else None,
-                'created_at': log.created_at.isoformat(),
-                'sent_by_user': {
-                    'id': log.sent_by_user.id,
-                    'full_name': log.sent_by_user.full_name
-                } if log.sent_by_user else None
-            }
-            
-            # Add recipient user info if available
-            if log.user:
-                log_data['recipient_user'] = {
-                    'id': log.user.id,
-                    'full_name': log.user.full_name
-                }
-            
-            logs.append(log_data)
+        # Newest first; id breaks ties between logs created in the same instant
+        query = query.order_by(SmsLog.created_at.desc(), SmsLog.id.desc())
+        
+        if page is not None and not cursor:
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            return paginated_response(
+                [serialize_sms_log(log) for log in pagination.items],
+                page,
+                per_page,
+                pagination.total,
+                "SMS logs retrieved successfully"
+            )
         
-        return paginated_response(
-            logs, 
-            page, 
-            per_page, 
-            pagination.total, 
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_log_cursor(cursor)
+            except ValueError:
+                return error_response('Invalid cursor', 400)
+            query = query.filter(or_(
+                SmsLog.created_at < cursor_created_at,
+                and_(SmsLog.created_at == cursor_created_at, SmsLog.id < cursor_id)
+            ))
+        
+        # One extra row tells whether there is a next page
+        logs = query.limit(per_page + 1).all()
+        next_cursor = encode_log_cursor(logs[per_page - 1]) if len(logs) > per_page else None
+        
+        return cursor_paginated_response(
+            [serialize_sms_log(log) for log in logs[:per_page]],
+            per_page,
+            next_cursor,
             "SMS logs retrieved successfully"
         )
         
     except Exception as e:
         return error_response(f'Failed to retrieve SMS logs: {str(e)}', 500)
 
+def encode_log_cursor(log):
+    """Opaque keyset cursor for the position after log"""
+    return f"{log.created_at.isoformat()}_{log.id}"
+
+def decode_log_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if malformed"""
+    created_at, _, log_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created_at), int(log_id)
+
+def serialize_sms_log(log):
+    """JSON dict of an SMS log with sender and recipient info"""
+    log_data = {
+        'id': log.id,
+        'phone_number': log.phone_number,
+        'message': log.message,
+        'status': log.status.value,
+        'cost': float(log.cost) if log.cost else 0,
+        'sent_at': log.sent_at.isoformat() if log.sent_at else None,
+        'created_at': log.created_at.isoformat(),
+        'sent_by_user': {
+            'id': log.sent_by_user.id,
+            'full_name': log.sent_by_user.full_name
+        } if log.sent_by_user else None
+    }
+    
+    # Add recipient user info if available
+    if log.user:
+        log_data['recipient_user'] = {
+            'id': log.user.id,
+            'full_name': log.user.full_name
+        }
+    
+    return log_data
+
 @sms_bp.route('/templates', methods=['GET'])
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
@@ -605,9 +443,9 @@ def update_sms_template(template_id):
             return error_response('Message is required', 400)
         
         # Validate message length
-        char_count = count_sms_characters(new_message)
-        if char_count > 130:
-            return error_response(f'Message exceeds 130 character limit ({char_count} chars)', 400)
+        length_error = message_length_error(new_message)
+        if length_error:
+            return error_response(length_error, 400)
         
         template_def = get_template_definition(template_id)
         if not template_def:
@@ -640,6 +478,7 @@ def update_sms_template(template_id):
             db.session.add(template)
         
         db.session.commit()
+        invalidate_sms_templates()
         
         # Also update session for immediate use
         custom_templates = session.get('custom_templates', {})
@@ -658,34 +497,21 @@ def update_sms_template(template_id):
 @sms_bp.route('/validate-message', methods=['POST'])
 @login_required
 def validate_sms_message():
-    """Validate SMS message character count"""
+    """Validate SMS message length: GSM-7 or UCS-2 characters and number of SMS"""
     try:
         data = request.get_json()
         message = data.get('message', '')
         
-        if not message:
-            return success_response('Message validated', {
-                'char_count': 0,
-                'max_characters': 130,
-                'remaining': 130,
-                'is_valid': True,
-                'estimated_sms': 0
-            })
-        
-        # Count characters (Bengali = 2, English = 1)
-        char_count = count_sms_characters(message)
-        remaining = 130 - char_count
-        is_valid = char_count <= 130
-        
-        # Estimate number of SMS (1 SMS = 130 chars)
-        estimated_sms = (char_count // 130) + (1 if char_count % 130 > 0 else 0)
+        stats = measure_sms(message)
+        max_characters = max_units(stats['encoding'], MAX_MESSAGE_SEGMENTS)
         
         return success_response('Message validated', {
-            'char_count': char_count,
-            'max_characters': 130,
-            'remaining': remaining,
-            'is_valid': is_valid,
-            'estimated_sms': estimated_sms,
+            'char_count': stats['units'],
+            'max_characters': max_characters,
+            'remaining': max_characters - stats['units'],
+            'is_valid': stats['segments'] <= MAX_MESSAGE_SEGMENTS,
+            'estimated_sms': stats['segments'],
+            'encoding': stats['encoding'],
             'message_length': len(message)
         })
         
@@ -696,24 +522,9 @@ def validate_sms_message():
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
 def get_sms_balance():
-    """Get SMS balance from local settings"""
+    """Get SMS balance from the local ledger"""
     try:
-        from models import Settings
-        
-        # Get balance from settings
-        balance_setting = Settings.query.filter_by(key='sms_balance').first()
-        if not balance_setting:
-            # Initialize with default balance
-            balance_setting = Settings(
-                key='sms_balance',
-                value={'balance': 989},
-                category='sms',
-                description='Current SMS balance'
-            )
-            db.session.add(balance_setting)
-            db.session.commit()
-        
-        balance = balance_setting.value.get('balance', 0) if balance_setting.value else 0
+        balance = get_ledger_balance()
         
         current_user = get_current_user()
         total_sent = SmsLog.query.filter(
@@ -740,24 +551,9 @@ def get_sms_balance():
 
 @sms_bp.route('/balance-check', methods=['GET'])
 def get_sms_balance_noauth():
-    """Get SMS balance from local settings (no auth required)"""
+    """Get SMS balance from the local ledger (no auth required)"""
     try:
-        from models import Settings
-        
-        # Get balance from settings
-        balance_setting = Settings.query.filter_by(key='sms_balance').first()
-        if not balance_setting:
-            # Initialize with default balance
-            balance_setting = Settings(
-                key='sms_balance',
-                value={'balance': 989},
-                category='sms',
-                description='Current SMS balance'
-            )
-            db.session.add(balance_setting)
-            db.session.commit()
-        
-        balance = balance_setting.value.get('balance', 0) if balance_setting.value else 0
+        balance = get_ledger_balance()
 
         # Get Sample Teacher for stats
         teacher = User.query.filter_by(first_name='Sample', last_name='Teacher', role=UserRole.TEACHER).first()
@@ -826,48 +622,43 @@ def add_sms_balance():
 @login_required
 @require_role(UserRole.TEACHER, UserRole.SUPER_USER)
 def get_sms_statistics():
-    """Get SMS usage statistics"""
+    """Get SMS usage statistics from the daily rollup"""
     try:
-        # Get date range
+        # Get date range (whole days, UTC)
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.now() - timedelta(days=days)
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
         
-        # Basic statistics
-        total_sent = SmsLog.query.filter(
-            SmsLog.status == SmsStatus.SENT,
-            SmsLog.sent_at >= start_date
-        ).count()
+        rows = db.session.query(
+            SmsDailyStat.day, SmsDailyStat.sent_by, SmsDailyStat.status, SmsDailyStat.count
+        ).filter(SmsDailyStat.day >= start_day).all()
         
-        total_failed = SmsLog.query.filter(
-            SmsLog.status == SmsStatus.FAILED,
-            SmsLog.created_at >= start_date
-        ).count()
+        # Basic statistics
+        total_sent = sum(row.count for row in rows if row.status == 'sent')
+        total_failed = sum(row.count for row in rows if row.status == 'failed')
         
         # Success rate
         total_attempts = total_sent + total_failed
         success_rate = (total_sent / total_attempts * 100) if total_attempts > 0 else 0
         
-        # Daily statistics
-        daily_stats = db.session.query(
-            func.date(SmsLog.sent_at).label('date'),
-            func.count(SmsLog.id).label('count')
-        ).filter(
-            SmsLog.status == SmsStatus.SENT,
-            SmsLog.sent_at >= start_date
-        ).group_by(func.date(SmsLog.sent_at)).order_by('date').all()
+        # Daily and per-sender sent counts
+        sent_by_day = {}
+        sent_by_sender = {}
+        for row in rows:
+            if row.status != 'sent':
+                continue
+            sent_by_day[row.day] = sent_by_day.get(row.day, 0) + row.count
+            if row.sent_by != NO_SENDER:
+                sent_by_sender[row.sent_by] = sent_by_sender.get(row.sent_by, 0) + row.count
         
-        daily_data = [{'date': stat.date.isoformat(), 'count': stat.count} for stat in daily_stats]
+        daily_data = [{'date': day.isoformat(), 'count': count} for day, count in sorted(sent_by_day.items())]
         
         # Top senders
-        top_senders = db.session.query(
-            User.full_name,
-            func.count(SmsLog.id).label('count')
-        ).join(SmsLog, User.id == SmsLog.sent_by).filter(
-            SmsLog.status == SmsStatus.SENT,
-            SmsLog.sent_at >= start_date
-        ).group_by(User.id, User.full_name).order_by(func.count(SmsLog.id).desc()).limit(5).all()
-        
-        top_senders_data = [{'name': sender.full_name, 'count': sender.count} for sender in top_senders]
+        top_sender_ids = sorted(sent_by_sender, key=sent_by_sender.get, reverse=True)[:5]
+        senders = {user.id: user for user in User.query.filter(User.id.in_(top_sender_ids)).all()}
+        top_senders_data = [
+            {'name': senders[user_id].full_name, 'count': sent_by_sender[user_id]}
+            for user_id in top_sender_ids if user_id in senders
+        ]
         
         statistics = {
             'period_days': days,
@@ -969,12 +760,14 @@ def get_sms_system_stats():
         total_credits_distributed = sum(teacher.sms_count or 0 for teacher in teachers)
         active_teachers = len([t for t in teachers if (t.sms_count or 0) > 0])
         
-        # Get total SMS sent (approximation of credits used)
-        total_sent = SmsLog.query.filter_by(status=SmsStatus.SENT).count()
+        # Credits used by sent SMS, from the daily rollup
+        total_used = db.session.query(func.coalesce(func.sum(SmsDailyStat.cost), 0)).filter(
+            SmsDailyStat.status == 'sent'
+        ).scalar()
         
         stats = {
             'totalCreditsDistributed': total_credits_distributed,
-            'totalCreditsUsed': total_sent,  # Approximation
+            'totalCreditsUsed': int(total_used),
             'activeTeachers': active_teachers,
             'totalTeachers': len(teachers)
         }
@@ -1024,9 +817,9 @@ def send_bulk_sms():
                 return error_response('SMS template not found', 404)
             base_message = template_payload['message']
 
-        char_count = count_sms_characters(base_message)
-        if char_count > 130:
-            return error_response(f'Message exceeds 130 character limit ({char_count} chars)', 400)
+        length_error = message_length_error(base_message)
+        if length_error:
+            return error_response(length_error, 400)
 
         # Get the batch and verify access
         batch = Batch.query.get(batch_id)
@@ -1061,95 +854,44 @@ def send_bulk_sms():
         if not valid_recipients:
             return error_response('No recipients have valid phone numbers', 400)
 
-        # Send SMS to each recipient (no balance check - API handles it)
-        sent_count = 0
-        failed_count = 0
-        failed_recipients = []
-
+        # Queue one SMS per phone number, siblings sharing a number coalesced into one message;
+        # the SMS dispatcher sends them (no balance check - API handles it)
+        job = create_sms_job(created_by=current_user.id, params={
+            'source': 'send_bulk', 'batch_id': batch.id, 'recipient_type': recipient_type
+        })
+        today = datetime.now().strftime('%d/%m/%Y')
+        drafts = []
         for student, phone in valid_recipients:
-            try:
-                message_to_send = base_message
-                message_to_send = message_to_send.replace('{student_name}', (student.first_name or ''))
-                message_to_send = message_to_send.replace('{batch_name}', batch.name or '')
-                message_to_send = message_to_send.replace('{date}', datetime.now().strftime('%d/%m/%Y'))
-                message_to_send = message_to_send.replace('{total}', str(getattr(student, 'total_marks', '')))
-                message_to_send = message_to_send.replace('{marks}', str(getattr(student, 'obtained_marks', '')))
-                message_to_send = message_to_send.replace('{subject}', getattr(student, 'subject', ''))
-
-                sms_response = send_sms_via_api(phone, message_to_send)
-
-                if sms_response.get('success'):
-                    # Calculate SMS cost based on message content
-                    sms_cost = calculate_sms_cost(message_to_send)
-                    
-                    sms_log = SmsLog(
-                        user_id=student.id,
-                        phone_number=phone,
-                        message=message_to_send,
-                        status=SmsStatus.SENT,
-                        api_response=sms_response,
-                        sent_by=current_user.id,
-                        cost=sms_cost,
-                        sent_at=datetime.utcnow()
-                    )
-                    db.session.add(sms_log)
-                    
-                    # Deduct from local balance
-                    deduct_sms_balance(sms_cost)
-                    sent_count += 1
-                else:
-                    sms_log = SmsLog(
-                        user_id=student.id,
-                        phone_number=phone,
-                        message=message_to_send,
-                        status=SmsStatus.FAILED,
-                        api_response=sms_response,
-                        sent_by=current_user.id,
-                        cost=0,
-                        sent_at=datetime.utcnow()
-                    )
-                    db.session.add(sms_log)
-                    failed_count += 1
-                    failed_recipients.append(student.full_name)
-
-            except Exception as e:
-                sms_log = SmsLog(
-                    user_id=student.id,
-                    phone_number=phone,
-                    message=base_message,
-                    status=SmsStatus.FAILED,
-                    api_response={'error': str(e)},
-                    sent_by=current_user.id,
-                    cost=0,
-                    sent_at=datetime.utcnow()
-                )
-                db.session.add(sms_log)
-                failed_count += 1
-                failed_recipients.append(student.full_name)
-
-        if invalid_recipients:
-            failed_recipients.extend([f'{name} (invalid phone)' for name in invalid_recipients])
+            variables = {
+                'student_name': student.first_name or '',
+                'batch_name': batch.name or '',
+                'date': today,
+                'total': str(getattr(student, 'total_marks', '')),
+                'marks': str(getattr(student, 'obtained_marks', '')),
+                'subject': getattr(student, 'subject', '')
+            }
+            drafts.append(SmsDraft(phone, base_message, variables, student.id))
+
+        messages = coalesce_sms(drafts)
+        for sms in messages:
+            enqueue_sms(sms.phone, sms.message, user_id=sms.user_id, sent_by=current_user.id, job=job, cost=sms.cost)
 
+        credits = reserve_sms_credits(job, cost_sms_batch(sms.message for sms in messages)['segments'])
         db.session.commit()
 
         response_data = {
-            'sent': sent_count,
-            'failed': failed_count,
+            'job_id': job.id,
+            'progress_url': f'/api/jobs/{job.id}',
+            'queued': len(messages),
             'total_recipients': len(valid_recipients),
             'remaining_balance': current_user.sms_count or 0,
-            'failed_recipients': failed_recipients or None,
+            'credits_reserved': credits,
+            'failed_recipients': [f'{name} (invalid phone)' for name in invalid_recipients] or None,
             'invalid_contacts': invalid_recipients or None,
             'used_custom_message': use_custom_message
         }
 
-        if sent_count > 0 and failed_count == 0:
-            message_text = f'Successfully sent SMS to all {sent_count} recipients'
-        elif sent_count > 0 and failed_count > 0:
-            message_text = f'Sent SMS to {sent_count} recipients, {failed_count} failed'
-        else:
-            message_text = f'Failed to send SMS to all {failed_count} recipients'
-
-        return success_response(message_text, response_data)
+        return success_response(f'Queued SMS for {len(valid_recipients)} recipients', response_data, 202)
         
     except Exception as e:
         db.session.rollback()
@@ -1198,9 +940,9 @@ def send_bulk_sms_noauth():
                 return error_response('SMS template not found', 404)
             base_message = template_payload['message']
 
-        char_count = count_sms_characters(base_message)
-        if char_count > 130:
-            return error_response(f'Message exceeds 130 character limit ({char_count} chars)', 400)
+        length_error = message_length_error(base_message)
+        if length_error:
+            return error_response(length_error, 400)
 
         batch = Batch.query.get(batch_id)
         if not batch:
@@ -1227,64 +969,32 @@ def send_bulk_sms_noauth():
         if not valid_recipients:
             return error_response('No recipients have valid phone numbers', 400)
 
-        # Send SMS to each recipient (no balance check - API handles it)
-        sent_count = 0
-        failed_count = 0
-
-        for student, phone in valid_recipients:
-            try:
-                message_to_send = base_message
-                message_to_send = message_to_send.replace('{student_name}', (student.first_name or ''))
-                message_to_send = message_to_send.replace('{batch_name}', batch.name or '')
-                message_to_send = message_to_send.replace('{date}', datetime.now().strftime('%d/%m/%Y'))
-
-                sms_response = send_sms_via_api(phone, message_to_send)
-
-                if sms_response.get('success'):
-                    # Calculate SMS cost based on message content
-                    sms_cost = calculate_sms_cost(message_to_send)
-                    
-                    sms_log = SmsLog(
-                        user_id=student.id,
-                        phone_number=phone,
-                        message=message_to_send,
-                        status=SmsStatus.SENT,
-                        api_response=sms_response,
-                        sent_by=current_user.id,
-                        cost=sms_cost,
-                        sent_at=datetime.utcnow()
-                    )
-                    db.session.add(sms_log)
-                    
-                    # Deduct from local balance
-                    deduct_sms_balance(sms_cost)
-                    sent_count += 1
-                else:
-                    sms_log = SmsLog(
-                        user_id=student.id,
-                        phone_number=phone,
-                        message=message_to_send,
-                        status=SmsStatus.FAILED,
-                        api_response=sms_response,
-                        sent_by=current_user.id,
-                        cost=0,
-                        sent_at=datetime.utcnow()
-                    )
-                    db.session.add(sms_log)
-                    failed_count += 1
-            except Exception as e:
-                failed_count += 1
-
+        # Queue one SMS per recipient; the SMS dispatcher sends them (no balance check - API handles it)
+        job = create_sms_job(created_by=current_user.id, params={
+            'source': 'send_bulk_noauth', 'batch_id': batch.id, 'recipient_type': recipient_type
+        })
+        today = datetime.now().strftime('%d/%m/%Y')
+        drafts = [
+            SmsDraft(phone, base_message, {'student_name': student.first_name or '', 'batch_name': batch.name or '',
+                                           'date': today}, student.id)
+            for student, phone in valid_recipients
+        ]
+        messages = coalesce_sms(drafts)
+        for sms in messages:
+            enqueue_sms(sms.phone, sms.message, user_id=sms.user_id, sent_by=current_user.id, job=job, cost=sms.cost)
+
+        reserve_sms_credits(job, cost_sms_batch(sms.message for sms in messages)['segments'])
         db.session.commit()
 
         response_data = {
-            'sent': sent_count,
-            'failed': failed_count,
+            'job_id': job.id,
+            'progress_url': f'/api/jobs/{job.id}',
+            'queued': len(messages),
             'total_recipients': len(valid_recipients),
             'remaining_balance': current_user.sms_count or 0,
         }
 
-        return success_response(f'SMS sent to {sent_count} recipients', response_data)
+        return success_response(f'Queued SMS for {len(valid_recipients)} recipients', response_data, 202)
         
     except Exception as e:
         db.session.rollback()
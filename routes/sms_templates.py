@@ -6,6 +6,9 @@ from flask import Blueprint, request, jsonify, session
 from models import db, Settings, User
 from utils.auth import login_required, require_role, get_current_user
 from utils.response import success_response, error_response
+from services.sms_segments import GSM7, max_units
+from services.sms_templates import (DEFAULT_SMS_TEMPLATES, compile_template, get_saved_templates,
+                                    invalidate_sms_templates)
 from datetime import datetime
 import logging
 
@@ -19,10 +22,8 @@ sms_templates_bp = Blueprint('sms_templates', __name__)
 def get_templates():
     """Get all SMS templates"""
     try:
-        # Get templates from database
-        db_templates = Settings.query.filter(
-            Settings.key.like('sms_template_%')
-        ).all()
+        # Templates saved in the database (cached per process)
+        saved_templates = get_saved_templates()
         
         # Get session templates
         session_templates = session.get('custom_templates', {})
@@ -33,7 +34,7 @@ def get_templates():
                 'name': 'Exam Result',
                 'description': 'Short template for exam results',
                 'variables': ['student_name', 'marks', 'total', 'subject', 'date'],
-                'template': "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}",
+                'template': DEFAULT_SMS_TEMPLATES['exam_result'],
                 'editable': False,
                 'max_sms': 1
             },
@@ -41,7 +42,7 @@ def get_templates():
                 'name': 'Attendance Present',
                 'description': 'Present notification',
                 'variables': ['student_name', 'batch_name'],
-                'template': "{student_name} উপস্থিত ({batch_name})",
+                'template': DEFAULT_SMS_TEMPLATES['attendance_present'],
                 'editable': False,
                 'max_sms': 1
             },
@@ -49,7 +50,7 @@ def get_templates():
                 'name': 'Attendance Absent',
                 'description': 'Absent notification',
                 'variables': ['student_name', 'date', 'batch_name'],
-                'template': "{student_name} অনুপস্থিত {date} ({batch_name})",
+                'template': DEFAULT_SMS_TEMPLATES['attendance_absent'],
                 'editable': False,
                 'max_sms': 1
             },
@@ -57,7 +58,7 @@ def get_templates():
                 'name': 'Fee Reminder',
                 'description': 'Fee payment reminder',
                 'variables': ['student_name', 'amount', 'due_date'],
-                'template': "{student_name} এর ফি {amount}৳ বকেয়া। শেষ তারিখ {due_date}",
+                'template': DEFAULT_SMS_TEMPLATES['fee_reminder'],
                 'editable': False,
                 'max_sms': 1
             }
@@ -69,7 +70,7 @@ def get_templates():
                 'name': 'Custom Exam Message',
                 'description': 'Customizable exam message',
                 'variables': ['student_name', 'subject', 'marks', 'total', 'date'],
-                'default': "{student_name} scored {marks}/{total} in {subject} on {date}",
+                'default': DEFAULT_SMS_TEMPLATES['custom_exam'],
                 'current': session_templates.get('custom_exam', ''),
                 'saved': None,
                 'editable': True,
@@ -79,7 +80,7 @@ def get_templates():
                 'name': 'Custom General Message',
                 'description': 'General purpose message',
                 'variables': ['student_name', 'message', 'date'],
-                'default': "{student_name}: {message} ({date})",
+                'default': DEFAULT_SMS_TEMPLATES['custom_general'],
                 'current': session_templates.get('custom_general', ''),
                 'saved': None,
                 'editable': True,
@@ -91,10 +92,9 @@ def get_templates():
         all_templates = {**hardcoded_templates, **templates}
         
         # Update with saved templates from database (only for editable ones)
-        for db_template in db_templates:
-            template_type = db_template.key.replace('sms_template_', '')
+        for template_type, saved_message in saved_templates.items():
             if template_type in all_templates and all_templates[template_type].get('editable', True):
-                all_templates[template_type]['saved'] = db_template.value.get('message', '') if db_template.value else ''
+                all_templates[template_type]['saved'] = saved_message
         
         return success_response('Templates retrieved successfully', all_templates)
         
@@ -191,6 +191,7 @@ def save_template(template_type):
             db.session.add(template_setting)
         
         db.session.commit()
+        invalidate_sms_templates()
         
         return success_response('Template saved successfully', {
             'template_type': template_type,
@@ -212,17 +213,8 @@ def reset_template(template_type):
         if 'custom_templates' in session and template_type in session['custom_templates']:
             del session['custom_templates'][template_type]
         
-        # Get default short templates (hardcoded, not editable)
-        default_templates = {
-            'exam_result': "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}",
-            'attendance_present': "{student_name} উপস্থিত ({batch_name})",
-            'attendance_absent': "{student_name} অনুপস্থিত {date} ({batch_name})",
-            'fee_reminder': "{student_name} এর ফি {amount}৳ বকেয়া। শেষ তারিখ {due_date}",
-            'custom_exam': "{student_name} scored {marks}/{total} in {subject} on {date}",
-            'custom_general': "{student_name}: {message} ({date})"
-        }
-        
-        default_message = default_templates.get(template_type, "Template not found")
+        # Default short templates (hardcoded, not editable)
+        default_message = DEFAULT_SMS_TEMPLATES.get(template_type, "Template not found")
         
         return success_response('Template reset to default', {
             'template_type': template_type,
@@ -255,14 +247,12 @@ def validate_message():
         # For UI, we want to show a simpler format
         return success_response('Message validated', {
             'char_count': sms_stats.get('char_count', 0),
-            'weighted_count': sms_stats.get('weighted_count', sms_stats.get('char_count', 0)),
             'sms_count': sms_stats.get('sms_count', 1),
-            'max_characters': 100,  # Mixed Bangla/English limit
-            'remaining': 100 - sms_stats.get('weighted_count', sms_stats.get('char_count', 0)),
+            'encoding': sms_stats.get('encoding', GSM7),
+            'max_characters': max_units(sms_stats.get('encoding', GSM7)),  # One SMS: 160 GSM-7 or 70 UCS-2
+            'remaining': max_units(sms_stats.get('encoding', GSM7)) - sms_stats.get('chars_used', 0),
             'is_valid': sms_stats.get('sms_count', 1) <= 1,
-            'type': sms_stats.get('type', 'unknown'),
-            'bangla_chars': sms_stats.get('bangla_chars', 0),
-            'english_chars': sms_stats.get('english_chars', 0)
+            'type': sms_stats.get('type', 'unknown')
         })
         
     except Exception as e:
@@ -325,7 +315,11 @@ def preview_template():
         try:
             # Generate preview message
             preview_data = sample_data.get(template_type, {})
-            preview_message = template.format(**preview_data)
+            compiled = compile_template(template)
+            missing = compiled.missing(preview_data)
+            if missing:
+                raise KeyError(missing[0])
+            preview_message = compiled.render(preview_data)
             
             # Calculate accurate SMS count
             sms_service = SMSService()
@@ -334,7 +328,8 @@ def preview_template():
             return success_response('Preview generated successfully', {
                 'preview': preview_message,
                 'sms_stats': sms_stats,
-                'sample_data': preview_data
+                'sample_data': preview_data,
+                'placeholders': list(compiled.placeholders)
             })
             
         except KeyError as e:
@@ -7,6 +7,7 @@ from flask_bcrypt import generate_password_hash
 from models import db, User, UserRole, Batch, user_batches
 from utils.auth import login_required, require_role, get_current_user
 from utils.response import success_response, error_response, serialize_user
+from services.ranking_service import invalidate_rankings_for_batches
 from sqlalchemy import or_
 import re
 import secrets
@@ -233,6 +234,7 @@ def create_student():
             batch = Batch.query.get(batch_id)
             if batch:
                 student.batches.append(batch)
+                invalidate_rankings_for_batches([batch.id])
                 print(f"      Assigned to batch: {batch.name} (ID: {batch.id})")
             else:
                 print(f"      WARNING: Batch {batch_id} not found")
@@ -306,6 +308,9 @@ def update_student(student_id):
         if not data:
             return error_response('Request data is required', 400)
         
+        # Rankings of the batches the student leaves or joins show their name and status
+        ranked_batch_ids = {batch.id for batch in student.batches}
+        
         # Update basic information
         if 'firstName' in data:
             student.first_name = data['firstName'].strip()
@@ -393,6 +398,7 @@ def update_student(student_id):
                     student.batches.append(batch)
         
         student.updated_at = datetime.utcnow()
+        invalidate_rankings_for_batches(ranked_batch_ids | {batch.id for batch in student.batches})
         db.session.commit()
         
         # Prepare response data
@@ -436,9 +442,10 @@ def delete_student(student_id):
         if not student:
             return error_response('Student not found', 404)
         
-        # Soft delete by deactivating
+        # Soft delete by deactivating; inactive students are not ranked
         student.is_active = False
         student.updated_at = datetime.utcnow()
+        invalidate_rankings_for_batches([batch.id for batch in student.batches])
         
         db.session.commit()
         
@@ -498,6 +505,7 @@ def bulk_import_students():
         students_data = data['students']
         successful_imports = []
         failed_imports = []
+        imported_batch_ids = set()
         
         for idx, student_data in enumerate(students_data):
             try:
@@ -561,6 +569,7 @@ def bulk_import_students():
                     batch = Batch.query.get(batch_id)
                     if batch:
                         student.batches.append(batch)
+                        imported_batch_ids.add(batch.id)
                 
                 successful_imports.append({
                     'row': idx + 1,
@@ -577,6 +586,7 @@ def bulk_import_students():
                 })
         
         if successful_imports:
+            invalidate_rankings_for_batches(imported_batch_ids)
             db.session.commit()
         else:
             db.session.rollback()
@@ -621,6 +631,8 @@ def archive_student(student_id):
         student.archived_by = current_user.id
         student.archive_reason = reason
         
+        # Archived students drop out of their batches' rankings
+        invalidate_rankings_for_batches([batch.id for batch in student.batches])
         db.session.commit()
         
         return success_response('Student archived successfully', {
@@ -654,6 +666,7 @@ def restore_student(student_id):
         student.archived_by = None
         student.archive_reason = None
         
+        invalidate_rankings_for_batches([batch.id for batch in student.batches])
         db.session.commit()
         
         return success_response('Student restored successfully', {
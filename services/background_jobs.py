@@ -0,0 +1,65 @@
+"""
+Background Job Service
+Run long tasks in a worker thread and record their progress in background_jobs
+"""
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import update
+from models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+
+def create_job(job_type, params=None, created_by=None, total=0):
+    """Insert a pending job row; the caller commits"""
+    job = BackgroundJob(job_type=job_type, params=params or {}, created_by=created_by, total=total)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def start_job(app, job_id, target):
+    """
+    Run target(job_id) in a daemon thread with its own app context.
+
+    The job is marked running before target starts and completed with
+    target's return value as its result; an exception marks it failed.
+    """
+    def run():
+        with app.app_context():
+            try:
+                set_job_status(job_id, 'running', started_at=datetime.utcnow())
+                result = target(job_id)
+                set_job_status(job_id, 'completed', result=result, finished_at=datetime.utcnow())
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Background job {job_id} failed: {e}", exc_info=True)
+                set_job_status(job_id, 'failed', error=str(e), finished_at=datetime.utcnow())
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=f'background-job-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def set_job_status(job_id, status, **values):
+    """Update a job's status and other columns, committing immediately"""
+    db.session.execute(
+        update(BackgroundJob).where(BackgroundJob.id == job_id).values(status=status, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def update_job_progress(job_id, processed, total=None):
+    """Record how many items a running job has processed, committing immediately"""
+    values = {'processed': processed}
+    if total is not None:
+        values['total'] = total
+    db.session.execute(
+        update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
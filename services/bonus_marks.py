@@ -0,0 +1,87 @@
+"""
+Bonus Marks Service
+Per-student bonus marks for monthly exams, read and written in bulk
+"""
+import logging
+from datetime import datetime
+from models import db, MonthlyBonusMark, MonthlyExam, Settings, User
+from services.bulk_upsert import bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+# Settings key prefix of the legacy per-exam JSON blobs ({user_id: bonus_marks})
+LEGACY_BONUS_KEY_PREFIX = 'monthly_exam_bonus_'
+
+
+def get_bonus_marks(monthly_exam_id, user_ids=None):
+    """Map user ids to bonus marks for an exam with one query, optionally limited to user_ids"""
+    query = db.session.query(MonthlyBonusMark.user_id, MonthlyBonusMark.bonus_marks).filter(
+        MonthlyBonusMark.monthly_exam_id == monthly_exam_id
+    )
+    if user_ids is not None:
+        query = query.filter(MonthlyBonusMark.user_id.in_(user_ids))
+    return {user_id: bonus_marks for user_id, bonus_marks in query.all()}
+
+
+def save_bonus_marks(monthly_exam_id, bonus_by_user, updated_by=None):
+    """
+    Upsert {user_id: bonus_marks} for an exam in one bulk statement.
+
+    Runs inside the caller's transaction; returns the number of rows written.
+    """
+    now = datetime.utcnow()
+    rows = [{
+        'monthly_exam_id': monthly_exam_id,
+        'user_id': user_id,
+        'bonus_marks': bonus_marks,
+        'updated_by': updated_by,
+        'created_at': now,
+        'updated_at': now
+    } for user_id, bonus_marks in bonus_by_user.items()]
+
+    return bulk_upsert(
+        MonthlyBonusMark, rows,
+        key_columns=('monthly_exam_id', 'user_id'),
+        update_columns=('bonus_marks', 'updated_by', 'updated_at')
+    )
+
+
+def parse_legacy_bonus_setting(setting):
+    """(monthly_exam_id, {user_id: bonus_marks}) from a legacy Settings row; skips malformed entries"""
+    exam_id = int(setting.key[len(LEGACY_BONUS_KEY_PREFIX):])
+    bonus_by_user = {}
+    for user_id, bonus_marks in (setting.value or {}).items():
+        try:
+            bonus_by_user[int(user_id)] = float(bonus_marks)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping malformed bonus entry {user_id!r}={bonus_marks!r} in {setting.key}")
+    return exam_id, bonus_by_user
+
+
+def migrate_settings_bonus_marks():
+    """
+    Move bonus marks from the legacy Settings JSON blobs into monthly_bonus_marks.
+
+    Settings rows are deleted once copied; entries of exams or students that
+    no longer exist are dropped. Safe to run repeatedly. Commits; returns the
+    number of bonus rows written.
+    """
+    settings = Settings.query.filter(Settings.key.like(f'{LEGACY_BONUS_KEY_PREFIX}%')).all()
+    existing_exam_ids = {row.id for row in MonthlyExam.query.with_entities(MonthlyExam.id).all()}
+    existing_user_ids = {row.id for row in User.query.with_entities(User.id).all()}
+
+    migrated = 0
+    for setting in settings:
+        try:
+            exam_id, bonus_by_user = parse_legacy_bonus_setting(setting)
+        except ValueError:
+            logger.warning(f"Skipping unrecognised bonus setting {setting.key}")
+            continue
+
+        if exam_id in existing_exam_ids:
+            bonus_by_user = {user_id: bonus for user_id, bonus in bonus_by_user.items() if user_id in existing_user_ids}
+            migrated += save_bonus_marks(exam_id, bonus_by_user, updated_by=setting.updated_by)
+        db.session.delete(setting)
+
+    db.session.commit()
+    return migrated
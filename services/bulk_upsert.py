@@ -0,0 +1,62 @@
+"""
+Bulk Upsert Helper
+Dialect-aware INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE for unique keys
+"""
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from models import db
+
+# Rows per statement; bulk_upsert lowers it for wide rows on SQLite
+UPSERT_CHUNK_SIZE = 500
+
+# Bound parameters per statement on SQLite builds older than 3.32
+SQLITE_MAX_VARIABLES = 999
+
+
+def get_chunk_size(dialect, column_count, chunk_size=UPSERT_CHUNK_SIZE):
+    """Rows per statement: chunk_size, capped on SQLite so rows x columns stays within its variable limit"""
+    if dialect == 'sqlite':
+        return max(1, min(chunk_size, SQLITE_MAX_VARIABLES // max(1, column_count)))
+    return chunk_size
+
+
+def bulk_upsert(model, rows, key_columns, update_columns=(), chunk_size=UPSERT_CHUNK_SIZE, increment_columns=()):
+    """
+    Insert rows, updating update_columns when key_columns already exist.
+
+    increment_columns are added to the existing values instead of replacing
+    them, for counters maintained by several writers. On SQLite chunks are
+    kept small enough that every statement binds at most 999 values.
+
+    key_columns must be covered by a unique constraint on the table (for
+    MySQL the constraint itself is used as the conflict target). Runs inside
+    the caller's transaction and returns the number of rows sent.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    chunk_size = get_chunk_size(dialect, len(rows[0]), chunk_size)
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+
+        if dialect == 'mysql' or dialect == 'mariadb':
+            stmt = mysql_insert(table).values(chunk)
+            set_ = {column: stmt.inserted[column] for column in update_columns}
+            set_.update({column: table.c[column] + stmt.inserted[column] for column in increment_columns})
+            stmt = stmt.on_duplicate_key_update(set_)
+        elif dialect == 'sqlite' or dialect == 'postgresql':
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            stmt = insert(table).values(chunk)
+            set_ = {column: stmt.excluded[column] for column in update_columns}
+            set_.update({column: table.c[column] + stmt.excluded[column] for column in increment_columns})
+            stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_)
+        else:
+            raise NotImplementedError(f'Bulk upsert is not supported for {dialect}')
+
+        db.session.execute(stmt)
+
+    return len(rows)
@@ -0,0 +1,81 @@
+"""
+Calendar Service
+Working-day calculation per batch and month, respecting class days and holidays
+"""
+import calendar
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from sqlalchemy import or_
+from models import db, Batch, Holiday
+
+# Batches without class_days are taught Monday to Friday
+DEFAULT_CLASS_DAYS = frozenset(range(5))
+
+_WEEKDAY_PREFIXES = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6
+}
+
+
+def get_month_bounds(month, year):
+    """Return the first and last date of a calendar month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_class_days(class_days):
+    """
+    Weekday numbers (Monday = 0) for a batch class_days string.
+
+    Accepts values like "Sat, Mon, Wed" or "Saturday/Monday"; anything that
+    does not name a weekday falls back to Monday to Friday.
+    """
+    if not class_days:
+        return DEFAULT_CLASS_DAYS
+
+    weekdays = {
+        _WEEKDAY_PREFIXES[token[:3]]
+        for token in re.findall(r'[a-z]+', class_days.lower())
+        if token[:3] in _WEEKDAY_PREFIXES
+    }
+    return frozenset(weekdays) or DEFAULT_CLASS_DAYS
+
+
+@lru_cache(maxsize=1024)
+def _month_working_dates(month, year, weekdays, holidays):
+    """Class dates of a month; cached on the full set of inputs"""
+    month_start, month_end = get_month_bounds(month, year)
+    days = (month_start + timedelta(days=offset) for offset in range(month_end.day))
+    return tuple(day for day in days if day.weekday() in weekdays and day not in holidays)
+
+
+def get_holiday_dates(batch_id, month, year):
+    """Holidays in a month that apply to the batch (batch-specific or global)"""
+    month_start, month_end = get_month_bounds(month, year)
+    rows = db.session.query(Holiday.date).filter(
+        Holiday.date >= month_start,
+        Holiday.date <= month_end,
+        or_(Holiday.batch_id.is_(None), Holiday.batch_id == batch_id)
+    ).all()
+    return frozenset(row.date for row in rows)
+
+
+def get_working_dates(batch, month, year):
+    """
+    Class dates of a batch in a month.
+
+    The date arithmetic is cached per (class days, month, holidays), so every
+    batch sharing a schedule reuses one computation. The inputs are re-read
+    on each call, which keeps the result correct across worker processes
+    when holidays or class days change. batch may be a Batch or a batch id.
+    """
+    if not isinstance(batch, Batch):
+        batch = Batch.query.get(batch) if batch else None
+
+    weekdays = parse_class_days(batch.class_days if batch else None)
+    holidays = get_holiday_dates(batch.id if batch else None, month, year)
+    return _month_working_dates(month, year, weekdays, holidays)
+
+
+def get_working_days(batch, month, year):
+    """Number of class days of a batch in a month"""
+    return len(get_working_dates(batch, month, year))
@@ -0,0 +1,287 @@
+"""
+Exam Analytics Service
+SQL-side aggregates for monthly exam marks: per subject, per paper, histograms and percentiles
+"""
+from sqlalchemy import and_, case, func, or_, select
+from models import db, MonthlyExam, IndividualExam, MonthlyMark
+from services.grading import PASS_PERCENTAGE
+
+# Lower bounds of the 10-point percentage buckets used for histograms
+HISTOGRAM_BUCKETS = list(range(0, 100, 10))
+PERCENTILES = (25, 50, 75, 90)
+
+
+def get_pass_threshold(monthly_exam):
+    """Pass percentage of a monthly exam, falling back to the per-paper pass mark"""
+    if monthly_exam.total_marks and monthly_exam.total_marks > 0:
+        return (monthly_exam.pass_marks / monthly_exam.total_marks) * 100
+    return PASS_PERCENTAGE
+
+
+def _present():
+    return or_(MonthlyMark.is_absent == False, MonthlyMark.is_absent.is_(None))
+
+
+def _present_percentage():
+    """Percentage of present marks, NULL for absent ones so aggregates skip them"""
+    return case((_present(), MonthlyMark.percentage), else_=None)
+
+
+def _bucket_expression():
+    """Histogram bucket lower bound for a mark's percentage (100% falls in the top bucket)"""
+    whens = [
+        (MonthlyMark.percentage >= lower, lower)
+        for lower in reversed(HISTOGRAM_BUCKETS[1:])
+    ]
+    return case(*whens, else_=0)
+
+
+def _stats(row):
+    """Aggregate row to a stats dict"""
+    return {
+        'marks_count': row.marks_count or 0,
+        'students_count': row.present_count or 0,
+        'average': round(float(row.average), 2) if row.average is not None else 0,
+        'highest': round(float(row.highest), 2) if row.highest is not None else 0,
+        'lowest': round(float(row.lowest), 2) if row.lowest is not None else 0,
+        'passed': int(row.passed or 0),
+        'absent': int(row.absent or 0)
+    }
+
+
+def _aggregate_columns(pass_threshold):
+    present_percentage = _present_percentage()
+    return [
+        func.count(MonthlyMark.id).label('marks_count'),
+        func.count(present_percentage).label('present_count'),
+        func.avg(present_percentage).label('average'),
+        func.max(present_percentage).label('highest'),
+        func.min(present_percentage).label('lowest'),
+        func.sum(case((and_(_present(), MonthlyMark.percentage >= pass_threshold), 1), else_=0)).label('passed'),
+        func.sum(case((_present(), 0), else_=1)).label('absent')
+    ]
+
+
+def _percentiles(exam_id, group_column=None):
+    """
+    Nearest-rank percentiles of present marks, computed with window functions.
+
+    Returns {group_value: {'p25': ..., ...}}; the key is None when ungrouped.
+    """
+    partition = [group_column] if group_column is not None else []
+    group_label = group_column if group_column is not None else db.literal(None)
+
+    ranked = select(
+        group_label.label('group_value'),
+        MonthlyMark.percentage.label('percentage'),
+        func.row_number().over(partition_by=partition, order_by=MonthlyMark.percentage).label('rn'),
+        func.count().over(partition_by=partition).label('cnt')
+    ).select_from(MonthlyMark).join(
+        IndividualExam, IndividualExam.id == MonthlyMark.individual_exam_id
+    ).where(
+        MonthlyMark.monthly_exam_id == exam_id,
+        _present()
+    ).subquery()
+
+    # Row rn is the p-th percentile when (rn - 1) / cnt < p / 100 <= rn / cnt
+    picks = [
+        and_(ranked.c.rn * 100 >= p * ranked.c.cnt, (ranked.c.rn - 1) * 100 < p * ranked.c.cnt)
+        for p in PERCENTILES
+    ]
+    rows = db.session.execute(
+        select(ranked.c.group_value, ranked.c.rn, ranked.c.cnt, ranked.c.percentage).where(or_(*picks))
+    ).all()
+
+    result = {}
+    for row in rows:
+        values = result.setdefault(row.group_value, {})
+        for p in PERCENTILES:
+            if row.rn * 100 >= p * row.cnt and (row.rn - 1) * 100 < p * row.cnt:
+                values[f'p{p}'] = round(float(row.percentage), 2)
+    return result
+
+
+def _histograms(exam_id, group_column=None):
+    """Mark counts per 10-point percentage bucket of present marks"""
+    bucket = _bucket_expression()
+    columns = [bucket.label('bucket'), func.count(MonthlyMark.id).label('count')]
+    if group_column is not None:
+        columns.insert(0, group_column.label('group_value'))
+
+    query = db.session.query(*columns).join(
+        IndividualExam, IndividualExam.id == MonthlyMark.individual_exam_id
+    ).filter(
+        MonthlyMark.monthly_exam_id == exam_id,
+        _present()
+    )
+    group_by = [group_column, bucket] if group_column is not None else [bucket]
+    rows = query.group_by(*group_by).all()
+
+    result = {}
+    for row in rows:
+        key = row.group_value if group_column is not None else None
+        counts = result.setdefault(key, {lower: 0 for lower in HISTOGRAM_BUCKETS})
+        counts[row.bucket] = row.count
+    return {
+        key: [{'range': f'{lower}-{lower + 10 if lower < 90 else 100}', 'count': counts[lower]}
+              for lower in HISTOGRAM_BUCKETS]
+        for key, counts in result.items()
+    }
+
+
+def get_exam_analytics_data(monthly_exam):
+    """
+    Aggregate analytics for one monthly exam.
+
+    Every figure comes from a grouped SQL query, so the work done in Python
+    depends on the number of papers and subjects, not on the number of marks.
+    Returns None when the exam has no marks.
+    """
+    exam_id = monthly_exam.id
+    pass_threshold = get_pass_threshold(monthly_exam)
+    aggregates = _aggregate_columns(pass_threshold)
+
+    overall = db.session.query(
+        func.count(func.distinct(MonthlyMark.user_id)).label('total_students'), *aggregates
+    ).filter(MonthlyMark.monthly_exam_id == exam_id).one()
+
+    if not overall.marks_count:
+        return None
+
+    total_students = overall.total_students
+    overall_stats = _stats(overall)
+
+    grade_rows = db.session.query(
+        func.coalesce(MonthlyMark.grade, 'F'), func.count(MonthlyMark.id)
+    ).filter(
+        MonthlyMark.monthly_exam_id == exam_id,
+        _present()
+    ).group_by(func.coalesce(MonthlyMark.grade, 'F')).all()
+
+    subject_rows = db.session.query(IndividualExam.subject, *aggregates).join(
+        IndividualExam, IndividualExam.id == MonthlyMark.individual_exam_id
+    ).filter(
+        MonthlyMark.monthly_exam_id == exam_id
+    ).group_by(IndividualExam.subject).all()
+
+    paper_rows = db.session.query(
+        IndividualExam.id, IndividualExam.title, IndividualExam.subject, IndividualExam.marks, *aggregates
+    ).join(
+        IndividualExam, IndividualExam.id == MonthlyMark.individual_exam_id
+    ).filter(
+        MonthlyMark.monthly_exam_id == exam_id
+    ).group_by(
+        IndividualExam.id, IndividualExam.title, IndividualExam.subject, IndividualExam.marks
+    ).order_by(IndividualExam.id).all()
+
+    paper_histograms = _histograms(exam_id, IndividualExam.id)
+    paper_percentiles = _percentiles(exam_id, IndividualExam.id)
+    overall_histogram = _histograms(exam_id).get(None, [])
+    overall_percentiles = _percentiles(exam_id).get(None, {})
+
+    subject_analytics = {}
+    for row in subject_rows:
+        stats = _stats(row)
+        if stats['students_count']:
+            subject_analytics[row.subject] = stats
+
+    individual_exam_analytics = []
+    for row in paper_rows:
+        stats = _stats(row)
+        stats.update({
+            'individual_exam_id': row.id,
+            'title': row.title,
+            'subject': row.subject,
+            'total_marks': row.marks,
+            'histogram': paper_histograms.get(row.id, []),
+            'percentiles': paper_percentiles.get(row.id, {})
+        })
+        individual_exam_analytics.append(stats)
+
+    passed_count = overall_stats['passed']
+    present_count = overall_stats['students_count']
+
+    return {
+        'overall_statistics': {
+            'total_students': total_students,
+            'average_percentage': overall_stats['average'],
+            'highest_percentage': overall_stats['highest'],
+            'lowest_percentage': overall_stats['lowest'],
+            'pass_percentage': round((passed_count / total_students * 100), 2) if total_students > 0 else 0,
+            'percentiles': overall_percentiles,
+            'histogram': overall_histogram
+        },
+        'performance_breakdown': {
+            'passed': passed_count,
+            'failed': present_count - passed_count,
+            'absent': overall_stats['absent'],
+            'total': total_students
+        },
+        'grade_distribution': {grade: count for grade, count in grade_rows},
+        'subject_wise_performance': subject_analytics,
+        'individual_exam_performance': individual_exam_analytics,
+        'pass_threshold': round(pass_threshold, 2)
+    }
+
+
+def get_batch_exam_comparison(monthly_exam, months=6):
+    """
+    Compare a batch's monthly exams up to and including this one.
+
+    One grouped query covers up to `months` exams; each exam's pass rate uses
+    its own pass threshold.
+    """
+    period = MonthlyExam.year * 12 + MonthlyExam.month
+    exams = MonthlyExam.query.filter(
+        MonthlyExam.batch_id == monthly_exam.batch_id,
+        MonthlyExam.is_deleted == False,
+        period <= monthly_exam.year * 12 + monthly_exam.month
+    ).order_by(MonthlyExam.year.desc(), MonthlyExam.month.desc()).limit(months).all()
+
+    if not exams:
+        return []
+
+    threshold = case(
+        (MonthlyExam.total_marks > 0, MonthlyExam.pass_marks * 100.0 / MonthlyExam.total_marks),
+        else_=PASS_PERCENTAGE
+    )
+    present_percentage = _present_percentage()
+
+    rows = db.session.query(
+        MonthlyMark.monthly_exam_id,
+        func.count(func.distinct(MonthlyMark.user_id)).label('total_students'),
+        func.count(present_percentage).label('present_count'),
+        func.avg(present_percentage).label('average'),
+        func.max(present_percentage).label('highest'),
+        func.min(present_percentage).label('lowest'),
+        func.sum(case((and_(_present(), MonthlyMark.percentage >= threshold), 1), else_=0)).label('passed'),
+        func.sum(case((_present(), 0), else_=1)).label('absent')
+    ).join(
+        MonthlyExam, MonthlyExam.id == MonthlyMark.monthly_exam_id
+    ).filter(
+        MonthlyMark.monthly_exam_id.in_([exam.id for exam in exams])
+    ).group_by(MonthlyMark.monthly_exam_id).all()
+
+    by_exam = {row.monthly_exam_id: row for row in rows}
+
+    comparison = []
+    for exam in reversed(exams):
+        row = by_exam.get(exam.id)
+        present_count = row.present_count if row else 0
+        passed = int(row.passed or 0) if row else 0
+        comparison.append({
+            'exam_id': exam.id,
+            'title': exam.title,
+            'month': exam.month,
+            'year': exam.year,
+            'total_students': row.total_students if row else 0,
+            'average_percentage': round(float(row.average), 2) if row and row.average is not None else 0,
+            'highest_percentage': round(float(row.highest), 2) if row and row.highest is not None else 0,
+            'lowest_percentage': round(float(row.lowest), 2) if row and row.lowest is not None else 0,
+            'passed': passed,
+            'failed': present_count - passed,
+            'absent': int(row.absent or 0) if row else 0,
+            'pass_rate': round(passed / present_count * 100, 2) if present_count else 0
+        })
+
+    return comparison
@@ -0,0 +1,74 @@
+"""
+Monthly Exam Deletion Service
+Soft-delete a monthly exam at once, then purge its data in small background transactions
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import delete, func
+from models import (db, MonthlyExam, IndividualExam, MonthlyMark, MonthlyRanking, MonthlyRankingSnapshot,
+                    MonthlyBonusMark)
+from services.background_jobs import update_job_progress
+
+logger = logging.getLogger(__name__)
+
+EXAM_DELETE_JOB = 'monthly_exam_delete'
+DELETE_CHUNK_SIZE = 500
+
+# Dependent tables, children before parents (marks reference individual exams)
+EXAM_CHILD_MODELS = (MonthlyMark, MonthlyRanking, MonthlyBonusMark, MonthlyRankingSnapshot, IndividualExam)
+
+
+def soft_delete_monthly_exam(monthly_exam):
+    """Hide an exam from every listing and lookup; the caller commits"""
+    monthly_exam.is_deleted = True
+    monthly_exam.deleted_at = datetime.utcnow()
+    monthly_exam.show_on_homepage = False
+
+
+def count_exam_rows(exam_id):
+    """Number of dependent rows the purge will delete"""
+    return sum(
+        db.session.query(func.count(model.id)).filter(model.monthly_exam_id == exam_id).scalar()
+        for model in EXAM_CHILD_MODELS
+    )
+
+
+def purge_monthly_exam(job_id, exam_id, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Background job body: delete a soft-deleted exam and all its dependent rows.
+
+    Rows are deleted by primary key in chunks of chunk_size, committing after
+    each chunk so the database write lock is released between them and other
+    workers can interleave their writes. Returns the job result.
+    """
+    monthly_exam = MonthlyExam.query.get(exam_id)
+    if not monthly_exam:
+        return {'monthly_exam_id': exam_id, 'deleted_rows': 0}
+    if not monthly_exam.is_deleted:
+        raise ValueError(f'Monthly exam {exam_id} is not marked as deleted')
+
+    update_job_progress(job_id, 0, total=count_exam_rows(exam_id))
+
+    deleted = {}
+    processed = 0
+    for model in EXAM_CHILD_MODELS:
+        deleted[model.__tablename__] = 0
+        while True:
+            ids = [row.id for row in db.session.query(model.id).filter(
+                model.monthly_exam_id == exam_id
+            ).limit(chunk_size).all()]
+            if not ids:
+                break
+
+            db.session.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            db.session.commit()
+
+            deleted[model.__tablename__] += len(ids)
+            processed += len(ids)
+            update_job_progress(job_id, processed)
+
+    db.session.execute(delete(MonthlyExam).where(MonthlyExam.id == exam_id).execution_options(synchronize_session=False))
+    db.session.commit()
+    logger.info(f"Purged monthly exam {exam_id}: {deleted}")
+
+    return {'monthly_exam_id': exam_id, 'deleted_rows': processed, 'deleted': deleted}
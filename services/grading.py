@@ -0,0 +1,94 @@
+"""
+Grading Service
+Batched percentage, grade, GPA and pass calculation using a threshold lookup
+"""
+import bisect
+from dataclasses import dataclass
+from typing import List
+
+# (minimum percentage, grade, GPA) in ascending order
+GRADE_SCALE = [
+    (0, 'F', 0.00),
+    (33, 'D', 1.00),
+    (40, 'C', 2.00),
+    (50, 'B', 3.00),
+    (60, 'A-', 3.50),
+    (70, 'A', 4.00),
+    (80, 'A+', 5.00),
+]
+
+# A paper is passed with at least 40% of its marks
+PASS_PERCENTAGE = 40
+
+_THRESHOLDS = [threshold for threshold, _, _ in GRADE_SCALE]
+_GRADES = [grade for _, grade, _ in GRADE_SCALE]
+_GPAS = [gpa for _, _, gpa in GRADE_SCALE]
+
+
+def _scale_index(percentage):
+    """Index into GRADE_SCALE for a percentage"""
+    if not percentage or not percentage >= 0:  # None, negative and NaN fall to F
+        return 0
+    return bisect.bisect_right(_THRESHOLDS, percentage) - 1
+
+
+def calculate_grade_and_gpa(percentage):
+    """Calculate grade and GPA based on percentage"""
+    idx = _scale_index(percentage)
+    return _GRADES[idx], _GPAS[idx]
+
+
+def grade_percentages(percentages):
+    """Grades and GPAs for a sequence of percentages, returned as two lists"""
+    indices = [_scale_index(percentage) for percentage in percentages]
+    return [_GRADES[idx] for idx in indices], [_GPAS[idx] for idx in indices]
+
+
+def calculate_percentage(marks_obtained, total_marks):
+    """Percentage of total_marks, 0 when there are no marks to score against"""
+    return (marks_obtained / total_marks * 100) if total_marks and total_marks > 0 else 0
+
+
+@dataclass
+class GradeMatrix:
+    """Per-cell results for a students x papers marks matrix"""
+    percentages: List[List[float]]
+    grades: List[List[str]]
+    gpas: List[List[float]]
+    passed: List[List[bool]]
+
+
+def grade_matrix(marks_obtained, total_marks, absent=None, pass_percentage=PASS_PERCENTAGE):
+    """
+    Grade a whole students x papers matrix in one call.
+
+    marks_obtained holds one row per student with one value per paper (None
+    for a missing mark). total_marks is either a matching matrix or a single
+    row of paper totals shared by every student. absent optionally marks
+    cells that cannot count as passed. Missing marks grade as 0% and fail.
+    """
+    if total_marks and not isinstance(total_marks[0], (list, tuple)):
+        total_marks = [total_marks] * len(marks_obtained)
+    if absent is None:
+        absent = [[False] * len(row) for row in marks_obtained]
+
+    pass_fraction = pass_percentage / 100
+    percentages, grades, gpas, passed = [], [], [], []
+
+    for obtained_row, total_row, absent_row in zip(marks_obtained, total_marks, absent):
+        row_percentages = [
+            calculate_percentage(obtained, total) if obtained is not None else 0
+            for obtained, total in zip(obtained_row, total_row)
+        ]
+        row_grades, row_gpas = grade_percentages(row_percentages)
+
+        percentages.append(row_percentages)
+        grades.append(row_grades)
+        gpas.append(row_gpas)
+        passed.append([
+            obtained is not None and not is_absent and obtained >= total * pass_fraction
+            for obtained, total, is_absent in zip(obtained_row, total_row, absent_row)
+        ])
+
+    return GradeMatrix(percentages=percentages, grades=grades, gpas=gpas, passed=passed)
+
@@ -0,0 +1,132 @@
+"""
+Homepage Feed Service
+Precomputed top performers of featured monthly exams for the public landing page
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from models import db, MonthlyExam, MonthlyRanking, Settings, User
+
+logger = logging.getLogger(__name__)
+
+HOMEPAGE_FEED_KEY = 'homepage_top_performers'
+TOP_PERFORMER_COUNT = 3
+
+# Seconds a worker serves its in-memory copy before re-reading the stored feed
+FEED_MEMORY_TTL = 10
+
+_feed_cache = {'loaded_at': 0, 'feed': None}
+
+
+def build_top_performers_feed():
+    """
+    Compute the featured results list.
+
+    One query loads the featured exams and one loads the top rankings of all
+    of them together with the students' names.
+    """
+    featured_exams = MonthlyExam.query.filter_by(show_on_homepage=True, is_deleted=False).all()
+    if not featured_exams:
+        return []
+
+    rows = db.session.query(MonthlyRanking, User).join(
+        User, User.id == MonthlyRanking.user_id
+    ).filter(
+        MonthlyRanking.monthly_exam_id.in_([exam.id for exam in featured_exams]),
+        MonthlyRanking.is_final == True,
+        MonthlyRanking.position <= TOP_PERFORMER_COUNT
+    ).order_by(MonthlyRanking.monthly_exam_id, MonthlyRanking.position.asc()).all()
+
+    top_by_exam = {}
+    for ranking, student in rows:
+        top_by_exam.setdefault(ranking.monthly_exam_id, []).append({
+            'position': ranking.position,
+            'student_name': student.full_name,
+            'student_phone': student.phoneNumber,
+            'roll_number': ranking.roll_number,
+            'total_marks': ranking.final_total,
+            'total_possible': ranking.max_possible_total,
+            'percentage': round(ranking.percentage, 2) if ranking.percentage else 0,
+            'grade': ranking.grade
+        })
+
+    featured_results = []
+    for exam in featured_exams:
+        top_students = top_by_exam.get(exam.id)
+        if top_students:
+            featured_results.append({
+                'exam_id': exam.id,
+                'exam_title': exam.title,
+                'month': exam.month,
+                'year': exam.year,
+                'batch_name': exam.batch.name if exam.batch else 'N/A',
+                'top_students': top_students[:TOP_PERFORMER_COUNT]
+            })
+
+    return featured_results
+
+
+def refresh_homepage_feed():
+    """
+    Recompute the feed and store it in Settings.
+
+    Runs inside the caller's transaction so the feed is committed together
+    with the ranking or homepage flag change that triggered it.
+    """
+    featured_results = build_top_performers_feed()
+    body = json.dumps(featured_results, sort_keys=True, default=str)
+    now = datetime.utcnow().replace(microsecond=0)
+    feed = {
+        'featured_results': featured_results,
+        'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+        'generated_at': now.isoformat()
+    }
+
+    setting = Settings.query.filter_by(key=HOMEPAGE_FEED_KEY).first()
+    if setting:
+        if setting.value and setting.value.get('etag') == feed['etag']:
+            return setting.value  # Unchanged; keep Last-Modified stable
+        setting.value = feed
+        setting.updated_at = now
+    else:
+        db.session.add(Settings(
+            key=HOMEPAGE_FEED_KEY,
+            value=feed,
+            description='Precomputed homepage top performers',
+            category='homepage',
+            is_public=True
+        ))
+
+    _feed_cache['feed'] = None
+    return feed
+
+
+def get_homepage_feed():
+    """
+    Return the stored feed dict (featured_results, etag, generated_at).
+
+    Each worker keeps the feed in memory for FEED_MEMORY_TTL seconds, so
+    traffic spikes cost at most one settings lookup per worker per interval
+    and never touch the ranking tables. A missing feed is built once.
+    """
+    now = time.monotonic()
+    if _feed_cache['feed'] is not None and now - _feed_cache['loaded_at'] < FEED_MEMORY_TTL:
+        return _feed_cache['feed']
+
+    setting = Settings.query.filter_by(key=HOMEPAGE_FEED_KEY).first()
+    if setting and setting.value:
+        feed = setting.value
+    else:
+        try:
+            feed = refresh_homepage_feed()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not store homepage feed: {e}")
+            feed = {'featured_results': build_top_performers_feed(), 'etag': None, 'generated_at': None}
+
+    _feed_cache['feed'] = feed
+    _feed_cache['loaded_at'] = now
+    return feed
@@ -0,0 +1,227 @@
+"""
+Marks Import Service
+Streaming CSV/XLSX import of a roll number x paper marks grid for a monthly exam
+"""
+import codecs
+import csv
+import logging
+from services.marks_service import build_mark_rows, parse_marks_value, upsert_monthly_marks
+from services.bulk_upsert import UPSERT_CHUNK_SIZE
+from services.ranking_service import get_roll_number_map, load_individual_exams
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+ROLL_HEADERS = {'roll', 'roll no', 'roll_no', 'roll number', 'roll_number', 'rollno'}
+IGNORED_HEADERS = {'name', 'student', 'student name', 'student_name', 'phone'}
+ABSENT_VALUES = {'a', 'ab', 'abs', 'absent'}
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+
+class MarksImportError(Exception):
+    """Raised when the uploaded file cannot be imported at all"""
+
+
+def _normalize(value):
+    return str(value).strip().lower() if value is not None else ''
+
+
+def parse_roll_value(value):
+    """
+    Convert a roll number cell to an int.
+
+    Spreadsheets store numbers as floats, so 12.0 is accepted; a fractional
+    value such as 12.7 is rejected rather than truncated. Returns
+    (roll_number, error).
+    """
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None, 'invalid roll number'
+    if not number.is_integer():
+        return None, 'roll number must be a whole number'
+    return int(number), None
+
+
+def iter_csv_rows(stream):
+    """Yield CSV rows one at a time from a binary stream"""
+    yield from csv.reader(codecs.iterdecode(stream, 'utf-8-sig'))
+
+
+def iter_xlsx_rows(stream):
+    """Yield rows of the first worksheet without loading the whole workbook"""
+    if openpyxl is None:
+        raise MarksImportError('XLSX import requires openpyxl; upload a CSV file instead')
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_upload_rows(filename, stream):
+    """Pick a row reader from the uploaded file's extension"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return iter_csv_rows(stream)
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(stream)
+    raise MarksImportError(f'Unsupported file type; use one of {", ".join(SUPPORTED_EXTENSIONS)}')
+
+
+def map_header(header, individual_exams):
+    """
+    Resolve header cells to a roll column and paper columns.
+
+    Paper columns may name an individual exam by id, title or (when unique)
+    subject. Returns (roll_index, {column_index: IndividualExam}, errors).
+    """
+    by_key = {}
+    subject_counts = {}
+    for exam in individual_exams:
+        subject_counts[_normalize(exam.subject)] = subject_counts.get(_normalize(exam.subject), 0) + 1
+    for exam in individual_exams:
+        by_key[str(exam.id)] = exam
+        by_key[_normalize(exam.title)] = exam
+        if subject_counts[_normalize(exam.subject)] == 1:
+            by_key.setdefault(_normalize(exam.subject), exam)
+
+    roll_index = None
+    columns = {}
+    errors = []
+
+    for idx, cell in enumerate(header):
+        key = _normalize(cell)
+        if not key or key in IGNORED_HEADERS:
+            continue
+        if key in ROLL_HEADERS:
+            roll_index = idx
+        elif key in by_key:
+            if by_key[key] in columns.values():
+                errors.append(f'Column "{cell}": paper appears more than once')
+            else:
+                columns[idx] = by_key[key]
+        else:
+            errors.append(f'Column "{cell}": no matching paper in this monthly exam')
+
+    if roll_index is None:
+        errors.append('Header must contain a roll number column')
+    if not columns:
+        errors.append('Header must contain at least one paper column')
+
+    return roll_index, columns, errors
+
+
+def import_marks_grid(monthly_exam, rows):
+    """
+    Import a roll number x paper grid of marks for a monthly exam.
+
+    rows is an iterator of row sequences whose first item is the header.
+    Rows are validated one at a time against the roll numbers of the exam's
+    students and each paper's total marks; valid cells are buffered and
+    written with a bulk upsert every UPSERT_CHUNK_SIZE marks. Empty cells are
+    skipped and "AB"/"absent" records an absent mark. Runs inside the
+    caller's transaction.
+
+    Returns a summary dict with per-row errors. Raises MarksImportError when
+    the header cannot be used.
+    """
+    individual_exams = load_individual_exams(monthly_exam.id)
+    if not individual_exams:
+        raise MarksImportError('Monthly exam has no individual exams')
+
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise MarksImportError('File is empty')
+
+    roll_index, columns, header_errors = map_header(header, individual_exams)
+    if roll_index is None or not columns:
+        raise MarksImportError('; '.join(header_errors))
+
+    roll_map = get_roll_number_map(monthly_exam)
+
+    row_errors = []
+    seen_users = set()
+    touched_users = set()
+    pending = {exam.id: ({}, set()) for exam in columns.values()}
+    pending_count = 0
+    imported_count = 0
+    rows_processed = 0
+
+    def flush():
+        written = 0
+        for exam in columns.values():
+            marks_by_user, absent_users = pending[exam.id]
+            if marks_by_user:
+                written += upsert_monthly_marks(
+                    build_mark_rows(monthly_exam.id, exam, marks_by_user, absent_users)
+                )
+                marks_by_user.clear()
+                absent_users.clear()
+        return written
+
+    for line_number, row in enumerate(rows, start=2):
+        if not row or all(_normalize(cell) == '' for cell in row):
+            continue
+        rows_processed += 1
+
+        roll_value = row[roll_index] if roll_index < len(row) else None
+        roll_number, roll_error = parse_roll_value(roll_value)
+        if roll_error:
+            row_errors.append({'row': line_number, 'roll_number': roll_value, 'errors': [roll_error]})
+            continue
+
+        user_id = roll_map.get(roll_number)
+        if user_id is None:
+            row_errors.append({'row': line_number, 'roll_number': roll_number,
+                               'errors': ['no active student with this roll number']})
+            continue
+        if user_id in seen_users:
+            row_errors.append({'row': line_number, 'roll_number': roll_number,
+                               'errors': ['roll number appears more than once']})
+            continue
+        seen_users.add(user_id)
+
+        cell_errors = []
+        for col_idx, exam in columns.items():
+            value = row[col_idx] if col_idx < len(row) else None
+            if _normalize(value) == '':
+                continue
+
+            marks_by_user, absent_users = pending[exam.id]
+            if _normalize(value) in ABSENT_VALUES:
+                marks_by_user[user_id] = 0
+                absent_users.add(user_id)
+            else:
+                marks, error = parse_marks_value(value, exam.marks)
+                if error:
+                    cell_errors.append(f'{exam.title}: {error}')
+                    continue
+                marks_by_user[user_id] = marks
+            pending_count += 1
+            touched_users.add(user_id)
+
+        if cell_errors:
+            row_errors.append({'row': line_number, 'roll_number': roll_number, 'errors': cell_errors})
+
+        if pending_count >= UPSERT_CHUNK_SIZE:
+            imported_count += flush()
+            pending_count = 0
+
+    imported_count += flush()
+    logger.info(f"Imported {imported_count} marks for monthly exam {monthly_exam.id} from {rows_processed} rows")
+
+    return {
+        'imported_count': imported_count,
+        'rows_processed': rows_processed,
+        'students_updated': len(touched_users),
+        'papers': [{'id': exam.id, 'title': exam.title, 'marks': exam.marks} for exam in columns.values()],
+        'header_errors': header_errors,
+        'row_errors': row_errors
+    }
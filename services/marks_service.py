@@ -0,0 +1,89 @@
+"""
+Marks Service
+Bulk validation helpers and upsert of monthly exam marks
+"""
+from datetime import datetime
+from models import db, MonthlyMark
+from services.bulk_upsert import bulk_upsert
+from services.grading import grade_matrix
+
+MARK_KEY_COLUMNS = ('monthly_exam_id', 'individual_exam_id', 'user_id')
+MARK_UPSERT_COLUMNS = (
+    'marks_obtained', 'total_marks', 'percentage', 'grade', 'gpa', 'is_absent', 'remarks', 'updated_at'
+)
+
+
+def parse_marks_value(value, max_marks):
+    """
+    Convert a submitted marks value to a float.
+
+    Returns (marks, error); error is a message when the value is missing,
+    not a number, negative or above max_marks.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None, 'marks_obtained is required'
+
+    try:
+        marks = float(value)
+    except (ValueError, TypeError):
+        return None, f'invalid marks format ({value})'
+
+    if marks < 0:
+        return None, 'marks cannot be negative'
+    if marks > max_marks:
+        return None, f'marks ({marks}) cannot exceed total marks ({max_marks})'
+
+    return marks, None
+
+
+def get_existing_mark_user_ids(monthly_exam_id, individual_exam_ids, user_ids):
+    """(individual_exam_id, user_id) pairs that already have a mark, in one query"""
+    if not user_ids or not individual_exam_ids:
+        return set()
+
+    rows = db.session.query(MonthlyMark.individual_exam_id, MonthlyMark.user_id).filter(
+        MonthlyMark.monthly_exam_id == monthly_exam_id,
+        MonthlyMark.individual_exam_id.in_(individual_exam_ids),
+        MonthlyMark.user_id.in_(user_ids)
+    ).all()
+    return {(row.individual_exam_id, row.user_id) for row in rows}
+
+
+def build_mark_rows(monthly_exam_id, individual_exam, marks_by_user, absent_user_ids=()):
+    """
+    Graded monthly_marks rows for one individual exam.
+
+    marks_by_user maps user_id to marks obtained; students in
+    absent_user_ids are stored as absent. All rows are graded in a single
+    grade_matrix call.
+    """
+    user_ids = list(marks_by_user)
+    graded = grade_matrix(
+        [[marks_by_user[user_id]] for user_id in user_ids],
+        [individual_exam.marks],
+        absent=[[user_id in absent_user_ids] for user_id in user_ids]
+    )
+    now = datetime.utcnow()
+
+    return [
+        {
+            'monthly_exam_id': monthly_exam_id,
+            'individual_exam_id': individual_exam.id,
+            'user_id': user_id,
+            'marks_obtained': marks_by_user[user_id],
+            'total_marks': individual_exam.marks,
+            'percentage': graded.percentages[idx][0],
+            'grade': graded.grades[idx][0],
+            'gpa': graded.gpas[idx][0],
+            'is_absent': user_id in absent_user_ids,
+            'remarks': '',
+            'created_at': now,
+            'updated_at': now
+        }
+        for idx, user_id in enumerate(user_ids)
+    ]
+
+
+def upsert_monthly_marks(rows):
+    """Write mark rows with one bulk upsert on unique_monthly_mark; runs in the caller's transaction"""
+    return bulk_upsert(MonthlyMark, rows, key_columns=MARK_KEY_COLUMNS, update_columns=MARK_UPSERT_COLUMNS)
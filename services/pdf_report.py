@@ -0,0 +1,131 @@
+"""
+PDF Report Card Renderer
+Single-student monthly report cards drawn with fpdf2 in embedded Noto fonts, so Bengali text renders
+"""
+import calendar
+import os
+from fpdf import FPDF
+from fpdf.enums import TextMode
+
+PAGE_WIDTH = 595   # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts')
+LATIN_FONT = ('NotoSerif', 'NotoSerif-Regular.otf')
+BENGALI_FONT = ('NotoSerifBengali', 'NotoSerifBengali-Regular.otf')
+BOLD_STROKE = 0.35  # Outline width that thickens the regular faces for bold text
+
+
+class SimplePDF:
+    """
+    Multi-page A4 document with text and lines, positioned in PDF points from the bottom-left corner.
+
+    Text is set in Noto Serif with Noto Serif Bengali as fallback and shaped
+    with HarfBuzz, so Bengali conjuncts and vowel signs come out right.
+    """
+
+    def __init__(self):
+        self.pdf = FPDF(unit='pt', format=(PAGE_WIDTH, PAGE_HEIGHT))
+        self.pdf.set_auto_page_break(False)
+        self.pdf.c_margin = 0
+        for family, filename in (LATIN_FONT, BENGALI_FONT):
+            self.pdf.add_font(family, '', os.path.join(FONT_DIR, filename))
+        self.pdf.set_fallback_fonts([BENGALI_FONT[0]])
+        # Kerning is off: fpdf2 applies it at the first font size used, misplacing letters at other sizes
+        self.pdf.set_text_shaping(True, features={'kern': False})
+        self.add_page()
+
+    def add_page(self):
+        self.pdf.add_page()
+
+    def text(self, x, y, value, size=10, bold=False):
+        """Draw value with its baseline at (x, y)"""
+        pdf = self.pdf
+        pdf.set_font(LATIN_FONT[0], size=size)
+        # A cell of height size puts its baseline 0.8 * size below the cell's top
+        pdf.set_xy(x, PAGE_HEIGHT - y - 0.8 * size)
+        if bold:
+            with pdf.local_context(text_mode=TextMode.FILL_STROKE, line_width=BOLD_STROKE):
+                pdf.cell(h=size, text=str(value))
+        else:
+            pdf.cell(h=size, text=str(value))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.pdf.set_line_width(width)
+        self.pdf.line(x1, PAGE_HEIGHT - y1, x2, PAGE_HEIGHT - y2)
+
+    def output(self):
+        """Serialize the document to bytes"""
+        return bytes(self.pdf.output())
+
+
+def render_report_card(card):
+    """
+    Render one student's report card and return (filename, pdf_bytes).
+
+    card is a plain dict so it can be sent to a worker process.
+    """
+    pdf = SimplePDF()
+    y = PAGE_HEIGHT - MARGIN
+
+    pdf.text(MARGIN, y, card['institute_name'], size=18, bold=True)
+    y -= 24
+    pdf.text(MARGIN, y, f"Monthly Report Card - {calendar.month_name[card['month']]} {card['year']}", size=13)
+    y -= 18
+    pdf.text(MARGIN, y, f"{card['exam_title']} | {card['batch_name']}", size=10)
+    y -= 14
+    pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y, width=1)
+    y -= 24
+
+    pdf.text(MARGIN, y, 'Student:', bold=True)
+    pdf.text(MARGIN + 70, y, card['student_name'])
+    pdf.text(MARGIN + 300, y, 'Roll No:', bold=True)
+    pdf.text(MARGIN + 360, y, card['roll_number'] if card['roll_number'] is not None else '-')
+    y -= 16
+    pdf.text(MARGIN, y, 'Position:', bold=True)
+    pdf.text(MARGIN + 70, y, f"{card['position']} of {card['total_students']}")
+    pdf.text(MARGIN + 300, y, 'Previous:', bold=True)
+    pdf.text(MARGIN + 360, y, card['previous_position'] if card['previous_position'] else '-')
+    y -= 28
+
+    columns = [MARGIN, MARGIN + 200, MARGIN + 320, MARGIN + 390, MARGIN + 450]
+    headers = ['Paper', 'Subject', 'Full Marks', 'Obtained', 'Grade']
+    for x, header in zip(columns, headers):
+        pdf.text(x, y, header, bold=True)
+    y -= 6
+    pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y)
+    y -= 14
+
+    for paper in card['papers']:
+        if y < MARGIN + 120:
+            pdf.add_page()
+            y = PAGE_HEIGHT - MARGIN
+        values = [paper['title'][:36], paper['subject'][:20], paper['total_marks'],
+                  'Absent' if paper['is_absent'] else paper['marks_obtained'], paper['grade']]
+        for x, value in zip(columns, values):
+            pdf.text(x, y, value)
+        y -= 16
+
+    pdf.line(MARGIN, y + 8, PAGE_WIDTH - MARGIN, y + 8)
+    y -= 14
+
+    summary = [
+        ('Exam Marks', f"{card['total_exam_marks']:g} / {card['total_possible_marks']:g}"),
+        ('Attendance Marks', f"{card['attendance_marks']} / {card['max_attendance_marks']}"),
+        ('Final Total', f"{card['final_total']:g} / {card['total_possible']:g}"),
+        ('Percentage', f"{card['percentage']:.2f}%"),
+        ('Grade / GPA', f"{card['grade'] or '-'} / {card['gpa'] if card['gpa'] is not None else '-'}"),
+    ]
+    for label, value in summary:
+        pdf.text(MARGIN, y, label, bold=True)
+        pdf.text(MARGIN + 150, y, value)
+        y -= 16
+
+    y -= 40
+    pdf.line(PAGE_WIDTH - MARGIN - 150, y, PAGE_WIDTH - MARGIN, y)
+    pdf.text(PAGE_WIDTH - MARGIN - 120, y - 12, 'Teacher Signature', size=9)
+
+    roll = card['roll_number'] if card['roll_number'] is not None else 'na'
+    filename = f"{card['position']:03d}_roll_{roll}_{card['user_id']}.pdf"
+    return filename, pdf.output()
@@ -0,0 +1,627 @@
+"""
+Monthly Ranking Service
+Set-based computation of comprehensive monthly exam rankings
+"""
+import bisect
+import logging
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from services.bonus_marks import get_bonus_marks
+from services.bulk_upsert import bulk_upsert
+from services.calendar_service import get_month_bounds, get_working_days
+from services.grading import calculate_percentage, grade_matrix, grade_percentages
+from models import (db, MonthlyExam, IndividualExam, MonthlyMark, MonthlyRanking, MonthlyRankingSnapshot,
+                    Batch, User, UserRole, Attendance, AttendanceStatus)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RankingRow:
+    """One student's line in a comprehensive monthly ranking"""
+    user_id: int
+    student_name: str
+    student_phone: Optional[str]
+    roll_number: Optional[int]
+    individual_marks: Dict[int, dict]
+    total_exam_marks: float
+    total_possible_marks: float
+    attendance_marks: int
+    max_attendance_marks: int
+    total_attendance_days: int
+    attendance_percentage: float
+    final_total: float
+    total_possible: float
+    percentage: float
+    grade: Optional[str]
+    gpa: Optional[float]
+    exam_gpa: Optional[float]
+    passed_exams: int
+    total_exams: int
+    previous_position: Optional[int]
+    bonus_marks: float = 0
+    previous_roll_number: Optional[int] = field(default=None, repr=False)
+    current_position: Optional[int] = None
+    position: Optional[int] = None
+    position_change: Optional[int] = None
+    position_trend: Optional[str] = None
+
+    def to_dict(self):
+        """Payload dict as returned by the ranking endpoints"""
+        data = asdict(self)
+        data.pop('previous_roll_number')
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a row from a stored payload dict"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+def get_previous_monthly_exam(monthly_exam):
+    """Find the same batch's monthly exam for the preceding month"""
+    prev_month = monthly_exam.month - 1 if monthly_exam.month > 1 else 12
+    prev_year = monthly_exam.year if monthly_exam.month > 1 else monthly_exam.year - 1
+
+    return MonthlyExam.query.filter_by(
+        batch_id=monthly_exam.batch_id,
+        month=prev_month,
+        year=prev_year,
+        is_deleted=False
+    ).first()
+
+
+def get_next_monthly_exam(monthly_exam):
+    """Find the same batch's monthly exam for the following month"""
+    next_month = monthly_exam.month + 1 if monthly_exam.month < 12 else 1
+    next_year = monthly_exam.year if monthly_exam.month < 12 else monthly_exam.year + 1
+
+    return MonthlyExam.query.filter_by(
+        batch_id=monthly_exam.batch_id,
+        month=next_month,
+        year=next_year,
+        is_deleted=False
+    ).first()
+
+
+def load_batch_students(batch_id, user_ids=None):
+    """Active, non-archived students enrolled in a batch, optionally limited to user_ids"""
+    query = User.query.join(
+        User.batches
+    ).filter(
+        User.role == UserRole.STUDENT,
+        User.is_active == True,
+        User.is_archived == False,
+        Batch.id == batch_id
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    return query.all()
+
+
+def load_individual_exams(monthly_exam_id):
+    """Individual exams of a monthly exam in display order"""
+    return IndividualExam.query.filter_by(
+        monthly_exam_id=monthly_exam_id
+    ).order_by(IndividualExam.order_index).all()
+
+
+def get_previous_roll_numbers(monthly_exam):
+    """Map user ids to their roll numbers in the previous month's final ranking"""
+    prev_exam = get_previous_monthly_exam(monthly_exam)
+    if not prev_exam:
+        return {}
+    return dict(db.session.query(MonthlyRanking.user_id, MonthlyRanking.roll_number).filter(
+        MonthlyRanking.monthly_exam_id == prev_exam.id,
+        MonthlyRanking.is_final == True,
+        MonthlyRanking.roll_number.isnot(None)
+    ).all())
+
+
+def get_effective_roll_numbers(monthly_exam, student_ids=None):
+    """
+    Map user ids to the roll number shown in the ranking for active students.
+
+    That is the roll number stored for this exam, otherwise the one inherited
+    from the previous month's final ranking.
+    """
+    if student_ids is None:
+        student_ids = {student.id for student in load_batch_students(monthly_exam.batch_id)}
+
+    rolls = get_previous_roll_numbers(monthly_exam)
+    rolls.update(db.session.query(MonthlyRanking.user_id, MonthlyRanking.roll_number).filter(
+        MonthlyRanking.monthly_exam_id == monthly_exam.id,
+        MonthlyRanking.roll_number.isnot(None)
+    ).all())
+
+    return {user_id: roll_number for user_id, roll_number in rolls.items() if user_id in student_ids}
+
+
+def get_roll_number_map(monthly_exam):
+    """Map roll numbers to user ids for the exam's active students"""
+    return {roll_number: user_id for user_id, roll_number in get_effective_roll_numbers(monthly_exam).items()}
+
+
+def compute_comprehensive_ranking(monthly_exam, individual_exams=None, students=None):
+    """
+    Compute the comprehensive ranking table for a monthly exam.
+
+    Marks, present-day counts, existing rankings and previous-month rankings
+    are each fetched with one grouped query for the whole batch, and the
+    ranking is then assembled in memory. The number of queries does not
+    depend on the number of students or individual exams.
+
+    Returns a list of RankingRow objects sorted by position.
+    """
+    if individual_exams is None:
+        individual_exams = load_individual_exams(monthly_exam.id)
+    if students is None:
+        students = load_batch_students(monthly_exam.batch_id)
+
+    rankings = build_ranking_rows(monthly_exam, individual_exams, students)
+    assign_positions(rankings)
+    return rankings
+
+
+def build_ranking_rows(monthly_exam, individual_exams, students, restrict_to_students=False):
+    """
+    Build unpositioned ranking rows for the given students.
+
+    With restrict_to_students the lookups are filtered to the students' ids,
+    which keeps single-student refreshes cheap; otherwise whole-exam queries
+    are used.
+    """
+    exam_id = monthly_exam.id
+    user_ids = [student.id for student in students]
+
+    def scoped(query, column):
+        return query.filter(column.in_(user_ids)) if restrict_to_students else query
+
+    # All marks for the exam, keyed by (user_id, individual_exam_id)
+    marks_by_key = {
+        (mark.user_id, mark.individual_exam_id): mark
+        for mark in scoped(MonthlyMark.query.filter_by(monthly_exam_id=exam_id), MonthlyMark.user_id).all()
+    }
+
+    # Existing rankings hold assigned roll numbers and stored previous positions
+    existing_by_user = {
+        ranking.user_id: ranking
+        for ranking in scoped(MonthlyRanking.query.filter_by(monthly_exam_id=exam_id), MonthlyRanking.user_id).all()
+    }
+
+    # Teacher-added bonus marks, reported alongside (not added to) the totals
+    bonus_by_user = get_bonus_marks(exam_id, user_ids if restrict_to_students else None)
+
+    # Attendance marks: 1 mark per present day in the exam's month
+    total_days = 0
+    max_attendance_marks = 0
+    present_by_user = {}
+
+    if monthly_exam.start_date and monthly_exam.end_date:
+        month_start, month_end = get_month_bounds(monthly_exam.month, monthly_exam.year)
+        total_days = get_working_days(monthly_exam.batch, monthly_exam.month, monthly_exam.year)
+        max_attendance_marks = total_days
+
+        present_query = db.session.query(Attendance.user_id, func.count(Attendance.id)).filter(
+            Attendance.batch_id == monthly_exam.batch_id,
+            Attendance.date >= month_start,
+            Attendance.date <= month_end,
+            Attendance.status == AttendanceStatus.PRESENT
+        )
+        present_by_user = dict(
+            scoped(present_query, Attendance.user_id).group_by(Attendance.user_id).all()
+        )
+
+    # Previous month's final rankings for position comparison and roll inheritance
+    prev_by_user = {}
+    prev_exam = get_previous_monthly_exam(monthly_exam)
+    if prev_exam:
+        prev_query = MonthlyRanking.query.filter_by(monthly_exam_id=prev_exam.id, is_final=True)
+        prev_by_user = {
+            ranking.user_id: ranking
+            for ranking in scoped(prev_query, MonthlyRanking.user_id).all()
+        }
+
+    exam_count = len(individual_exams)
+
+    # Grade the whole students x papers matrix at once; missing marks count as absent
+    student_marks = [[marks_by_key.get((student.id, exam.id)) for exam in individual_exams] for student in students]
+    graded = grade_matrix(
+        [[mark.marks_obtained if mark else None for mark in row] for row in student_marks],
+        [[mark.total_marks if mark else exam.marks for mark, exam in zip(row, individual_exams)]
+         for row in student_marks],
+        absent=[[mark.is_absent if mark else True for mark in row] for row in student_marks]
+    )
+
+    rankings = []
+    percentages = []
+    exam_percentages = []
+
+    for row_idx, student in enumerate(students):
+        existing_ranking = existing_by_user.get(student.id)
+
+        individual_marks = {}
+        total_exam_marks = 0
+        total_possible_marks = 0
+
+        for col_idx, exam in enumerate(individual_exams):
+            mark = student_marks[row_idx][col_idx]
+
+            if mark:
+                mark_percentage = graded.percentages[row_idx][col_idx]
+                individual_marks[exam.id] = {
+                    'exam_title': exam.title,
+                    'subject': exam.subject,
+                    'marks_obtained': mark.marks_obtained,
+                    'total_marks': mark.total_marks,
+                    'percentage': round(mark_percentage, 2) if mark.total_marks > 0 else 0,
+                    'is_absent': mark.is_absent,
+                    'grade': graded.grades[row_idx][col_idx]
+                }
+                if not mark.is_absent:
+                    total_exam_marks += mark.marks_obtained
+                total_possible_marks += mark.total_marks
+            else:
+                individual_marks[exam.id] = {
+                    'exam_title': exam.title,
+                    'subject': exam.subject,
+                    'marks_obtained': 0,
+                    'total_marks': exam.marks,
+                    'percentage': 0,
+                    'is_absent': True,
+                    'grade': 'F'
+                }
+                total_possible_marks += exam.marks
+
+        attendance_marks = present_by_user.get(student.id, 0)
+        attendance_percentage = (attendance_marks / total_days * 100) if total_days > 0 else 0
+
+        # Final totals (NO BONUS - just exam marks + attendance marks)
+        final_total = total_exam_marks + attendance_marks
+        total_possible = total_possible_marks + max_attendance_marks
+        percentage = calculate_percentage(final_total, total_possible)
+
+        percentages.append(percentage)
+        exam_percentages.append(calculate_percentage(total_exam_marks, total_possible_marks))
+
+        previous_position = None
+        previous_roll_number = None
+
+        if existing_ranking and existing_ranking.previous_position:
+            previous_position = existing_ranking.previous_position
+
+        prev_ranking = prev_by_user.get(student.id)
+        if prev_ranking:
+            previous_position = prev_ranking.position
+            previous_roll_number = prev_ranking.roll_number
+
+        # Roll number: use existing, or inherit from previous month, or None
+        current_roll_number = None
+        if existing_ranking and existing_ranking.roll_number:
+            current_roll_number = existing_ranking.roll_number
+        elif previous_roll_number:
+            current_roll_number = previous_roll_number
+
+        rankings.append(RankingRow(
+            user_id=student.id,
+            student_name=student.full_name,
+            student_phone=student.phoneNumber,
+            roll_number=current_roll_number,
+            individual_marks=individual_marks,
+            total_exam_marks=total_exam_marks,
+            total_possible_marks=total_possible_marks,
+            attendance_marks=attendance_marks,
+            max_attendance_marks=max_attendance_marks,
+            total_attendance_days=total_days,
+            attendance_percentage=round(attendance_percentage, 2),
+            final_total=final_total,
+            total_possible=total_possible,
+            percentage=round(percentage, 2),
+            grade=None,  # Graded for the whole batch below
+            gpa=None,
+            exam_gpa=None,
+            passed_exams=sum(graded.passed[row_idx]),
+            total_exams=exam_count,
+            previous_position=previous_position,
+            bonus_marks=bonus_by_user.get(student.id, 0),
+            previous_roll_number=previous_roll_number
+        ))
+
+    grades, gpas = grade_percentages(percentages)
+    _, exam_gpas = grade_percentages(exam_percentages)
+    for rank, grade, gpa, exam_gpa in zip(rankings, grades, gpas, exam_gpas):
+        rank.grade = grade
+        rank.gpa = round(gpa, 2)
+        rank.exam_gpa = round(exam_gpa, 2)
+
+    return rankings
+
+
+def ranking_sort_key(rank):
+    """Sort by final percentage (descending), then by total marks, then by name"""
+    return (-rank.percentage, -rank.final_total, rank.student_name)
+
+
+def set_position(rank, current_position):
+    """Attach a position and the trend relative to the previous month"""
+    rank.current_position = current_position
+    rank.position = current_position  # For compatibility
+
+    if rank.previous_position:
+        rank.position_change = rank.previous_position - current_position
+        if rank.position_change > 0:
+            rank.position_trend = 'up'
+        elif rank.position_change < 0:
+            rank.position_trend = 'down'
+        else:
+            rank.position_trend = 'same'
+    else:
+        rank.position_change = None
+        rank.position_trend = 'new'
+
+
+def assign_positions(rankings):
+    """Sort rankings in place and attach positions and position trends"""
+    rankings.sort(key=ranking_sort_key)
+
+    for idx, rank in enumerate(rankings):
+        set_position(rank, idx + 1)
+
+    return rankings
+
+
+# Snapshot cache
+
+def serialize_individual_exam_summary(exam):
+    """Compact individual exam entry used in ranking payloads"""
+    return {'id': exam.id, 'title': exam.title, 'subject': exam.subject, 'marks': exam.marks}
+
+
+def get_ranking_snapshot(monthly_exam):
+    """
+    Return (individual_exams, rankings) for a monthly exam from the snapshot cache.
+
+    A fresh snapshot costs a single lookup. A missing or stale snapshot is
+    recomputed and stored against the version read before computing, so a
+    write that lands during the recompute leaves the snapshot stale rather
+    than being overwritten.
+    """
+    snapshot = MonthlyRankingSnapshot.query.filter_by(monthly_exam_id=monthly_exam.id).first()
+    if snapshot and snapshot.is_fresh:
+        return snapshot.payload['individual_exams'], snapshot.payload['rankings']
+
+    if snapshot is None:
+        # Create the row first so invalidations during the first compute are not lost
+        try:
+            snapshot = MonthlyRankingSnapshot(monthly_exam_id=monthly_exam.id, version=1)
+            db.session.add(snapshot)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            snapshot = MonthlyRankingSnapshot.query.filter_by(monthly_exam_id=monthly_exam.id).first()
+
+    read_version = snapshot.version
+
+    individual_exams = load_individual_exams(monthly_exam.id)
+    rankings = compute_comprehensive_ranking(monthly_exam, individual_exams)
+    payload = {
+        'individual_exams': [serialize_individual_exam_summary(e) for e in individual_exams],
+        'rankings': [rank.to_dict() for rank in rankings]
+    }
+
+    try:
+        db.session.execute(
+            update(MonthlyRankingSnapshot)
+            .where(
+                MonthlyRankingSnapshot.id == snapshot.id,
+                MonthlyRankingSnapshot.version == read_version
+            )
+            .values(payload=payload, snapshot_version=read_version, computed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not store ranking snapshot for exam {monthly_exam.id}: {e}")
+
+    return payload['individual_exams'], payload['rankings']
+
+
+def invalidate_ranking_snapshots(monthly_exam_ids):
+    """
+    Mark ranking snapshots stale by bumping their version.
+
+    Runs inside the caller's transaction; commit together with the write that
+    caused the invalidation.
+    """
+    exam_ids = {exam_id for exam_id in monthly_exam_ids if exam_id}
+    if not exam_ids:
+        return
+
+    db.session.execute(
+        update(MonthlyRankingSnapshot)
+        .where(MonthlyRankingSnapshot.monthly_exam_id.in_(exam_ids))
+        .values(version=MonthlyRankingSnapshot.version + 1, invalidated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def invalidate_ranking_and_next_month(monthly_exam):
+    """Invalidate an exam's snapshot and the following month's, which inherits its rankings"""
+    next_exam = get_next_monthly_exam(monthly_exam)
+    invalidate_ranking_snapshots([monthly_exam.id, next_exam.id if next_exam else None])
+
+
+def invalidate_rankings_for_batch_month(batch_id, month, year):
+    """Invalidate snapshots of the batch's monthly exams for a given month (all batches when batch_id is None)"""
+    exam_ids = select(MonthlyExam.id).where(
+        MonthlyExam.month == month,
+        MonthlyExam.year == year
+    )
+    if batch_id is not None:
+        exam_ids = exam_ids.where(MonthlyExam.batch_id == batch_id)
+
+    db.session.execute(
+        update(MonthlyRankingSnapshot)
+        .where(MonthlyRankingSnapshot.monthly_exam_id.in_(exam_ids))
+        .values(version=MonthlyRankingSnapshot.version + 1, invalidated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def invalidate_rankings_for_batches(batch_ids):
+    """
+    Invalidate snapshots of every monthly exam of the given batches.
+
+    For writes that change who is ranked or what their rows show: enrollment,
+    archiving, deactivation, student details and the batch's class days.
+    Runs inside the caller's transaction.
+    """
+    batch_ids = {batch_id for batch_id in batch_ids if batch_id}
+    if not batch_ids:
+        return
+
+    db.session.execute(
+        update(MonthlyRankingSnapshot)
+        .where(MonthlyRankingSnapshot.monthly_exam_id.in_(
+            select(MonthlyExam.id).where(MonthlyExam.batch_id.in_(batch_ids))
+        ))
+        .values(version=MonthlyRankingSnapshot.version + 1, invalidated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_ranking_rows(monthly_exam, user_ids):
+    """
+    Incrementally update a fresh ranking snapshot for the students touched by a write.
+
+    The snapshot rows carry each student's stored totals (exam marks,
+    attendance marks, percentage). Only the touched students' rows are
+    rebuilt, with lookups scoped to their ids; the rebuilt rows are placed
+    back into the sorted list with bisect and positions are renumbered from
+    the first row that moved. Missing or stale snapshots are left to the next
+    read. Runs inside the caller's transaction.
+
+    Returns True when the snapshot was patched in place.
+    """
+    touched = {user_id for user_id in user_ids if user_id}
+    snapshot = MonthlyRankingSnapshot.query.filter_by(monthly_exam_id=monthly_exam.id).first()
+    if not touched or snapshot is None:
+        return False
+    if not snapshot.is_fresh:
+        invalidate_ranking_snapshots([monthly_exam.id])
+        return False
+
+    read_version = snapshot.version
+
+    try:
+        old_rows = [RankingRow.from_dict(rank) for rank in snapshot.payload['rankings']]
+        changed_indices = [idx for idx, rank in enumerate(old_rows) if rank.user_id in touched]
+        rankings = [rank for rank in old_rows if rank.user_id not in touched]
+        keys = [ranking_sort_key(rank) for rank in rankings]
+
+        students = load_batch_students(monthly_exam.batch_id, user_ids=touched)
+        new_rows = build_ranking_rows(
+            monthly_exam, load_individual_exams(monthly_exam.id), students, restrict_to_students=True
+        )
+
+        for row in new_rows:
+            key = ranking_sort_key(row)
+            idx = bisect.bisect_right(keys, key)
+            keys.insert(idx, key)
+            rankings.insert(idx, row)
+            changed_indices.append(idx)
+
+        start = min(changed_indices) if changed_indices else len(rankings)
+        for idx in range(start, len(rankings)):
+            set_position(rankings[idx], idx + 1)
+    except Exception as e:
+        logger.warning(f"Incremental ranking update failed for exam {monthly_exam.id}, invalidating: {e}")
+        invalidate_ranking_snapshots([monthly_exam.id])
+        return False
+
+    payload = {
+        'individual_exams': snapshot.payload['individual_exams'],
+        'rankings': [rank.to_dict() for rank in rankings]
+    }
+    result = db.session.execute(
+        update(MonthlyRankingSnapshot)
+        .where(
+            MonthlyRankingSnapshot.id == snapshot.id,
+            MonthlyRankingSnapshot.version == read_version
+        )
+        .values(
+            payload=payload,
+            version=read_version + 1,
+            snapshot_version=read_version + 1,
+            computed_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount == 0:
+        # Another writer changed the snapshot since we read it
+        invalidate_ranking_snapshots([monthly_exam.id])
+        return False
+
+    return True
+
+
+# Persisted final rankings
+
+RANKING_UPSERT_COLUMNS = (
+    'position', 'roll_number', 'total_exam_marks', 'total_possible_marks', 'attendance_marks',
+    'bonus_marks', 'final_total', 'max_possible_total', 'percentage', 'grade', 'gpa', 'exam_gpa',
+    'previous_position', 'is_final', 'updated_at'
+)
+
+
+def save_final_rankings(monthly_exam, rankings):
+    """
+    Persist computed rankings as the exam's final MonthlyRanking rows.
+
+    Roll numbers are inherited from the previous month's final ranking, or
+    assigned from the current position for new students. Rows are written
+    with one bulk upsert keyed on unique_monthly_ranking, and rows of
+    students no longer in the ranking are removed. Runs inside the caller's
+    transaction; returns the number of rows written.
+    """
+    now = datetime.utcnow()
+    values = []
+    for idx, rank in enumerate(rankings):
+        values.append({
+            'monthly_exam_id': monthly_exam.id,
+            'user_id': rank.user_id,
+            'position': rank.position,
+            # Inherit from previous month or assign new roll number
+            'roll_number': rank.previous_roll_number or idx + 1,
+            'total_exam_marks': rank.total_exam_marks,
+            'total_possible_marks': rank.total_possible_marks,
+            'attendance_marks': rank.attendance_marks,
+            'bonus_marks': rank.bonus_marks,  # Recorded only; not part of final_total
+            'final_total': rank.final_total,
+            'max_possible_total': rank.total_possible,
+            'percentage': rank.percentage,
+            'grade': rank.grade,
+            'gpa': rank.gpa,
+            'exam_gpa': rank.exam_gpa,
+            'previous_position': rank.previous_position,
+            'is_final': True,
+            'created_at': now,
+            'updated_at': now
+        })
+
+    stale_rows = MonthlyRanking.__table__.delete().where(MonthlyRanking.monthly_exam_id == monthly_exam.id)
+    if values:
+        stale_rows = stale_rows.where(MonthlyRanking.user_id.notin_([row['user_id'] for row in values]))
+    db.session.execute(stale_rows)
+
+    return bulk_upsert(
+        MonthlyRanking, values,
+        key_columns=('monthly_exam_id', 'user_id'),
+        update_columns=RANKING_UPSERT_COLUMNS
+    )
@@ -0,0 +1,160 @@
+"""
+Report Card Service
+Per-student PDF report cards for a monthly exam, rendered in a process pool and bundled into a ZIP
+"""
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from models import MonthlyExam, MonthlyMark, MonthlyRanking, User
+from services.background_jobs import update_job_progress
+from services.calendar_service import get_working_days
+from services.pdf_report import render_report_card
+from services.ranking_service import load_individual_exams
+
+logger = logging.getLogger(__name__)
+
+REPORT_CARD_JOB = 'report_cards'
+PROGRESS_EVERY = 10
+MAX_WORKERS = 4
+
+
+def get_report_card_dir():
+    """Directory holding generated report card archives"""
+    path = os.path.join(current_app.instance_path, 'report_cards')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_report_card_path(job_id):
+    return os.path.join(get_report_card_dir(), f'report_cards_{job_id}.zip')
+
+
+def build_report_cards(monthly_exam):
+    """
+    Plain-dict report card for every student with a final ranking.
+
+    Rankings, students and marks are read with one query each so the cards
+    can be rendered without touching the database.
+    """
+    rankings = MonthlyRanking.query.filter_by(
+        monthly_exam_id=monthly_exam.id, is_final=True
+    ).order_by(MonthlyRanking.position).all()
+    if not rankings:
+        return []
+
+    user_ids = [rank.user_id for rank in rankings]
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+    papers = load_individual_exams(monthly_exam.id)
+
+    marks = {}
+    for mark in MonthlyMark.query.filter_by(monthly_exam_id=monthly_exam.id).all():
+        marks[(mark.user_id, mark.individual_exam_id)] = mark
+
+    max_attendance = get_working_days(monthly_exam.batch, monthly_exam.month, monthly_exam.year)
+    common = {
+        'institute_name': current_app.config.get('APP_NAME', ''),
+        'exam_title': monthly_exam.title,
+        'batch_name': monthly_exam.batch.name if monthly_exam.batch else '',
+        'month': monthly_exam.month,
+        'year': monthly_exam.year,
+        'total_students': len(rankings),
+        'max_attendance_marks': max_attendance
+    }
+
+    cards = []
+    for rank in rankings:
+        user = users.get(rank.user_id)
+        card_papers = []
+        for paper in papers:
+            mark = marks.get((rank.user_id, paper.id))
+            card_papers.append({
+                'title': paper.title,
+                'subject': paper.subject or '',
+                'total_marks': paper.marks,
+                'marks_obtained': mark.marks_obtained if mark else '-',
+                'is_absent': bool(mark and mark.is_absent),
+                'grade': (mark.grade or '-') if mark else '-'
+            })
+
+        card = dict(common)
+        card.update({
+            'user_id': rank.user_id,
+            'student_name': user.full_name if user else f'Student {rank.user_id}',
+            'roll_number': rank.roll_number,
+            'position': rank.position,
+            'previous_position': rank.previous_position,
+            'papers': card_papers,
+            'total_exam_marks': rank.total_exam_marks or 0,
+            'total_possible_marks': rank.total_possible_marks or 0,
+            'attendance_marks': rank.attendance_marks or 0,
+            'final_total': rank.final_total or 0,
+            'total_possible': rank.max_possible_total or 0,
+            'percentage': rank.percentage or 0,
+            'grade': rank.grade,
+            'gpa': rank.gpa
+        })
+        cards.append(card)
+
+    return cards
+
+
+def get_worker_count(card_count):
+    configured = current_app.config.get('REPORT_CARD_WORKERS') or min(MAX_WORKERS, os.cpu_count() or 1)
+    return max(1, min(configured, card_count))
+
+
+def iter_rendered_cards(cards, workers):
+    """Yield (filename, pdf_bytes) per card, in card order"""
+    if workers <= 1:
+        for card in cards:
+            yield render_report_card(card)
+        return
+
+    # spawn: never fork a process holding the app's database connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        yield from executor.map(render_report_card, cards, chunksize=max(1, len(cards) // (workers * 4)))
+
+
+def generate_report_cards(job_id, monthly_exam_id):
+    """
+    Background job body: render the exam's report cards into a ZIP.
+
+    Returns the job result stored on the BackgroundJob row.
+    """
+    monthly_exam = MonthlyExam.query.get(monthly_exam_id)
+    if not monthly_exam:
+        raise ValueError(f'Monthly exam {monthly_exam_id} not found')
+
+    cards = build_report_cards(monthly_exam)
+    if not cards:
+        raise ValueError('No final rankings found; generate the ranking first')
+
+    update_job_progress(job_id, 0, total=len(cards))
+    workers = get_worker_count(len(cards))
+    path = get_report_card_path(job_id)
+    partial_path = path + '.part'
+
+    try:
+        with zipfile.ZipFile(partial_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for count, (filename, content) in enumerate(iter_rendered_cards(cards, workers), start=1):
+                archive.writestr(filename, content)
+                if count % PROGRESS_EVERY == 0:
+                    update_job_progress(job_id, count)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    update_job_progress(job_id, len(cards))
+    logger.info(f"Rendered {len(cards)} report cards for monthly exam {monthly_exam_id} with {workers} workers")
+
+    return {
+        'monthly_exam_id': monthly_exam_id,
+        'cards_count': len(cards),
+        'filename': f"report_cards_{monthly_exam.year}_{monthly_exam.month:02d}_{monthly_exam.id}.zip",
+        'size_bytes': os.path.getsize(path)
+    }
@@ -0,0 +1,140 @@
+"""
+Result Export Service
+Streaming CSV/XLSX export of comprehensive monthly result sheets
+"""
+import csv
+import io
+import re
+import tempfile
+from models import MonthlyExam
+from services.ranking_service import get_ranking_snapshot
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+SUMMARY_HEADERS = ['Exam Total', 'Attendance', 'Final Total', 'Total Possible', 'Percentage', 'Grade', 'GPA']
+
+
+class ResultExportError(Exception):
+    """Raised when an export cannot be produced"""
+
+
+def _paper_mark(rank, paper_id):
+    """Marks cell for one paper; payload keys are ints when fresh and strings when cached"""
+    marks = rank['individual_marks']
+    mark = marks.get(paper_id) or marks.get(str(paper_id))
+    if not mark:
+        return ''
+    return 'AB' if mark.get('is_absent') else mark.get('marks_obtained')
+
+
+def iter_result_rows(monthly_exam):
+    """
+    Yield the header and one row per student of an exam's result sheet.
+
+    Rows come from the ranking snapshot, so only one exam's ranking is held
+    in memory at a time.
+    """
+    papers, rankings = get_ranking_snapshot(monthly_exam)
+    batch_name = monthly_exam.batch.name if monthly_exam.batch else ''
+
+    yield (['Batch', 'Exam', 'Position', 'Roll No', 'Student Name']
+           + [f"{paper['title']} ({paper['marks']})" for paper in papers]
+           + SUMMARY_HEADERS)
+
+    for rank in rankings:
+        yield ([batch_name, monthly_exam.title, rank['position'], rank['roll_number'] or '', rank['student_name']]
+               + [_paper_mark(rank, paper['id']) for paper in papers]
+               + [rank['total_exam_marks'], rank['attendance_marks'], rank['final_total'],
+                  rank['total_possible'], rank['percentage'], rank['grade'], rank['gpa']])
+
+
+def iter_exam_ids(month, year, batch_ids=None):
+    """Ids of the month's monthly exams, ordered by batch"""
+    query = MonthlyExam.query.with_entities(MonthlyExam.id).filter_by(month=month, year=year, is_deleted=False)
+    if batch_ids:
+        query = query.filter(MonthlyExam.batch_id.in_(batch_ids))
+    return [row.id for row in query.order_by(MonthlyExam.batch_id, MonthlyExam.id).all()]
+
+
+def stream_results_csv(exam_ids):
+    """
+    Yield CSV text for the result sheets of the given exams.
+
+    Exams are loaded and ranked one after another; a blank line separates
+    the sheets of different exams.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    yield '﻿'  # BOM so spreadsheet apps detect UTF-8
+
+    for index, exam_id in enumerate(exam_ids):
+        monthly_exam = MonthlyExam.query.get(exam_id)
+        if not monthly_exam:
+            continue
+        if index:
+            writer.writerow([])
+
+        for row in iter_result_rows(monthly_exam):
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+
+def _sheet_title(name, used_titles):
+    """Excel-safe, unique worksheet title"""
+    title = re.sub(r'[\[\]:*?/\\]', ' ', name or 'Sheet').strip()[:31] or 'Sheet'
+    candidate, suffix = title, 2
+    while candidate.lower() in used_titles:
+        candidate = f'{title[:27]} ({suffix})'
+        suffix += 1
+    used_titles.add(candidate.lower())
+    return candidate
+
+
+def write_results_xlsx(exam_ids):
+    """
+    Write the result sheets into a temporary XLSX file, one worksheet per exam.
+
+    Uses openpyxl's write-only mode, which spools rows to disk instead of
+    keeping the workbook in memory. Returns the open temporary file,
+    positioned at the start.
+    """
+    if openpyxl is None:
+        raise ResultExportError('XLSX export requires openpyxl; use format=csv instead')
+
+    workbook = openpyxl.Workbook(write_only=True)
+    used_titles = set()
+
+    for exam_id in exam_ids:
+        monthly_exam = MonthlyExam.query.get(exam_id)
+        if not monthly_exam:
+            continue
+        sheet = workbook.create_sheet(_sheet_title(
+            f"{monthly_exam.batch.name if monthly_exam.batch else ''} {monthly_exam.title}", used_titles
+        ))
+        for row in iter_result_rows(monthly_exam):
+            sheet.append(row)
+
+    if not used_titles:
+        workbook.create_sheet('Results')
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def iter_file_chunks(file_obj, chunk_size=64 * 1024):
+    """Yield a file's content in chunks and close it afterwards"""
+    try:
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file_obj.close()
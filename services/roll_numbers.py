@@ -0,0 +1,155 @@
+"""
+Roll Number Service
+Bulk roll number allocation for monthly exams
+"""
+from collections import defaultdict
+from datetime import datetime
+from models import db, MonthlyRanking, user_batches
+from services.bulk_upsert import bulk_upsert
+from services.ranking_service import (get_effective_roll_numbers, get_previous_roll_numbers,
+                                      get_ranking_snapshot, load_batch_students)
+
+ROLL_NUMBER_RULES = ('inherit', 'position')
+MAX_REPORTED_ERRORS = 10
+
+
+class RollNumberError(Exception):
+    """Raised when a roll number assignment is rejected; errors lists every problem found"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        shown = '; '.join(errors[:MAX_REPORTED_ERRORS])
+        more = f' (and {len(errors) - MAX_REPORTED_ERRORS} more)' if len(errors) > MAX_REPORTED_ERRORS else ''
+        super().__init__(f'Roll number assignment rejected: {shown}{more}')
+
+
+def get_enrolled_user_ids(batch_id, user_ids):
+    """Subset of user_ids enrolled in the batch, checked with one query"""
+    if not user_ids:
+        return set()
+    rows = db.session.query(user_batches.c.user_id).filter(
+        user_batches.c.batch_id == batch_id,
+        user_batches.c.user_id.in_(user_ids)
+    ).all()
+    return {row.user_id for row in rows}
+
+
+def find_duplicate_rolls(rolls_by_user):
+    """Roll numbers held by more than one student: {roll_number: [user_ids]}"""
+    holders = defaultdict(list)
+    for user_id, roll_number in rolls_by_user.items():
+        holders[roll_number].append(user_id)
+    return {roll: sorted(user_ids) for roll, user_ids in holders.items() if len(user_ids) > 1}
+
+
+def parse_roll_assignments(assignments):
+    """Validate a list of {user_id, roll_number} into ({user_id: roll_number}, errors)"""
+    mapping, errors = {}, []
+    for index, assignment in enumerate(assignments):
+        try:
+            user_id = int(assignment.get('user_id'))
+            roll_number = int(assignment.get('roll_number'))
+        except (AttributeError, TypeError, ValueError):
+            errors.append(f'entry {index + 1} needs integer user_id and roll_number')
+            continue
+
+        if roll_number <= 0:
+            errors.append(f'roll number {roll_number} for student {user_id} must be positive')
+        elif user_id in mapping:
+            errors.append(f'student {user_id} is listed more than once')
+        else:
+            mapping[user_id] = roll_number
+    return mapping, errors
+
+
+def allocate_from_mapping(monthly_exam, assignments):
+    """
+    Validate explicit assignments against enrollment and existing roll numbers.
+
+    A roll number may not be given to two students, counting the roll numbers
+    that students outside the mapping keep (stored or inherited).
+    """
+    mapping, errors = parse_roll_assignments(assignments)
+
+    enrolled = get_enrolled_user_ids(monthly_exam.batch_id, list(mapping))
+    errors.extend(f'student {user_id} is not enrolled in this batch' for user_id in mapping if user_id not in enrolled)
+
+    rolls = get_effective_roll_numbers(monthly_exam)
+    rolls.update(mapping)
+    for roll_number, user_ids in sorted(find_duplicate_rolls(rolls).items()):
+        if any(user_id in mapping for user_id in user_ids):
+            errors.append(f"roll number {roll_number} would be shared by students {', '.join(map(str, user_ids))}")
+
+    if errors:
+        raise RollNumberError(errors)
+    return mapping
+
+
+def allocate_inherited(monthly_exam):
+    """
+    Give every active student their previous month's roll number.
+
+    Students without one (or whose previous roll number is taken) get new
+    numbers after the highest inherited one, in name order.
+    """
+    students = load_batch_students(monthly_exam.batch_id)
+    previous = get_previous_roll_numbers(monthly_exam)
+
+    mapping, taken, newcomers = {}, set(), []
+    for student in sorted(students, key=lambda s: s.id):
+        roll_number = previous.get(student.id)
+        if roll_number is not None and roll_number not in taken:
+            mapping[student.id] = roll_number
+            taken.add(roll_number)
+        else:
+            newcomers.append(student)
+
+    next_roll = max(taken, default=0)
+    for student in sorted(newcomers, key=lambda s: (s.full_name.lower(), s.id)):
+        next_roll += 1
+        mapping[student.id] = next_roll
+    return mapping
+
+
+def allocate_by_position(monthly_exam):
+    """Roll number = current comprehensive ranking position; returns the positions too"""
+    _, rankings = get_ranking_snapshot(monthly_exam)
+    positions = {rank['user_id']: rank['position'] for rank in rankings}
+    return dict(positions), positions
+
+
+def allocate_roll_numbers(monthly_exam, assignments=None, rule=None):
+    """
+    Assign roll numbers for a monthly exam in one bulk upsert.
+
+    Pass either explicit assignments (a list of {user_id, roll_number}) or
+    a rule from ROLL_NUMBER_RULES. Raises RollNumberError without writing
+    anything if the assignment is invalid. Runs inside the caller's
+    transaction; returns the number of students updated.
+    """
+    positions = None
+    if assignments is not None:
+        mapping = allocate_from_mapping(monthly_exam, assignments)
+    elif rule == 'inherit':
+        mapping = allocate_inherited(monthly_exam)
+    elif rule == 'position':
+        mapping, positions = allocate_by_position(monthly_exam)
+    else:
+        raise RollNumberError([f"unknown rule '{rule}', expected one of: {', '.join(ROLL_NUMBER_RULES)}"])
+
+    now = datetime.utcnow()
+    rows = [{
+        'monthly_exam_id': monthly_exam.id,
+        'user_id': user_id,
+        'position': positions.get(user_id, 0) if positions else 0,  # Set properly when rankings are generated
+        'roll_number': roll_number,
+        'created_at': now,
+        'updated_at': now
+    } for user_id, roll_number in mapping.items()]
+
+    update_columns = ['roll_number', 'updated_at'] + (['position'] if positions else [])
+    return bulk_upsert(
+        MonthlyRanking, rows,
+        key_columns=('monthly_exam_id', 'user_id'),
+        update_columns=update_columns
+    )
@@ -0,0 +1,139 @@
+"""
+SMS Balance Ledger
+Append-only record of SMS credit movements; the balance is the sum of the entries
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, Settings, SmsBalanceEntry, SmsOutbox
+
+logger = logging.getLogger(__name__)
+
+# Settings row that held the balance before the ledger
+LEGACY_BALANCE_KEY = 'sms_balance'
+DEFAULT_OPENING_BALANCE = 989
+COMPACT_AFTER = timedelta(days=1)
+
+
+def add_balance_entry(delta, kind, job_id=None, reference=None, created_by=None):
+    """Append one ledger entry; the caller commits"""
+    entry = SmsBalanceEntry(delta=delta, kind=kind, job_id=job_id, reference=reference, created_by=created_by)
+    db.session.add(entry)
+    return entry
+
+
+def ensure_opening_balance():
+    """
+    Seed an empty ledger from the legacy Settings balance, inside the current transaction.
+
+    Returns True if the opening entry was added. Must run before the first
+    other entry is written, so every writer calls it.
+    """
+    if db.session.query(SmsBalanceEntry.id).first():
+        return False
+
+    setting = Settings.query.filter_by(key=LEGACY_BALANCE_KEY).first()
+    opening = (setting.value or {}).get('balance', 0) if setting else DEFAULT_OPENING_BALANCE
+    try:
+        with db.session.begin_nested():
+            add_balance_entry(int(opening), 'opening', reference='opening')
+    except IntegrityError:
+        return False  # Another worker seeded it first
+    return True
+
+
+def get_sms_balance():
+    """Credits available: the sum of the ledger, counting open reservations as spent"""
+    if ensure_opening_balance():
+        db.session.commit()
+    total = db.session.query(func.coalesce(func.sum(SmsBalanceEntry.delta), 0)).scalar()
+    return max(0, int(total))
+
+
+def set_sms_balance(balance, created_by=None):
+    """Record an adjustment that brings the balance to the given value; commits"""
+    delta = int(balance) - get_sms_balance()
+    if delta:
+        add_balance_entry(delta, 'adjustment', created_by=created_by)
+        db.session.commit()
+    return get_sms_balance()
+
+
+def get_job_cost(job_id):
+    """Credits needed by every message queued for a job"""
+    return int(db.session.query(func.coalesce(func.sum(SmsOutbox.cost), 0)).filter(
+        SmsOutbox.job_id == job_id
+    ).scalar())
+
+
+def reserve_sms_credits(job, amount=None):
+    """
+    Reserve the credits of all messages queued for an SMS job in one entry.
+
+    Call once, after queueing, in the same transaction; pass amount when the
+    job was already costed (see services.sms_segments.cost_sms_batch) to skip
+    summing the outbox. Returns the amount reserved.
+    """
+    ensure_opening_balance()
+    if amount is None:
+        amount = get_job_cost(job.id)
+    add_balance_entry(-amount, 'reserve', job_id=job.id, reference=f'job:{job.id}:reserve',
+                      created_by=job.created_by)
+    return amount
+
+
+def settle_sms_credits(job_id):
+    """
+    Return the reserved credits of messages that were not delivered; the caller commits.
+
+    The entry's unique reference makes settling a job twice fail with an
+    IntegrityError instead of releasing the credits again. Returns the credits used.
+    """
+    reserved = -int(db.session.query(func.coalesce(func.sum(SmsBalanceEntry.delta), 0)).filter(
+        SmsBalanceEntry.job_id == job_id, SmsBalanceEntry.kind == 'reserve'
+    ).scalar())
+    used = int(db.session.query(func.coalesce(func.sum(SmsOutbox.cost), 0)).filter(
+        SmsOutbox.job_id == job_id, SmsOutbox.status == 'sent'
+    ).scalar())
+    add_balance_entry(reserved - used, 'settle', job_id=job_id, reference=f'job:{job_id}:settle')
+    return used
+
+
+def compact_ledger(older_than=COMPACT_AFTER):
+    """
+    Fold old entries into a single checkpoint entry so the balance sum stays cheap.
+
+    Entries of jobs that are still open (reserved but not settled) are kept,
+    since settling reads the reservation back. Commits; returns the number of
+    entries folded.
+    """
+    cutoff = datetime.utcnow() - older_than
+    settled_job_ids = [row.job_id for row in db.session.query(SmsBalanceEntry.job_id).filter(
+        SmsBalanceEntry.kind == 'settle', SmsBalanceEntry.created_at < cutoff
+    ).all()]
+    eligible = and_(
+        SmsBalanceEntry.created_at < cutoff,
+        or_(SmsBalanceEntry.job_id.is_(None), SmsBalanceEntry.job_id.in_(settled_job_ids))
+    )
+
+    count, total, max_id = db.session.query(
+        func.count(SmsBalanceEntry.id), func.coalesce(func.sum(SmsBalanceEntry.delta), 0), func.max(SmsBalanceEntry.id)
+    ).filter(eligible).one()
+    if count <= 1:
+        return 0
+
+    deleted = db.session.execute(
+        delete(SmsBalanceEntry).where(eligible, SmsBalanceEntry.id <= max_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if deleted != count:
+        # A concurrent compaction got there first; leave the ledger as it was
+        db.session.rollback()
+        return 0
+
+    checkpoint = add_balance_entry(int(total), 'checkpoint')
+    checkpoint.created_at = cutoff
+    db.session.commit()
+    logger.info(f"Compacted {count} SMS balance entries into a checkpoint of {total}")
+    return count
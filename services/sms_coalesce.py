@@ -0,0 +1,146 @@
+"""
+SMS Coalescing
+Merge the messages of one send job that go to the same phone number, so siblings' guardians get one SMS
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from flask import current_app, has_app_context
+from models import SmsLog
+from services.sms_segments import get_template_meter, sms_segments
+from services.sms_templates import render_sms_template
+
+DEFAULT_MAX_SEGMENTS = 2
+MESSAGE_SEPARATOR = '\n'
+
+
+@dataclass
+class SmsDraft:
+    """One recipient's message before coalescing: a template, its variables and the student it is about"""
+    phone: str
+    template: str
+    variables: Dict[str, Any] = field(default_factory=dict)
+    user_id: Optional[int] = None
+
+
+@dataclass
+class CoalescedSms:
+    """A message to queue: the drafts for one number merged into a single text"""
+    phone: str
+    message: str
+    cost: int
+    user_ids: List[int]
+
+    @property
+    def user_id(self):
+        """Student the SmsLog is filed under: the first one the message is about"""
+        return self.user_ids[0] if self.user_ids else None
+
+
+def get_coalesce_budget():
+    """Most SMS segments one coalesced message may take (SMS_COALESCE_MAX_SEGMENTS)"""
+    if has_app_context():
+        return current_app.config.get('SMS_COALESCE_MAX_SEGMENTS') or DEFAULT_MAX_SEGMENTS
+    return DEFAULT_MAX_SEGMENTS
+
+
+def join_values(values):
+    """'A', 'A & B' or 'A, B & C', without repeats"""
+    values = list(OrderedDict.fromkeys(str(value) for value in values))
+    if len(values) <= 1:
+        return ''.join(values)
+    return ', '.join(values[:-1]) + ' & ' + values[-1]
+
+
+class _MergedDraft:
+    """Drafts with the same template whose variables differ in at most one placeholder"""
+
+    def __init__(self, draft):
+        self.phone = draft.phone
+        self.template = draft.template
+        self.placeholders = get_template_meter(draft.template).placeholders
+        self.variables = {name: draft.variables[name] for name in self.placeholders if name in draft.variables}
+        self.merge_key = None
+        self.values = []
+        self.user_ids = [draft.user_id] if draft.user_id is not None else []
+
+    def merged_variables(self):
+        if self.merge_key is None:
+            return self.variables
+        return dict(self.variables, **{self.merge_key: join_values(self.values)})
+
+    def try_add(self, draft, max_segments):
+        """Fold draft into this message if only one placeholder differs and the result fits max_segments"""
+        if draft.template != self.template:
+            return False
+        variables = {name: draft.variables[name] for name in self.placeholders if name in draft.variables}
+        if variables.keys() != self.variables.keys():
+            return False
+        differing = {name for name in variables if str(variables[name]) != str(self.variables[name])}
+        if self.merge_key is not None:
+            differing.discard(self.merge_key)
+        if len(differing) > 1 or (differing and self.merge_key is not None):
+            return False
+
+        merge_key = self.merge_key or (differing.pop() if differing else None)
+        values = self.values or ([self.variables[merge_key]] if merge_key else [])
+        if merge_key:
+            values = values + [variables[merge_key]]
+            merged = dict(self.variables, **{merge_key: join_values(values)})
+            if get_template_meter(self.template).segments(**merged) > max_segments:
+                return False
+        self.merge_key, self.values = merge_key, values
+        if draft.user_id is not None and draft.user_id not in self.user_ids:
+            self.user_ids.append(draft.user_id)
+        return True
+
+
+def _merge_drafts(drafts, max_segments):
+    """Merge one number's drafts that share a template, joining the one placeholder that differs"""
+    merged = []
+    for draft in drafts:
+        if not any(candidate.try_add(draft, max_segments) for candidate in merged):
+            merged.append(_MergedDraft(draft))
+    return merged
+
+
+def _pack(merged_drafts, max_segments, render):
+    """Join one number's remaining messages while that costs no more credits and fits max_segments"""
+    packed = []
+    for draft in merged_drafts:
+        message = render(draft.template, draft.merged_variables())
+        cost = sms_segments(message)
+        if packed:
+            last = packed[-1]
+            combined = last.message + MESSAGE_SEPARATOR + message
+            combined_cost = sms_segments(combined)
+            if combined_cost <= max_segments and combined_cost <= last.cost + cost:
+                last.message, last.cost = combined, combined_cost
+                last.user_ids.extend(user_id for user_id in draft.user_ids if user_id not in last.user_ids)
+                continue
+        packed.append(CoalescedSms(draft.phone, message, cost, list(draft.user_ids)))
+    return packed
+
+
+def coalesce_sms(drafts, max_segments=None, render=render_sms_template):
+    """
+    Turn a send job's drafts into the messages to queue, one or few per phone number.
+
+    Drafts are grouped by normalized number (siblings share a guardian phone).
+    Within a number, drafts with the same template that differ in one
+    placeholder are rendered once with the values joined ('Rahim & Karim'),
+    identical messages are sent once, and the rest are joined line by line
+    while the text stays within max_segments and costs no more than sending
+    them separately. Numbers keep their first-seen order.
+    """
+    if max_segments is None:
+        max_segments = get_coalesce_budget()
+
+    by_phone = OrderedDict()
+    for draft in drafts:
+        by_phone.setdefault(SmsLog.normalize_phone(draft.phone) or draft.phone, []).append(draft)
+
+    coalesced = []
+    for phone_drafts in by_phone.values():
+        coalesced.extend(_pack(_merge_drafts(phone_drafts, max_segments), max_segments, render))
+    return coalesced
@@ -0,0 +1,254 @@
+"""
+BulkSMSBD Gateway Client
+Connection-pooled, rate-limited client shared by every SMS sender in the process
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'http://bulksmsbd.net/api/smsapi'
+DEFAULT_BALANCE_URL = 'http://bulksmsbd.net/api/getBalanceApi'
+SUCCESS_CODES = (200, 202)  # BulkSMSBD response_code values for an accepted message
+CONNECT_TIMEOUT = 5
+MULTI_RECIPIENT_CHUNK_SIZE = 100  # Numbers per one-to-many request
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, bursts of up to capacity.
+
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = max(1, capacity or int(rate) or 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def format_gateway_number(phone):
+    """Phone number in the 88XXXXXXXXXXX form the gateway expects"""
+    formatted = str(phone).strip().replace(' ', '').replace('-', '').replace('+', '')
+    return formatted if formatted.startswith('88') else '88' + formatted
+
+
+def parse_send_response(response):
+    """Result dict (success, message_id, cost or error) from a /smsapi HTTP response"""
+    if response.status_code != 200:
+        return {'success': False, 'error': f'HTTP {response.status_code}: {response.text}'}
+    try:
+        data = response.json()
+    except ValueError:
+        return {'success': False, 'error': 'Invalid API response format'}
+
+    response_code = data.get('response_code')
+    if response_code in SUCCESS_CODES:
+        return {'success': True, 'message_id': data.get('success_message', ''), 'cost': 1}
+    return {'success': False, 'error': data.get('error_message') or f"API Error Code: {response_code}"}
+
+
+def plan_dispatch(messages, chunk_size=MULTI_RECIPIENT_CHUNK_SIZE):
+    """
+    Group (phone, message, sender_id) items into gateway requests.
+
+    Items with the same text and sender id share one-to-many requests of up
+    to chunk_size numbers, in first-seen order. Returns a list of
+    (item_indexes, numbers, message, sender_id), one entry per request.
+    """
+    groups = OrderedDict()
+    for index, (phone, message, sender_id) in enumerate(messages):
+        groups.setdefault((message, sender_id), []).append((index, format_gateway_number(phone)))
+
+    requests_plan = []
+    for (message, sender_id), recipients in groups.items():
+        for start in range(0, len(recipients), chunk_size):
+            chunk = recipients[start:start + chunk_size]
+            requests_plan.append(([index for index, _ in chunk], [number for _, number in chunk], message, sender_id))
+    return requests_plan
+
+
+class BulkSMSClient:
+    """
+    BulkSMSBD client with keep-alive connections, a bounded worker pool and a rate limit.
+
+    One instance is shared per process (see get_gateway); the rate limit is
+    per process, so split the provider's limit across dispatcher processes.
+    """
+
+    def __init__(self, api_key, sender_id, api_url=DEFAULT_API_URL, balance_url=DEFAULT_BALANCE_URL,
+                 rate_per_second=0, burst=None, max_workers=8, timeout=30,
+                 chunk_size=MULTI_RECIPIENT_CHUNK_SIZE):
+        self.api_key = api_key
+        self.sender_id = sender_id
+        self.api_url = api_url
+        self.balance_url = balance_url
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = max(1, chunk_size)
+        self.timeout = (CONNECT_TIMEOUT, timeout)
+        self.limiter = TokenBucket(rate_per_second, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sms-gateway')
+            return self._executor
+
+    def _submit(self, numbers, message, api_key=None, sender_id=None):
+        """One /smsapi request for one or more numbers: (result, reached_gateway)"""
+        params = {
+            'api_key': api_key or self.api_key,
+            'type': 'text',
+            'number': ','.join(numbers),
+            'senderid': sender_id or self.sender_id,
+            'message': message
+        }
+
+        self.limiter.acquire()
+        try:
+            response = self.session.get(self.api_url, params=params, timeout=self.timeout)
+            return parse_send_response(response), True
+        except requests.exceptions.Timeout:
+            return {'success': False, 'error': 'SMS API timeout'}, False
+        except requests.exceptions.ConnectionError:
+            return {'success': False, 'error': 'SMS API connection error'}, False
+        except Exception as e:
+            return {'success': False, 'error': f'SMS API error: {str(e)}'}, False
+
+    def send(self, phone, message, api_key=None, sender_id=None):
+        """Send one SMS; never raises, failures come back as {'success': False, 'error': ...}"""
+        number = format_gateway_number(phone)
+        result, _ = self._submit([number], message, api_key, sender_id)
+        if result['success']:
+            logger.info(f"SMS sent to {number}")
+        else:
+            logger.warning(f"SMS to {number} failed: {result['error']}")
+        return result
+
+    def send_to_many(self, numbers, message, api_key=None, sender_id=None):
+        """
+        Send one text to several numbers with a single one-to-many request.
+
+        Returns one result per number. If the gateway rejects the request
+        (for example one bad number in the list), each number is retried on
+        its own so one recipient cannot fail the rest; transport errors are
+        returned for every number and left to the caller's retry policy.
+        """
+        if len(numbers) == 1:
+            return [self.send(numbers[0], message, api_key, sender_id)]
+
+        result, reached_gateway = self._submit(numbers, message, api_key, sender_id)
+        if result['success']:
+            logger.info(f"SMS sent to {len(numbers)} recipients in one request")
+            return [dict(result, recipients=len(numbers)) for _ in numbers]
+        if not reached_gateway:
+            logger.warning(f"SMS to {len(numbers)} recipients failed: {result['error']}")
+            return [result for _ in numbers]
+
+        logger.warning(f"One-to-many SMS rejected ({result['error']}); sending to {len(numbers)} numbers one by one")
+        return [self.send(number, message, api_key, sender_id) for number in numbers]
+
+    def send_many(self, messages, api_key=None, sender_id=None):
+        """
+        Send (phone, message) or (phone, message, sender_id) tuples; results come back in input order.
+
+        Identical texts are grouped into one-to-many requests (see plan_dispatch)
+        and the requests run concurrently on the worker pool.
+        """
+        items = []
+        for phone, message, *rest in messages:
+            items.append((phone, message, rest[0] if rest else sender_id))
+
+        plan = plan_dispatch(items, self.chunk_size)
+
+        def submit(request_plan):
+            _, numbers, message, request_sender_id = request_plan
+            return self.send_to_many(numbers, message, api_key, request_sender_id)
+
+        if len(plan) <= 1:
+            responses = [submit(request_plan) for request_plan in plan]
+        else:
+            responses = list(self.executor.map(submit, plan))
+
+        results = [None] * len(items)
+        for (indexes, _, _, _), request_results in zip(plan, responses):
+            for index, result in zip(indexes, request_results):
+                results[index] = result
+        return results
+
+    def get_balance(self, api_key=None):
+        """Account balance from getBalanceApi: {'success': True, 'balance': n} or an error"""
+        self.limiter.acquire()
+        try:
+            response = self.session.get(self.balance_url, params={'api_key': api_key or self.api_key},
+                                        timeout=(CONNECT_TIMEOUT, 10))
+            if response.status_code != 200:
+                return {'success': False, 'error': f'API returned status {response.status_code}', 'balance': 0}
+            data = response.json()
+            return {'success': True, 'balance': int(data.get('balance') or 0), 'currency': 'BDT'}
+        except Exception as e:
+            logger.error(f"Error checking SMS balance: {e}")
+            return {'success': False, 'error': str(e), 'balance': 0}
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide BulkSMSClient built from the app's SMS_* configuration"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            config = current_app.config
+            _gateway = BulkSMSClient(
+                api_key=config.get('SMS_API_KEY'),
+                sender_id=config.get('SMS_SENDER_ID'),
+                api_url=config.get('SMS_API_URL') or DEFAULT_API_URL,
+                balance_url=config.get('SMS_BALANCE_URL') or DEFAULT_BALANCE_URL,
+                rate_per_second=config.get('SMS_RATE_PER_SECOND', 0),
+                burst=config.get('SMS_RATE_BURST'),
+                max_workers=config.get('SMS_MAX_WORKERS', 8),
+                timeout=config.get('SMS_TIMEOUT', 30),
+                chunk_size=config.get('SMS_MULTI_RECIPIENT_CHUNK', MULTI_RECIPIENT_CHUNK_SIZE)
+            )
+        return _gateway
@@ -0,0 +1,221 @@
+"""
+SMS Outbox Service
+Queue SMS in the caller's transaction and deliver them from a separate dispatcher with retries
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, BackgroundJob, SmsLog, SmsOutbox, SmsStatus, User
+from services.background_jobs import create_job, set_job_status
+from services.sms_balance import add_balance_entry, compact_ledger, ensure_opening_balance, settle_sms_credits
+from services.sms_gateway import get_gateway
+from services.sms_segments import sms_segments
+from services.sms_stats import add_sms_stats
+
+logger = logging.getLogger(__name__)
+
+SMS_JOB = 'sms_dispatch'
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+CLAIM_BATCH_SIZE = 200  # Large enough for a broadcast to share one-to-many requests
+CLAIM_TIMEOUT = timedelta(minutes=10)  # A 'sending' row older than this belongs to a dead dispatcher
+POLL_INTERVAL_SECONDS = 2
+COMPACT_INTERVAL = timedelta(hours=1)
+
+
+def create_sms_job(created_by=None, params=None):
+    """BackgroundJob that tracks the delivery of one request's messages; the caller commits"""
+    return create_job(SMS_JOB, params=params, created_by=created_by)
+
+
+def enqueue_sms(phone_number, message, user_id=None, sent_by=None, job=None, charge_sender=False, cost=None):
+    """
+    Queue one SMS: a pending SmsLog plus its outbox row.
+
+    Runs inside the caller's transaction, so the message is only sent if the
+    business change it belongs to commits. cost is the message's segment
+    count, computed here unless the caller costed it from a template. Once a
+    job's messages are queued the caller reserves their credits with
+    reserve_sms_credits(job). Returns the outbox row.
+    """
+    sms_log = SmsLog(
+        user_id=user_id,
+        phone_number=phone_number,
+        message=message,
+        status=SmsStatus.PENDING,
+        sent_by=sent_by,
+        cost=0
+    )
+    outbox = SmsOutbox(
+        sms_log=sms_log,
+        job_id=job.id if job else None,
+        phone_number=phone_number,
+        message=message,
+        max_attempts=MAX_ATTEMPTS,
+        charge_sender=charge_sender,
+        cost=cost if cost is not None else sms_segments(message)
+    )
+    db.session.add(sms_log)
+    db.session.add(outbox)
+    if job:
+        job.total = (job.total or 0) + 1
+    return outbox
+
+
+def get_backoff(attempts):
+    """Delay before retry number attempts + 1: BACKOFF_BASE_SECONDS doubling per attempt, capped"""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def claim_due_messages(limit=CLAIM_BATCH_SIZE):
+    """
+    Claim up to limit due outbox rows for this dispatcher and return them.
+
+    The claim is a conditional UPDATE tagged with a fresh token, so several
+    dispatcher processes can poll the same table without sending a message twice.
+    """
+    now = datetime.utcnow()
+    is_due = or_(
+        (SmsOutbox.status == 'pending') & (SmsOutbox.next_attempt_at <= now),
+        (SmsOutbox.status == 'sending') & (SmsOutbox.claimed_at < now - CLAIM_TIMEOUT)
+    )
+    due = db.session.query(SmsOutbox.id).filter(is_due).order_by(
+        SmsOutbox.next_attempt_at, SmsOutbox.id
+    ).limit(limit).all()
+    ids = [row.id for row in due]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(SmsOutbox).where(SmsOutbox.id.in_(ids), is_due)
+        .values(status='sending', claim_token=token, claimed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return SmsOutbox.query.options(joinedload(SmsOutbox.sms_log)).filter_by(
+        claim_token=token, status='sending'
+    ).order_by(SmsOutbox.id).all()
+
+
+def record_delivery(outbox, result):
+    """Apply a gateway result to the outbox row and its SmsLog; the caller commits"""
+    now = datetime.utcnow()
+    sms_log = outbox.sms_log
+    outbox.attempts += 1
+    outbox.claim_token = None
+
+    if result.get('success'):
+        outbox.status = 'sent'
+        outbox.sent_at = now
+        outbox.last_error = None
+        sms_log.status = SmsStatus.SENT
+        sms_log.sent_at = now
+        sms_log.cost = outbox.cost
+        sms_log.api_response = result
+        if outbox.charge_sender and sms_log.sent_by:
+            db.session.execute(
+                update(User).where(User.id == sms_log.sent_by, User.sms_count > 0)
+                .values(sms_count=User.sms_count - 1)
+                .execution_options(synchronize_session=False)
+            )
+        if outbox.job_id is None:
+            # Job messages were reserved up front and are settled when the job completes
+            ensure_opening_balance()
+            add_balance_entry(-outbox.cost, 'debit')
+        return
+
+    outbox.last_error = result.get('error') or 'Unknown SMS error'
+    if outbox.attempts >= outbox.max_attempts:
+        outbox.status = 'failed'
+        sms_log.status = SmsStatus.FAILED
+        sms_log.api_response = result
+        logger.warning(f"SMS {outbox.id} to {outbox.phone_number} failed after {outbox.attempts} attempts: "
+                       f"{outbox.last_error}")
+    else:
+        outbox.status = 'pending'
+        outbox.next_attempt_at = now + get_backoff(outbox.attempts)
+
+
+def update_sms_jobs(job_ids):
+    """Refresh progress of the given SMS jobs and complete those with nothing left to send"""
+    for job_id in job_ids:
+        counts = dict(db.session.query(SmsOutbox.status, func.count(SmsOutbox.id)).filter(
+            SmsOutbox.job_id == job_id
+        ).group_by(SmsOutbox.status).all())
+        sent, failed = counts.get('sent', 0), counts.get('failed', 0)
+        values = {'processed': sent + failed, 'total': sum(counts.values())}
+
+        if counts.get('pending', 0) + counts.get('sending', 0) == 0:
+            # Release the credits of undelivered messages in the same commit that completes the job
+            try:
+                result = {'sent': sent, 'failed': failed, 'credits_used': settle_sms_credits(job_id)}
+                set_job_status(job_id, 'completed', result=result, finished_at=datetime.utcnow(), **values)
+            except IntegrityError:
+                db.session.rollback()  # Another dispatcher settled and completed it
+        else:
+            job = db.session.get(BackgroundJob, job_id)
+            if job.started_at is None:
+                values['started_at'] = datetime.utcnow()
+            set_job_status(job_id, 'running', **values)
+
+
+def dispatch_pending(limit=CLAIM_BATCH_SIZE):
+    """
+    Send one batch of due messages through the gateway; returns how many were attempted.
+
+    Identical texts in the batch go out as one-to-many requests; every
+    recipient keeps its own outbox row and SmsLog.
+    """
+    messages = claim_due_messages(limit)
+    job_ids = {outbox.job_id for outbox in messages if outbox.job_id}
+    results = get_gateway().send_many([(outbox.phone_number, outbox.message) for outbox in messages])
+    for outbox, result in zip(messages, results):
+        record_delivery(outbox, result)
+    # Final outcomes go into the daily statistics in the same commit
+    add_sms_stats(outbox.sms_log for outbox in messages if outbox.status in ('sent', 'failed'))
+    db.session.commit()
+
+    update_sms_jobs(job_ids)
+    return len(messages)
+
+
+def run_dispatcher(app, poll_interval=POLL_INTERVAL_SECONDS, stop_event=None):
+    """
+    Drain the outbox until stop_event is set, sleeping poll_interval whenever it is empty.
+
+    Also compacts the SMS balance ledger every COMPACT_INTERVAL.
+    """
+    logger.info("SMS dispatcher started")
+    next_compaction = datetime.utcnow()
+    while not (stop_event and stop_event.is_set()):
+        with app.app_context():
+            try:
+                attempted = dispatch_pending()
+                if datetime.utcnow() >= next_compaction:
+                    compact_ledger()
+                    next_compaction = datetime.utcnow() + COMPACT_INTERVAL
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"SMS dispatch failed: {e}", exc_info=True)
+                attempted = 0
+            finally:
+                db.session.remove()
+        if not attempted:
+            if stop_event:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+def start_dispatcher_thread(app, poll_interval=POLL_INTERVAL_SECONDS):
+    """Run the dispatcher in a daemon thread of this process (development servers)"""
+    thread = threading.Thread(target=run_dispatcher, args=(app, poll_interval), name='sms-dispatcher', daemon=True)
+    thread.start()
+    return thread
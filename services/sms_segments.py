@@ -0,0 +1,138 @@
+"""
+SMS Segment Calculator
+GSM-7 / UCS-2 segmentation; templates are measured once and only their variables per recipient
+"""
+import re
+from functools import lru_cache
+
+GSM7 = 'GSM-7'
+UCS2 = 'UCS-2'
+
+# GSM 03.38 default alphabet (one septet each) and its extension table (escape + char, two septets)
+GSM7_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+GSM7_EXTENDED = frozenset('^{}\\[~]|€\f')
+GSM7_CHARSET = GSM7_BASIC | GSM7_EXTENDED
+
+# (single message limit, per-part limit of a concatenated message), in septets / UTF-16 code units
+SEGMENT_LIMITS = {GSM7: (160, 153), UCS2: (70, 67)}
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+@lru_cache(maxsize=4096)
+def text_units(text):
+    """(GSM-7 septets or None if the text needs UCS-2, UTF-16 code units) of a text"""
+    ucs2_units = len(text.encode('utf-16-le')) // 2
+    chars = set(text)
+    if not chars <= GSM7_CHARSET:
+        return None, ucs2_units
+    return len(text) + sum(text.count(char) for char in chars & GSM7_EXTENDED), ucs2_units
+
+
+def count_segments(units, encoding):
+    """Number of SMS parts needed for units of the given encoding"""
+    single, part = SEGMENT_LIMITS[encoding]
+    if units <= single:
+        return 1 if units else 0
+    return -(-units // part)
+
+
+def max_units(encoding, segments=1):
+    """Longest text, in encoded units, that fits in the given number of SMS"""
+    single, part = SEGMENT_LIMITS[encoding]
+    return single if segments <= 1 else part * segments
+
+
+def _describe(gsm_units, ucs2_units, chars):
+    """Segment stats dict from the unit counts of a whole message"""
+    encoding, units = (GSM7, gsm_units) if gsm_units is not None else (UCS2, ucs2_units)
+    segments = count_segments(units, encoding)
+    single, part = SEGMENT_LIMITS[encoding]
+    return {
+        'encoding': encoding,
+        'units': units,
+        'char_count': chars,
+        'segments': segments,
+        'limit_per_sms': single if segments <= 1 else part,
+        'remaining': max_units(encoding, segments) - units
+    }
+
+
+def measure_sms(text):
+    """Encoding, length in encoded units and number of segments of one message"""
+    text = text or ''
+    gsm_units, ucs2_units = text_units(text)
+    return _describe(gsm_units, ucs2_units, len(text))
+
+
+def sms_segments(text):
+    """Credits one message costs: its segment count, at least 1"""
+    return max(1, measure_sms(text)['segments'])
+
+
+class SmsTemplateMeter:
+    """
+    A message template with its static text measured once.
+
+    Placeholders are {name} fields, whether the message is rendered with
+    str.format or str.replace. Measuring a rendered message only measures the
+    variable values, and values shared by many recipients (batch name, date)
+    are measured once thanks to text_units' cache. A placeholder without a
+    value counts as its literal '{name}' text.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        static = PLACEHOLDER.sub('', template)
+        self.placeholders = PLACEHOLDER.findall(template)
+        self.static_chars = len(static)
+        self.static_gsm_units, self.static_ucs2_units = text_units(static)
+
+    def measure(self, **values):
+        """Segment stats of the template rendered with values, without rendering it"""
+        gsm_units, ucs2_units, chars = self.static_gsm_units, self.static_ucs2_units, self.static_chars
+        for name in self.placeholders:
+            value = str(values[name]) if name in values else '{' + name + '}'
+            value_gsm, value_ucs2 = text_units(value)
+            gsm_units = None if gsm_units is None or value_gsm is None else gsm_units + value_gsm
+            ucs2_units += value_ucs2
+            chars += len(value)
+        return _describe(gsm_units, ucs2_units, chars)
+
+    def segments(self, **values):
+        """Credits the rendered message costs, at least 1"""
+        return max(1, self.measure(**values)['segments'])
+
+
+@lru_cache(maxsize=256)
+def get_template_meter(template):
+    """Shared SmsTemplateMeter for a template text"""
+    return SmsTemplateMeter(template)
+
+
+def cost_sms_batch(messages):
+    """
+    Cost a whole send job before dispatch.
+
+    messages is an iterable of message texts, or of (template, values) pairs
+    for templated messages. Returns {'messages', 'segments', 'by_encoding'}
+    where by_encoding maps each encoding to its message and segment counts.
+    """
+    summary = {'messages': 0, 'segments': 0, 'by_encoding': {}}
+    for message in messages:
+        if isinstance(message, str):
+            stats = measure_sms(message)
+        else:
+            template, values = message
+            stats = get_template_meter(template).measure(**values)
+
+        segments = max(1, stats['segments'])
+        encoding = summary['by_encoding'].setdefault(stats['encoding'], {'messages': 0, 'segments': 0})
+        encoding['messages'] += 1
+        encoding['segments'] += segments
+        summary['messages'] += 1
+        summary['segments'] += segments
+    return summary
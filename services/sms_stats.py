@@ -0,0 +1,92 @@
+"""
+SMS Statistics Rollup
+Daily SMS counts and credits per sender and status, so statistics never scan sms_logs
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func
+from models import db, SmsDailyStat, SmsLog, SmsStatus
+from services.bulk_upsert import bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+NO_SENDER = 0  # sent_by of messages without a sending user
+ROLLUP_STATUSES = {SmsStatus.SENT: 'sent', SmsStatus.FAILED: 'failed'}
+BACKFILL_CHUNK_DAYS = 31
+
+
+def stat_key(sms_log):
+    """(day, sent_by, status) rollup key of a delivered or failed SmsLog, or None"""
+    status = ROLLUP_STATUSES.get(sms_log.status)
+    if status is None:
+        return None
+    # Sent messages count on the day they went out, failures on the day they were queued
+    moment = (sms_log.sent_at if status == 'sent' else None) or sms_log.created_at or datetime.utcnow()
+    return moment.date(), sms_log.sent_by or NO_SENDER, status
+
+
+def add_sms_stats(sms_logs):
+    """
+    Add delivered and failed SmsLogs to the daily rollup; the caller commits.
+
+    Call once per log, in the transaction that gives it its final status, so
+    each outcome is counted exactly once. Counters are incremented in the
+    database, so concurrent dispatchers do not overwrite each other.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for sms_log in sms_logs:
+        key = stat_key(sms_log)
+        if key is None:
+            continue
+        totals[key][0] += 1
+        totals[key][1] += int(sms_log.cost or 0)
+
+    rows = [{'day': day, 'sent_by': sent_by, 'status': status, 'count': count, 'cost': cost}
+            for (day, sent_by, status), (count, cost) in totals.items()]
+    return bulk_upsert(SmsDailyStat, rows, key_columns=('day', 'sent_by', 'status'),
+                       increment_columns=('count', 'cost'))
+
+
+def backfill_sms_stats(chunk_days=BACKFILL_CHUNK_DAYS):
+    """
+    Rebuild the rollup from sms_logs, one block of chunk_days at a time.
+
+    Replaces every existing rollup row, so run it while no dispatcher is
+    running. Commits after each block; returns the number of rollup rows.
+    """
+    db.session.execute(delete(SmsDailyStat))
+    db.session.commit()
+
+    first = db.session.query(func.min(func.coalesce(SmsLog.sent_at, SmsLog.created_at))).scalar()
+    if first is None:
+        return 0
+    if isinstance(first, str):
+        first = datetime.fromisoformat(first)
+
+    written = 0
+    start = datetime.combine(first.date(), datetime.min.time())
+    end_of_history = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    while start < end_of_history:
+        end = start + timedelta(days=chunk_days)
+        rows = []
+        for status, status_name in ROLLUP_STATUSES.items():
+            moment = func.coalesce(SmsLog.sent_at, SmsLog.created_at) if status == SmsStatus.SENT else SmsLog.created_at
+            grouped = db.session.query(
+                func.date(moment), func.coalesce(SmsLog.sent_by, NO_SENDER),
+                func.count(SmsLog.id), func.coalesce(func.sum(SmsLog.cost), 0)
+            ).filter(
+                SmsLog.status == status, moment >= start, moment < end
+            ).group_by(func.date(moment), func.coalesce(SmsLog.sent_by, NO_SENDER)).all()
+            rows.extend({
+                'day': day if isinstance(day, date) else date.fromisoformat(day),
+                'sent_by': sent_by, 'status': status_name, 'count': count, 'cost': int(cost)
+            } for day, sent_by, count, cost in grouped)
+
+        written += bulk_upsert(SmsDailyStat, rows, key_columns=('day', 'sent_by', 'status'),
+                               increment_columns=('count', 'cost'))
+        db.session.commit()
+        start = end
+
+    logger.info(f"Backfilled {written} SMS daily statistics rows")
+    return written
@@ -0,0 +1,132 @@
+"""
+SMS Template Registry
+Default and saved SMS templates, loaded once per process and compiled into renderers
+"""
+import logging
+import time
+from functools import lru_cache
+from models import Settings, SmsTemplate
+from services.sms_segments import PLACEHOLDER, get_template_meter
+
+logger = logging.getLogger(__name__)
+
+SAVED_TEMPLATE_PREFIX = 'sms_template_'
+
+# Seconds a worker trusts its copy of the saved templates; saves in this worker invalidate it at once
+TEMPLATE_MEMORY_TTL = 30
+
+# Short default templates (Bangla, one SMS each); attendance_* and exam_result are not editable
+DEFAULT_SMS_TEMPLATES = {
+    'exam_result': "{student_name} পেয়েছে {marks}/{total} ({subject}) {date}",
+    'attendance_present': "{student_name} উপস্থিত ({batch_name})",
+    'attendance_absent': "{student_name} অনুপস্থিত {date} ({batch_name})",
+    'fee_reminder': "{student_name} এর ফি {amount}৳ বকেয়া। শেষ তারিখ {due_date}",
+    'custom_exam': "{student_name} scored {marks}/{total} in {subject} on {date}",
+    'custom_general': "{student_name}: {message} ({date})",
+    'general': "{student_name}: {message}"
+}
+
+_template_cache = {'loaded_at': 0, 'saved': None, 'users': {}}
+
+
+class CompiledTemplate:
+    """
+    A template split once into its literal text and {name} placeholders.
+
+    render() is a single join over the precomputed parts, so rendering a
+    message per recipient does no parsing, regex work or lookups beyond the
+    values dict. A placeholder without a value is kept as its literal
+    '{name}' text, as SmsTemplateMeter counts it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        parts = PLACEHOLDER.split(text)
+        self.literals = tuple(parts[0::2])
+        self.fields = tuple(parts[1::2])
+        self.placeholders = tuple(dict.fromkeys(self.fields))
+        self._pairs = tuple(zip(self.fields, self.literals[1:]))
+
+    @property
+    def meter(self):
+        """SmsTemplateMeter for costing rendered messages without rendering them"""
+        return get_template_meter(self.text)
+
+    def missing(self, values):
+        """Placeholders of the template that values has no entry for"""
+        return [name for name in self.placeholders if name not in values]
+
+    def render(self, values):
+        """The template with each placeholder replaced by str(values[name])"""
+        if not self.fields:
+            return self.text
+        parts = [self.literals[0]]
+        for name, literal in self._pairs:
+            parts.append(str(values[name]) if name in values else '{' + name + '}')
+            parts.append(literal)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(text):
+    """Shared CompiledTemplate for a template text"""
+    return CompiledTemplate(text)
+
+
+def render_sms_template(template, variables):
+    """Render a template text with variables through its compiled form"""
+    return compile_template(template).render(variables)
+
+
+def _load_saved_templates():
+    now = time.monotonic()
+    if _template_cache['saved'] is not None and now - _template_cache['loaded_at'] < TEMPLATE_MEMORY_TTL:
+        return
+    saved = {}
+    for setting in Settings.query.filter(Settings.key.like(f'{SAVED_TEMPLATE_PREFIX}%')).all():
+        message = setting.value.get('message') if setting.value else None
+        if message:
+            saved[setting.key[len(SAVED_TEMPLATE_PREFIX):]] = message
+    _template_cache['saved'] = saved
+    _template_cache['users'] = {}
+    _template_cache['loaded_at'] = now
+
+
+def get_saved_templates():
+    """Templates saved in Settings (sms_template_<type>) as {type: message}"""
+    _load_saved_templates()
+    return _template_cache['saved']
+
+
+def get_user_templates(user_id):
+    """A user's active SmsTemplate overrides as {template id: content}"""
+    _load_saved_templates()
+    users = _template_cache['users']
+    if user_id not in users:
+        users[user_id] = {
+            template.name: template.content
+            for template in SmsTemplate.query.filter_by(created_by=user_id, is_active=True).all()
+        }
+    return users[user_id]
+
+
+def invalidate_sms_templates():
+    """Drop this worker's saved templates after a template is saved; other workers reload within the TTL"""
+    _template_cache['saved'] = None
+    _template_cache['users'] = {}
+
+
+def get_default_template(template_type):
+    """Default template text for a type, the general template for unknown types"""
+    return DEFAULT_SMS_TEMPLATES.get(template_type, DEFAULT_SMS_TEMPLATES['general'])
+
+
+def resolve_template(template_type, custom_templates=None, default=None):
+    """
+    Template text to use for a type: the session override, then the
+    template saved in Settings, then default or the built-in default.
+    """
+    return ((custom_templates or {}).get(template_type)
+            or get_saved_templates().get(template_type)
+            or default
+            or get_default_template(template_type))
@@ -0,0 +1,22 @@
+"""
+SMS dispatcher: send queued SMS from the sms_outbox table
+
+Run one or more alongside the web workers, e.g. `python sms_dispatcher.py`
+"""
+import logging
+import os
+from app import create_app
+from services.sms_outbox import POLL_INTERVAL_SECONDS, run_dispatcher
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app = create_app()
+    poll_interval = float(os.environ.get('SMS_POLL_INTERVAL') or POLL_INTERVAL_SECONDS)
+    print(f"📨 SMS dispatcher polling every {poll_interval:g}s")
+    try:
+        run_dispatcher(app, poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        print("👋 SMS dispatcher stopped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+SMS throughput benchmark against the local BulkSMSBD stand-in
+
+Seeds a throwaway SQLite database, points the gateway client at
+tests/fake_bulksmsbd.py and measures three paths:
+
+- send_bulk:  SMSService.send_bulk_sms, straight through the gateway client
+- attendance: POST /api/attendance/bulk with SMS, then the outbox dispatcher
+- marks:      POST .../individual-exams/<id>/marks with SMS, then the dispatcher
+
+For each it reports messages attempted per second, messages the gateway
+accepted, gateway requests, errors and worker occupancy (time the gateway
+spent serving requests over elapsed time x SMS_MAX_WORKERS).
+
+    python tests/benchmark_sms.py --students 300 --latency 150 --error-rate 0.02
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bulksmsbd import FakeBulkSMSBD
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='SMS throughput benchmark')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=100, help='Fake gateway latency in ms')
+    parser.add_argument('--jitter', type=float, default=20, help='Fake gateway latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0, help='Fake gateway requests/second limit')
+    parser.add_argument('--workers', type=int, default=8, help='SMS_MAX_WORKERS')
+    parser.add_argument('--client-rate', type=float, default=0, help='SMS_RATE_PER_SECOND (0 = unlimited)')
+    parser.add_argument('--scenarios', default='send_bulk,attendance,marks')
+    return parser.parse_args()
+
+
+def configure_environment(args, gateway, database_path):
+    """Point the app at the fake gateway and a scratch database; must run before importing the app"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ['BULKSMSBD_API_KEY'] = 'benchmark-key'
+    os.environ['BULKSMSBD_SENDER_ID'] = '8809617628909'
+    os.environ['BULKSMSBD_API_URL'] = gateway.api_url
+    os.environ['BULKSMSBD_BALANCE_URL'] = gateway.balance_url
+    os.environ['SMS_MAX_WORKERS'] = str(args.workers)
+    os.environ['SMS_RATE_PER_SECOND'] = str(args.client_rate)
+    os.environ['SMS_DISPATCHER_THREAD'] = 'false'
+    for name in ('HTTP_PROXY', 'http_proxy'):
+        os.environ.pop(name, None)
+
+
+def seed(db, models, student_count):
+    """Teacher, batch, students with guardian phones and a monthly exam with one paper"""
+    teacher = models.User(phoneNumber='01700000000', first_name='Bench', last_name='Teacher',
+                          role=models.UserRole.TEACHER, sms_count=student_count * 10)
+    batch = models.Batch(name='Benchmark Batch', start_date=date.today())
+    teacher.batches.append(batch)
+    db.session.add_all([teacher, batch])
+    db.session.flush()
+
+    students = []
+    for index in range(student_count):
+        student = models.User(phoneNumber=f'0171{index:07d}', first_name=f'Student{index}', last_name='Bench',
+                              role=models.UserRole.STUDENT, guardian_phone=f'0181{index:07d}')
+        student.batches.append(batch)
+        students.append(student)
+    db.session.add_all(students)
+
+    now = datetime.utcnow()
+    exam = models.MonthlyExam(title='Benchmark Exam', month=now.month, year=now.year, total_marks=0, pass_marks=0,
+                              start_date=now, end_date=now, batch_id=batch.id, created_by=teacher.id)
+    db.session.add(exam)
+    db.session.flush()
+    paper = models.IndividualExam(monthly_exam_id=exam.id, title='Paper 1', subject='Physics', marks=100,
+                                  exam_date=now, duration=60, order_index=1)
+    db.session.add(paper)
+    db.session.commit()
+    return teacher.id, batch.id, [student.id for student in students], exam.id, paper.id
+
+
+def drain_outbox(sms_outbox):
+    """Dispatch until nothing is due; returns the messages attempted"""
+    attempted = 0
+    while True:
+        count = sms_outbox.dispatch_pending()
+        if not count:
+            return attempted
+        attempted += count
+
+
+def report(name, messages, elapsed, gateway, workers, extra=''):
+    stats = gateway.stats()
+    occupancy = stats['busy_seconds'] / (elapsed * workers) if elapsed else 0
+    rate = messages / elapsed if elapsed else 0
+    print(f"{name:<11} {messages:>6} msgs ({stats['accepted']} accepted) {elapsed:>7.2f}s {rate:>8.1f} msg/s  "
+          f"{stats['requests']:>5} requests  peak {stats['peak_in_flight']:>2}/{workers} workers  "
+          f"occupancy {occupancy:>5.0%}  errors {stats['gateway_errors'] + stats['http_errors']}"
+          f"  429s {stats['rate_limited']}{extra}")
+
+
+def main():
+    args = parse_args()
+    gateway = FakeBulkSMSBD(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                            http_error_rate=args.http_error_rate, rate_limit=args.rate_limit, seed=1).start()
+    scratch = tempfile.mkdtemp(prefix='sms-benchmark-')
+    configure_environment(args, gateway, os.path.join(scratch, 'benchmark.db'))
+
+    from app import create_app
+    import models
+    from models import db
+    from services import sms_outbox
+    from services.sms_service import SMSMessage, SMSService
+
+    app = create_app('production')
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    print(f"📨 {args.students} students, gateway latency {args.latency:g}±{args.jitter:g}ms, "
+          f"{args.workers} workers, errors {args.error_rate:.0%}/{args.http_error_rate:.0%} (code/HTTP)")
+
+    with app.app_context():
+        teacher_id, batch_id, student_ids, exam_id, paper_id = seed(db, models, args.students)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = teacher_id
+        session['user_role'] = 'teacher'
+
+    if 'send_bulk' in scenarios:
+        with app.app_context():
+            students = models.User.query.filter(models.User.id.in_(student_ids)).all()
+            messages = [SMSMessage(recipient=student.phoneNumber, message=f'Dear {student.first_name}, class at 4pm.')
+                        for student in students]
+            gateway.reset()
+            started = time.monotonic()
+            results = SMSService().send_bulk_sms(messages, user_id=teacher_id)
+            elapsed = time.monotonic() - started
+            failed = sum(1 for result in results if not result.success)
+        report('send_bulk', len(messages), elapsed, gateway, args.workers, f'  failed {failed}')
+
+    if 'attendance' in scenarios:
+        gateway.reset()
+        started = time.monotonic()
+        response = client.post('/api/attendance/bulk', json={
+            'batchId': batch_id, 'date': date.today().isoformat(), 'sendSms': True,
+            'attendanceData': [{'userId': student_id, 'status': 'absent' if index % 5 == 0 else 'present'}
+                               for index, student_id in enumerate(student_ids)]
+        })
+        queued_in = time.monotonic() - started
+        if response.status_code != 200:
+            print(f"attendance  request failed: {response.status_code} {response.get_json()}")
+        else:
+            with app.app_context():
+                attempted = drain_outbox(sms_outbox)
+            elapsed = time.monotonic() - started
+            report('attendance', attempted, elapsed, gateway, args.workers, f'  (queued in {queued_in:.2f}s)')
+
+    if 'marks' in scenarios:
+        gateway.reset()
+        started = time.monotonic()
+        response = client.post(f'/api/monthly-exams/{exam_id}/individual-exams/{paper_id}/marks', json={
+            'send_sms': True,
+            'students': [{'user_id': student_id, 'marks_obtained': 40 + index % 60}
+                         for index, student_id in enumerate(student_ids)]
+        })
+        queued_in = time.monotonic() - started
+        if response.status_code != 200:
+            print(f"marks       request failed: {response.status_code} {response.get_json()}")
+        else:
+            with app.app_context():
+                attempted = drain_outbox(sms_outbox)
+            elapsed = time.monotonic() - started
+            report('marks', attempted, elapsed, gateway, args.workers, f'  (queued in {queued_in:.2f}s)')
+
+    with app.app_context():
+        pending = models.SmsOutbox.query.filter_by(status='pending').count()
+        if pending:
+            print(f"⏳ {pending} messages left pending for retry after gateway errors")
+    gateway.stop()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+pytest fixtures: the app on a scratch SQLite database, recreated for every test
+
+    python -m pytest tests/test_ranking_snapshot.py tests/test_bulk_upsert.py ...
+
+The other scripts in tests/ talk to a running server and are not pytest tests.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# services/__init__ opens the legacy SQLite helper at import time; keep it out of the checkout
+LEGACY_DB_DIR = tempfile.mkdtemp(prefix='smartgardenhub-tests-')
+os.environ.setdefault('SQLITE_BASE_DIR', LEGACY_DB_DIR)
+atexit.register(shutil.rmtree, LEGACY_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    scratch = tmp_path_factory.mktemp('app')
+    import config
+    from app import create_app
+
+    class TestingConfig(config.DevelopmentConfig):
+        TESTING = True
+        DEBUG = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{scratch / 'test.db'}"
+        SESSION_FILE_DIR = str(scratch / 'flask_session')
+        SMS_DISPATCHER_THREAD = False
+
+    config.config_by_name['testing'] = TestingConfig
+    return create_app('testing')
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    """Empty tables and an app context for each test"""
+    from models import db
+    from services.sms_templates import invalidate_sms_templates
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Saved templates are cached per process; the previous test's rows are gone
+        invalidate_sms_templates()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client_as(app):
+    """Test client logged in as a user"""
+    def login(user, role=None):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['user_role'] = role or user.role.value
+        return client
+    return login
+
+
+@pytest.fixture
+def make_batch(database):
+    """Teacher, batch and students enrolled in it; returns (teacher, batch, students)"""
+    from models import Batch, User, UserRole
+
+    def make(student_count=3, sms_count=100, guardian_phones=None):
+        teacher = User(phoneNumber='01700000000', first_name='Test', last_name='Teacher',
+                       role=UserRole.TEACHER, sms_count=sms_count)
+        batch = Batch(name='Test Batch', start_date=date(2025, 1, 1))
+        teacher.batches.append(batch)
+        database.session.add_all([teacher, batch])
+        students = []
+        for index in range(student_count):
+            guardian_phone = guardian_phones[index] if guardian_phones else f'0181{index:07d}'
+            student = User(phoneNumber=f'0171{index:07d}', first_name=f'Student{index}', last_name='Test',
+                           role=UserRole.STUDENT, guardian_phone=guardian_phone)
+            student.batches.append(batch)
+            students.append(student)
+        database.session.add_all(students)
+        database.session.commit()
+        return teacher, batch, students
+    return make
+
+
+@pytest.fixture
+def make_monthly_exam(database):
+    """Monthly exam of a batch with papers of the given full marks; returns (exam, papers)"""
+    from models import IndividualExam, MonthlyExam
+
+    def make(batch, teacher, paper_marks=(100,), month=10, year=2025):
+        exam = MonthlyExam(title=f'Exam {month}/{year}', month=month, year=year, total_marks=sum(paper_marks),
+                           pass_marks=0, start_date=datetime(year, month, 1), end_date=datetime(year, month, 28),
+                           batch_id=batch.id, created_by=teacher.id)
+        database.session.add(exam)
+        database.session.flush()
+        papers = [IndividualExam(monthly_exam_id=exam.id, title=f'Paper {index + 1}', subject=f'Subject {index + 1}',
+                                 marks=marks, exam_date=datetime(year, month, 5), duration=60, order_index=index + 1)
+                  for index, marks in enumerate(paper_marks)]
+        database.session.add_all(papers)
+        database.session.commit()
+        return exam, papers
+    return make
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the BulkSMSBD gateway
+
+Speaks the /api/smsapi and /api/getBalanceApi protocol with configurable
+latency, error rates and a request rate limit, so SMS sending can be tested
+and benchmarked without the real bulksmsbd.net API or its balance.
+
+    python tests/fake_bulksmsbd.py --port 8765 --latency 150 --error-rate 0.02
+    export BULKSMSBD_API_URL=http://127.0.0.1:8765/api/smsapi
+    export BULKSMSBD_BALANCE_URL=http://127.0.0.1:8765/api/getBalanceApi
+
+GET /stats returns request and occupancy counters; GET /reset clears them.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.sms_segments import sms_segments
+
+# BulkSMSBD response codes
+ACCEPTED = 202
+INVALID_NUMBER = 1001
+MISSING_FIELDS = 1003
+INTERNAL_ERROR = 1005
+BALANCE_INSUFFICIENT = 1007
+
+NUMBER_PATTERN = re.compile(r'^8801[3-9]\d{8}$')
+
+
+class FakeBulkSMSBD:
+    """
+    In-process fake gateway on a background thread.
+
+    latency and jitter are in milliseconds; error_rate is the share of send
+    requests answered with response_code 1005, http_error_rate the share
+    answered with HTTP 500; rate_limit (requests per second, 0 = unlimited)
+    answers excess requests with HTTP 429. balance is charged one credit
+    per number per SMS segment.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0, error_rate=0.0, http_error_rate=0.0,
+                 rate_limit=0, balance=1000000, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.rate_limit = rate_limit
+        self.balance = balance
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.reset()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/api'
+
+    @property
+    def api_url(self):
+        return f'{self.base_url}/smsapi'
+
+    @property
+    def balance_url(self):
+        return f'{self.base_url}/getBalanceApi'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-bulksmsbd', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {
+                'requests': 0, 'messages': 0, 'accepted': 0, 'gateway_errors': 0, 'http_errors': 0,
+                'rate_limited': 0, 'invalid_numbers': 0, 'in_flight': 0, 'peak_in_flight': 0, 'busy_seconds': 0.0
+            }
+            self.started_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, balance=self.balance, elapsed_seconds=time.monotonic() - self.started_at)
+        stats['busy_seconds'] = round(stats['busy_seconds'], 3)
+        stats['elapsed_seconds'] = round(stats['elapsed_seconds'], 3)
+        return stats
+
+    def _allow_request(self):
+        """Sliding one-second window for rate_limit"""
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] >= 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.rate_limit:
+            return False
+        self.recent.append(now)
+        return True
+
+    def send(self, params):
+        """(HTTP status, body) for one /smsapi request"""
+        numbers = [number for number in params.get('number', '').split(',') if number]
+        message = params.get('message', '')
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['messages'] += len(numbers)
+            if not self._allow_request():
+                self.counters['rate_limited'] += 1
+                return 429, {'response_code': 429, 'error_message': 'Too many requests'}
+
+            roll = self.random.random()
+            if roll < self.http_error_rate:
+                self.counters['http_errors'] += 1
+                return 500, {'error_message': 'Internal Server Error'}
+            if roll < self.http_error_rate + self.error_rate:
+                self.counters['gateway_errors'] += 1
+                return 200, {'response_code': INTERNAL_ERROR, 'error_message': 'Internal Error'}
+
+            if not params.get('api_key') or not params.get('senderid') or not numbers or not message:
+                return 200, {'response_code': MISSING_FIELDS, 'error_message': 'Please Required all fields'}
+            if not all(NUMBER_PATTERN.match(number) for number in numbers):
+                self.counters['invalid_numbers'] += 1
+                return 200, {'response_code': INVALID_NUMBER, 'error_message': 'Invalid Number'}
+
+            cost = sms_segments(message) * len(numbers)
+            if cost > self.balance:
+                return 200, {'response_code': BALANCE_INSUFFICIENT, 'error_message': 'Balance Insufficient'}
+            self.balance -= cost
+            self.counters['accepted'] += len(numbers)
+            return 200, {'response_code': ACCEPTED, 'message_id': uuid.uuid4().hex,
+                         'success_message': 'SMS Submitted Successfully', 'error_message': ''}
+
+    def _handler_class(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real gateway
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+                if url.path.endswith('/smsapi'):
+                    self._timed(lambda: gateway.send(params))
+                elif url.path.endswith('/getBalanceApi'):
+                    self._timed(lambda: (200, {'response_code': ACCEPTED, 'balance': gateway.balance}))
+                elif url.path == '/stats':
+                    self._reply(200, gateway.stats())
+                elif url.path == '/reset':
+                    gateway.reset()
+                    self._reply(200, {'reset': True})
+                else:
+                    self._reply(404, {'error_message': 'Not found'})
+
+            do_POST = do_GET
+
+            def _timed(self, respond):
+                with gateway.lock:
+                    gateway.counters['in_flight'] += 1
+                    gateway.counters['peak_in_flight'] = max(gateway.counters['peak_in_flight'],
+                                                             gateway.counters['in_flight'])
+                started = time.monotonic()
+                try:
+                    delay = gateway.latency + (gateway.random.uniform(-1, 1) * gateway.jitter if gateway.jitter else 0)
+                    if delay > 0:
+                        time.sleep(delay / 1000)
+                    status, body = respond()
+                    self._reply(status, body)
+                finally:
+                    with gateway.lock:
+                        gateway.counters['in_flight'] -= 1
+                        gateway.counters['busy_seconds'] += time.monotonic() - started
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local BulkSMSBD stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=100, help='Response latency in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='Random +/- latency in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of sends answered with code 1005')
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='Share of sends answered with HTTP 500')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second before HTTP 429 (0 = off)')
+    parser.add_argument('--balance', type=int, default=1000000)
+    args = parser.parse_args()
+
+    gateway = FakeBulkSMSBD(args.host, args.port, args.latency, args.jitter, args.error_rate, args.http_error_rate,
+                            args.rate_limit, args.balance)
+    print(f"📨 Fake BulkSMSBD listening on {gateway.base_url} (latency {args.latency:g}ms, "
+          f"errors {args.error_rate:.0%}, HTTP errors {args.http_error_rate:.0%}, rate limit {args.rate_limit or 'off'})")
+    try:
+        gateway.server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Fake BulkSMSBD stopped")
+        print(json.dumps(gateway.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
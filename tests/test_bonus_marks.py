@@ -0,0 +1,53 @@
+"""
+Bonus marks live in monthly_bonus_marks; saving them updates rankings, legacy Settings blobs migrate
+"""
+from models import MonthlyBonusMark, Settings
+from services.bonus_marks import (LEGACY_BONUS_KEY_PREFIX, get_bonus_marks, migrate_settings_bonus_marks,
+                                  save_bonus_marks)
+from services.ranking_service import get_ranking_snapshot
+
+
+def test_save_inserts_then_updates(database, make_batch, make_monthly_exam):
+    teacher, batch, students = make_batch(3)
+    exam, papers = make_monthly_exam(batch, teacher)
+
+    assert save_bonus_marks(exam.id, {students[0].id: 2, students[1].id: 3}, updated_by=teacher.id) == 2
+    database.session.commit()
+    save_bonus_marks(exam.id, {students[1].id: 5, students[2].id: 1})
+    database.session.commit()
+
+    assert get_bonus_marks(exam.id) == {students[0].id: 2, students[1].id: 5, students[2].id: 1}
+    assert get_bonus_marks(exam.id, [students[1].id]) == {students[1].id: 5}
+    assert MonthlyBonusMark.query.count() == 3
+
+
+def test_update_route_refreshes_ranking(database, make_batch, make_monthly_exam, client_as):
+    teacher, batch, students = make_batch(2)
+    exam, papers = make_monthly_exam(batch, teacher)
+    get_ranking_snapshot(exam)
+
+    response = client_as(teacher).post(f'/api/monthly-exams/{exam.id}/update-bonus', json={
+        'bonus_data': [{'user_id': students[0].id, 'bonus_marks': 4}, {'user_id': students[1].id, 'bonus_marks': 1.5}]
+    })
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['updated_count'] == 2
+
+    database.session.expire_all()
+    _, rankings = get_ranking_snapshot(exam)
+    assert {rank['user_id']: rank['bonus_marks'] for rank in rankings} == {students[0].id: 4, students[1].id: 1.5}
+
+
+def test_legacy_settings_are_migrated(database, make_batch, make_monthly_exam):
+    teacher, batch, students = make_batch(2)
+    exam, papers = make_monthly_exam(batch, teacher)
+    database.session.add_all([
+        Settings(key=f'{LEGACY_BONUS_KEY_PREFIX}{exam.id}',
+                 value={str(students[0].id): '3', str(students[1].id): 'n/a', '9999': 2}),
+        Settings(key=f'{LEGACY_BONUS_KEY_PREFIX}9999', value={str(students[0].id): 1}),
+    ])
+    database.session.commit()
+
+    assert migrate_settings_bonus_marks() == 1
+    assert get_bonus_marks(exam.id) == {students[0].id: 3.0}
+    assert Settings.query.filter(Settings.key.like(f'{LEGACY_BONUS_KEY_PREFIX}%')).count() == 0
+    assert migrate_settings_bonus_marks() == 0
@@ -0,0 +1,79 @@
+"""
+bulk_upsert inserts new keys, updates existing ones and stays within SQLite's variable limit
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from models import MonthlyMark, SmsDailyStat
+from services.bulk_upsert import SQLITE_MAX_VARIABLES, bulk_upsert, get_chunk_size
+from services.marks_service import MARK_KEY_COLUMNS, MARK_UPSERT_COLUMNS
+
+STAT_KEY = ('day', 'sent_by', 'status')
+
+
+@pytest.fixture
+def statements(database):
+    """Parameters of every INSERT executed while the test runs"""
+    executed = []
+    engine = database.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            executed.append(parameters)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def mark_row(user_id, marks):
+    return {'monthly_exam_id': 1, 'individual_exam_id': 1, 'user_id': user_id, 'marks_obtained': marks,
+            'total_marks': 100, 'percentage': float(marks), 'grade': 'A', 'gpa': 4.0, 'is_absent': False,
+            'remarks': '', 'created_at': None, 'updated_at': None}
+
+
+def test_inserts_then_updates(database):
+    rows = [{'day': date(2025, 10, 1), 'sent_by': sender, 'status': 'sent', 'count': 1, 'cost': 1}
+            for sender in range(3)]
+    assert bulk_upsert(SmsDailyStat, rows, STAT_KEY, update_columns=('count', 'cost')) == 3
+    database.session.commit()
+
+    rows[0].update(count=5, cost=7)
+    rows.append({'day': date(2025, 10, 1), 'sent_by': 9, 'status': 'failed', 'count': 2, 'cost': 0})
+    bulk_upsert(SmsDailyStat, rows, STAT_KEY, update_columns=('count', 'cost'))
+    database.session.commit()
+
+    stats = {(stat.sent_by, stat.status): (stat.count, stat.cost) for stat in SmsDailyStat.query.all()}
+    assert stats == {(0, 'sent'): (5, 7), (1, 'sent'): (1, 1), (2, 'sent'): (1, 1), (9, 'failed'): (2, 0)}
+
+
+def test_increment_columns_add_to_existing(database):
+    row = {'day': date(2025, 10, 1), 'sent_by': 0, 'status': 'sent', 'count': 2, 'cost': 3}
+    bulk_upsert(SmsDailyStat, [row], STAT_KEY, increment_columns=('count', 'cost'))
+    bulk_upsert(SmsDailyStat, [row], STAT_KEY, increment_columns=('count', 'cost'))
+    database.session.commit()
+
+    stat = SmsDailyStat.query.one()
+    assert (stat.count, stat.cost) == (4, 6)
+
+
+def test_wide_rows_are_chunked_within_sqlite_limit(database, statements):
+    rows = [mark_row(user_id, 50) for user_id in range(1, 301)]
+    bulk_upsert(MonthlyMark, rows, MARK_KEY_COLUMNS, update_columns=MARK_UPSERT_COLUMNS)
+    bulk_upsert(MonthlyMark, [mark_row(user_id, 80) for user_id in range(1, 301)],
+                MARK_KEY_COLUMNS, update_columns=MARK_UPSERT_COLUMNS)
+    database.session.commit()
+
+    assert statements and all(len(parameters) <= SQLITE_MAX_VARIABLES for parameters in statements)
+    assert MonthlyMark.query.count() == 300
+    assert {mark.marks_obtained for mark in MonthlyMark.query.all()} == {80}
+
+
+def test_chunk_size_only_capped_on_sqlite():
+    assert get_chunk_size('sqlite', 12) == SQLITE_MAX_VARIABLES // 12
+    assert get_chunk_size('sqlite', 3) == 333
+    assert get_chunk_size('sqlite', 2000) == 1
+    assert get_chunk_size('sqlite', 1, chunk_size=100) == 100
+    assert get_chunk_size('mysql', 12) == 500
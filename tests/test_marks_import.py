@@ -0,0 +1,122 @@
+"""
+Marks import: a roll number x paper grid uploaded as CSV or XLSX is stored with a per-row error report
+"""
+import io
+
+import openpyxl
+import pytest
+
+from models import MonthlyMark
+from services.marks_import import map_header, parse_roll_value
+from services.roll_numbers import allocate_roll_numbers
+
+
+@pytest.fixture
+def rolled_exam(database, make_batch, make_monthly_exam):
+    """Three students with roll numbers 1-3 and papers of 100 and 50 marks"""
+    teacher, batch, students = make_batch(3)
+    exam, papers = make_monthly_exam(batch, teacher, paper_marks=(100, 50))
+    allocate_roll_numbers(exam, rule='inherit')
+    database.session.commit()
+    return teacher, students, exam, papers
+
+
+def upload(client, exam, filename, content):
+    return client.post(f'/api/monthly-exams/{exam.id}/marks/import',
+                       data={'file': (io.BytesIO(content), filename)}, content_type='multipart/form-data')
+
+
+def stored_marks(exam):
+    return {(mark.user_id, mark.individual_exam_id): (mark.marks_obtained, mark.is_absent)
+            for mark in MonthlyMark.query.filter_by(monthly_exam_id=exam.id).all()}
+
+
+def test_parse_roll_value():
+    assert parse_roll_value('12') == (12, None)
+    assert parse_roll_value(' 12.0 ') == (12, None)
+    assert parse_roll_value(7.0) == (7, None)
+    assert parse_roll_value(12.7) == (None, 'roll number must be a whole number')
+    assert parse_roll_value('nan') == (None, 'roll number must be a whole number')
+    assert parse_roll_value(None) == (None, 'invalid roll number')
+    assert parse_roll_value('R-12') == (None, 'invalid roll number')
+
+
+def test_map_header(rolled_exam):
+    teacher, students, exam, (first, second) = rolled_exam
+    roll_index, columns, errors = map_header(['Name', 'Roll No', 'paper 1', str(second.id), 'Subject 1', 'Bonus'],
+                                             [first, second])
+    assert roll_index == 1
+    assert columns == {2: first, 3: second}
+    assert errors == ['Column "Subject 1": paper appears more than once',
+                      'Column "Bonus": no matching paper in this monthly exam']
+
+
+def test_csv_import(rolled_exam, client_as):
+    teacher, students, exam, (first, second) = rolled_exam
+    content = '\n'.join([
+        'Roll,Name,Paper 1,Subject 2',
+        '1,Student0,78,AB',
+        '2.0,Student1,101,40',
+        '12.7,Nobody,50,20',
+        '1,Student0 again,10,10',
+        '9,Unknown,50,20',
+        ',,,',
+        '3,Student2,,',
+    ]).encode('utf-8-sig')
+
+    response = upload(client_as(teacher), exam, 'marks.csv', content)
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert (data['imported_count'], data['rows_processed'], data['students_updated']) == (3, 6, 2)
+    assert data['row_errors'] == [
+        {'row': 3, 'roll_number': 2, 'errors': ['Paper 1: marks (101.0) cannot exceed total marks (100)']},
+        {'row': 4, 'roll_number': '12.7', 'errors': ['roll number must be a whole number']},
+        {'row': 5, 'roll_number': 1, 'errors': ['roll number appears more than once']},
+        {'row': 6, 'roll_number': 9, 'errors': ['no active student with this roll number']},
+    ]
+    assert data['error_count'] == 4
+
+    assert stored_marks(exam) == {
+        (students[0].id, first.id): (78, False),
+        (students[0].id, second.id): (0, True),
+        (students[1].id, second.id): (40, False),
+    }
+
+
+def test_xlsx_import(rolled_exam, client_as):
+    teacher, students, exam, (first, second) = rolled_exam
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in (['roll_number', str(first.id), 'subject 2', 'Remarks'],
+                [1, 55, 30, 'good'],
+                [2.0, 'absent', 'x'],
+                [3.5, 60, 25]):
+        sheet.append(row)
+    content = io.BytesIO()
+    workbook.save(content)
+
+    response = upload(client_as(teacher), exam, 'Marks.XLSX', content.getvalue())
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert data['header_errors'] == ['Column "Remarks": no matching paper in this monthly exam']
+    assert data['row_errors'] == [
+        {'row': 3, 'roll_number': 2, 'errors': ['Paper 2: invalid marks format (x)']},
+        {'row': 4, 'roll_number': 3.5, 'errors': ['roll number must be a whole number']},
+    ]
+
+    assert stored_marks(exam) == {
+        (students[0].id, first.id): (55, False),
+        (students[0].id, second.id): (30, False),
+        (students[1].id, first.id): (0, True),
+    }
+
+
+def test_unusable_file_is_rejected(rolled_exam, client_as):
+    teacher, students, exam, papers = rolled_exam
+    client = client_as(teacher)
+
+    assert upload(client, exam, 'marks.txt', b'roll,Paper 1\n1,50').status_code == 400
+    response = upload(client, exam, 'marks.csv', b'Name,Paper 1\nStudent0,50')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Header must contain a roll number column'
+    assert MonthlyMark.query.count() == 0
@@ -0,0 +1,46 @@
+"""
+Monthly results count attendance against the batch's class days, as the rankings do
+"""
+from datetime import date
+
+from models import Attendance, AttendanceStatus, Holiday, MonthlyResult
+from services.calendar_service import get_working_dates, get_working_days
+
+
+def test_attendance_percentage_uses_working_days(database, make_batch, client_as):
+    teacher, batch, (student,) = make_batch(1)
+    database.session.add_all([
+        Attendance(user_id=student.id, batch_id=batch.id, date=date(2025, 10, day), status=status)
+        for day, status in ((1, AttendanceStatus.PRESENT), (2, AttendanceStatus.LATE), (3, AttendanceStatus.ABSENT))
+    ])
+    database.session.commit()
+
+    response = client_as(teacher).post('/api/results/calculate', json={'batch_id': batch.id, 'month': 10, 'year': 2025})
+    assert response.status_code == 201, response.get_json()
+
+    working_days = get_working_days(batch, 10, 2025)
+    assert working_days == 23
+    result = MonthlyResult.query.filter_by(user_id=student.id, month=10, year=2025).one()
+    assert result.attendance_percentage == round(2 / working_days * 100, 2)
+
+
+def test_attendance_off_class_days_is_not_counted(database, make_batch, client_as):
+    teacher, batch, (student,) = make_batch(1)
+    database.session.add(Holiday(date=date(2025, 10, 6), batch_id=batch.id, title='Durga Puja'))
+    database.session.commit()
+    working_dates = get_working_dates(batch, 10, 2025)
+    assert len(working_dates) == 22
+
+    # Present on every class day, plus a Saturday and the holiday
+    extra_days = (date(2025, 10, 4), date(2025, 10, 6))
+    database.session.add_all([
+        Attendance(user_id=student.id, batch_id=batch.id, date=day, status=AttendanceStatus.PRESENT)
+        for day in working_dates + extra_days
+    ])
+    database.session.commit()
+
+    response = client_as(teacher).post('/api/results/calculate', json={'batch_id': batch.id, 'month': 10, 'year': 2025})
+    assert response.status_code == 201, response.get_json()
+
+    result = MonthlyResult.query.filter_by(user_id=student.id, month=10, year=2025).one()
+    assert result.attendance_percentage == 100
@@ -0,0 +1,151 @@
+"""
+Ranking snapshots must always equal a full recompute, whatever write happened since they were built
+"""
+import json
+
+import pytest
+
+from models import MonthlyRankingSnapshot, User, UserRole
+from services.ranking_service import compute_comprehensive_ranking, get_ranking_snapshot
+
+
+def normalized(rankings):
+    """Rankings as stored JSON, so int-keyed dicts compare equal to their stored form"""
+    return json.loads(json.dumps(rankings, sort_keys=True, default=str))
+
+
+def snapshot_and_recompute(database, exam):
+    database.session.expire_all()
+    _, snapshot_rankings = get_ranking_snapshot(exam)
+    recomputed = [rank.to_dict() for rank in compute_comprehensive_ranking(exam)]
+    return normalized(snapshot_rankings), normalized(recomputed)
+
+
+def ranked_ids(rankings):
+    return {rank['user_id'] for rank in rankings}
+
+
+@pytest.fixture
+def ranked_exam(make_batch, make_monthly_exam, client_as):
+    """Batch of three students with marks for one paper and a built snapshot"""
+    teacher, batch, students = make_batch(3)
+    exam, (paper,) = make_monthly_exam(batch, teacher)
+    response = client_as(teacher).post(f'/api/monthly-exams/{exam.id}/individual-exams/{paper.id}/marks', json={
+        'students': [{'user_id': student.id, 'marks_obtained': 50 + index * 10}
+                     for index, student in enumerate(students)]
+    })
+    assert response.status_code == 200, response.get_json()
+    get_ranking_snapshot(exam)
+    assert MonthlyRankingSnapshot.query.filter_by(monthly_exam_id=exam.id).one().is_fresh
+    return teacher, batch, students, exam, paper
+
+
+def test_snapshot_matches_recompute_after_marks(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).post(f'/api/monthly-exams/{exam.id}/individual-exams/{paper.id}/marks', json={
+        'students': [{'user_id': students[0].id, 'marks_obtained': 95}]
+    })
+    assert response.status_code == 200
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert snapshot[0]['user_id'] == students[0].id
+
+
+def test_enrolled_student_appears_in_ranking(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    newcomer = User(phoneNumber='01719999999', first_name='New', last_name='Student', role=UserRole.STUDENT)
+    database.session.add(newcomer)
+    database.session.commit()
+
+    response = client_as(teacher).post(f'/api/batches/{batch.id}/students', json={'student_id': newcomer.id})
+    assert response.status_code == 200, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert newcomer.id in ranked_ids(snapshot)
+
+
+def test_removed_student_leaves_ranking(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).delete(f'/api/batches/{batch.id}/students/{students[1].id}')
+    assert response.status_code == 200, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert students[1].id not in ranked_ids(snapshot)
+
+
+def test_archived_student_leaves_ranking(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).post(f'/api/students/{students[2].id}/archive', json={'reason': 'Left'})
+    assert response.status_code == 200, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert students[2].id not in ranked_ids(snapshot)
+
+    response = client_as(teacher).post(f'/api/students/{students[2].id}/restore')
+    assert response.status_code == 200, response.get_json()
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert students[2].id in ranked_ids(snapshot)
+
+
+def test_archived_batch_empties_ranking(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).post(f'/api/batches/{batch.id}/archive', json={})
+    assert response.status_code == 200, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed == []
+
+
+def test_renamed_student_shows_in_ranking(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).put(f'/api/students/{students[0].id}', json={'firstName': 'Renamed'})
+    assert response.status_code == 200, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+    assert any(rank['student_name'].startswith('Renamed') for rank in snapshot)
+
+
+def test_duplicate_entries_count_once(database, ranked_exam, client_as):
+    teacher, batch, students, exam, paper = ranked_exam
+    response = client_as(teacher).post(f'/api/monthly-exams/{exam.id}/individual-exams/{paper.id}/marks', json={
+        'students': [{'user_id': students[0].id, 'marks_obtained': 40},
+                     {'user_id': students[0].id, 'marks_obtained': 45},
+                     {'user_id': students[1].id, 'marks_obtained': 70}]
+    })
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['saved_count'] == 2
+    assert response.get_json()['message'] == 'Successfully saved 2 marks'
+
+    snapshot, recomputed = snapshot_and_recompute(database, exam)
+    assert snapshot == recomputed
+
+
+def test_deleting_previous_month_refreshes_next_month(database, make_monthly_exam, ranked_exam, client_as,
+                                                      monkeypatch):
+    teacher, batch, students, previous_exam, paper = ranked_exam
+    client = client_as(teacher)
+    response = client.post(f'/api/monthly-exams/{previous_exam.id}/generate-ranking')
+    assert response.status_code == 200, response.get_json()
+
+    next_exam, (next_paper,) = make_monthly_exam(batch, teacher, month=11)
+    response = client.post(f'/api/monthly-exams/{next_exam.id}/individual-exams/{next_paper.id}/marks', json={
+        'students': [{'user_id': student.id, 'marks_obtained': 70} for student in students]
+    })
+    assert response.status_code == 200, response.get_json()
+    _, rankings = get_ranking_snapshot(next_exam)
+    assert all(rank['previous_position'] for rank in rankings)
+
+    # The purge job runs in a thread; the soft delete alone hides the exam
+    monkeypatch.setattr('routes.monthly_exams.start_job', lambda app, job_id, target: None)
+    response = client.delete(f'/api/monthly-exams/{previous_exam.id}?cascade=true')
+    assert response.status_code == 202, response.get_json()
+
+    snapshot, recomputed = snapshot_and_recompute(database, next_exam)
+    assert snapshot == recomputed
+    assert all(rank['previous_position'] is None and rank['roll_number'] is None for rank in snapshot)
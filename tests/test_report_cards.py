@@ -0,0 +1,62 @@
+"""
+PDF report cards keep Bengali text: every character is drawn from an embedded font and mapped back to Unicode
+"""
+import logging
+import re
+
+from services.pdf_report import render_report_card
+
+STUDENT_NAME = 'রহিম আহমেদ'
+PAPER_TITLE = 'পদার্থবিজ্ঞান ১ম পত্র'
+INSTITUTE_NAME = 'জি এস টিচিং সেন্টার'
+
+
+def make_card(**overrides):
+    card = {
+        'institute_name': INSTITUTE_NAME, 'exam_title': 'মাসিক পরীক্ষা', 'batch_name': 'HSC ব্যাচ',
+        'month': 10, 'year': 2025, 'total_students': 30, 'max_attendance_marks': 23,
+        'user_id': 7, 'student_name': STUDENT_NAME, 'roll_number': 3, 'position': 2, 'previous_position': 5,
+        'papers': [
+            {'title': PAPER_TITLE, 'subject': 'Physics', 'total_marks': 100, 'marks_obtained': 78,
+             'is_absent': False, 'grade': 'A'},
+            {'title': 'Chemistry', 'subject': 'রসায়ন', 'total_marks': 50, 'marks_obtained': '-',
+             'is_absent': True, 'grade': '-'},
+        ],
+        'total_exam_marks': 78, 'total_possible_marks': 150, 'attendance_marks': 20, 'final_total': 98,
+        'total_possible': 173, 'percentage': 56.65, 'grade': 'B', 'gpa': 3.0
+    }
+    card.update(overrides)
+    return card
+
+
+def unicode_text(pdf_bytes):
+    """Characters the PDF's ToUnicode maps give back for its glyphs"""
+    chars = set()
+    for stream in re.findall(rb'stream\r?\n(.*?)\r?\nendstream', pdf_bytes, re.S):
+        if b'beginbfchar' not in stream:
+            continue
+        for target in re.findall(rb'<[0-9A-Fa-f]+>\s*<([0-9A-Fa-f]+)>', stream):
+            chars.update(bytes.fromhex(target.decode()).decode('utf-16-be'))
+    return chars
+
+
+def test_bengali_text_survives(caplog):
+    with caplog.at_level(logging.WARNING, logger='fpdf'):
+        filename, pdf_bytes = render_report_card(make_card())
+
+    assert filename == '002_roll_3_7.pdf'
+    assert pdf_bytes.startswith(b'%PDF-')
+    assert b'NotoSerifBengali' in pdf_bytes
+    assert not [record for record in caplog.records if 'missing' in record.getMessage()]
+    bengali = set(STUDENT_NAME + PAPER_TITLE + INSTITUTE_NAME) - {' '}
+    assert bengali <= unicode_text(pdf_bytes)
+    assert b'????' not in pdf_bytes
+
+
+def test_many_papers_continue_on_new_pages():
+    papers = [{'title': f'Paper {index}', 'subject': 'গণিত', 'total_marks': 100, 'marks_obtained': index,
+               'is_absent': False, 'grade': 'A'} for index in range(60)]
+    filename, pdf_bytes = render_report_card(make_card(papers=papers, roll_number=None, previous_position=None))
+
+    assert filename == '002_roll_na_7.pdf'
+    assert len(re.findall(rb'/Type /Page\b', pdf_bytes)) > 1
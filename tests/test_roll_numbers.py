@@ -0,0 +1,121 @@
+"""
+Roll number allocation: explicit assignments are checked against the rolls others keep, rules fill in the rest
+"""
+import pytest
+
+from models import MonthlyRanking, User, UserRole
+from services.ranking_service import get_ranking_snapshot
+from services.roll_numbers import RollNumberError, allocate_from_mapping, allocate_inherited, allocate_roll_numbers
+
+
+def add_rankings(database, exam, rolls, is_final=False):
+    """MonthlyRanking rows holding {user_id: roll_number} for an exam"""
+    database.session.add_all([
+        MonthlyRanking(monthly_exam_id=exam.id, user_id=user_id, position=index + 1, roll_number=roll_number,
+                       is_final=is_final)
+        for index, (user_id, roll_number) in enumerate(rolls.items())
+    ])
+    database.session.commit()
+
+
+@pytest.fixture
+def two_months(database, make_batch, make_monthly_exam):
+    """Four students with September and October exams; returns (teacher, students, september, october)"""
+    teacher, batch, students = make_batch(4)
+    september, _ = make_monthly_exam(batch, teacher, month=9)
+    october, _ = make_monthly_exam(batch, teacher, month=10)
+    return teacher, students, september, october
+
+
+def assignments(rolls):
+    return [{'user_id': user_id, 'roll_number': roll_number} for user_id, roll_number in rolls.items()]
+
+
+def test_mapping_may_not_reuse_a_kept_roll(database, two_months):
+    teacher, students, september, october = two_months
+    add_rankings(database, september, {students[1].id: 2}, is_final=True)
+    add_rankings(database, october, {students[0].id: 1})
+
+    with pytest.raises(RollNumberError) as stored:
+        allocate_from_mapping(october, assignments({students[2].id: 1}))
+    assert stored.value.errors == [f'roll number 1 would be shared by students {students[0].id}, {students[2].id}']
+
+    with pytest.raises(RollNumberError) as inherited:
+        allocate_from_mapping(october, assignments({students[2].id: 2}))
+    assert inherited.value.errors == [f'roll number 2 would be shared by students {students[1].id}, {students[2].id}']
+
+    # Swapping the two kept rolls frees both
+    swap = {students[0].id: 2, students[1].id: 1}
+    assert allocate_from_mapping(october, assignments(swap)) == swap
+
+
+def test_mapping_rejects_students_outside_the_batch(database, two_months):
+    teacher, students, september, october = two_months
+    outsider = User(phoneNumber='01719999999', first_name='Other', last_name='Student', role=UserRole.STUDENT)
+    database.session.add(outsider)
+    database.session.commit()
+
+    with pytest.raises(RollNumberError) as error:
+        allocate_from_mapping(october, assignments({students[0].id: 1, outsider.id: 2}) + [
+            {'user_id': students[1].id, 'roll_number': 0}, {'user_id': students[0].id, 'roll_number': 3},
+            {'user_id': 'x', 'roll_number': 4}
+        ])
+    assert error.value.errors == [
+        f'roll number 0 for student {students[1].id} must be positive',
+        f'student {students[0].id} is listed more than once',
+        'entry 5 needs integer user_id and roll_number',
+        f'student {outsider.id} is not enrolled in this batch',
+    ]
+
+
+def test_rejected_route_writes_nothing(database, two_months, client_as):
+    teacher, students, september, october = two_months
+    add_rankings(database, october, {students[0].id: 1})
+
+    response = client_as(teacher).post(f'/api/monthly-exams/{october.id}/assign-roll-numbers', json={
+        'roll_assignments': assignments({students[1].id: 3, students[2].id: 1})
+    })
+    assert response.status_code == 400
+    assert 'roll number 1 would be shared' in response.get_json()['error']
+    assert {ranking.user_id: ranking.roll_number for ranking in MonthlyRanking.query.all()} == {students[0].id: 1}
+
+
+def test_inherit_renumbers_taken_rolls_after_the_highest(database, two_months):
+    teacher, students, september, october = two_months
+    add_rankings(database, september, {students[0].id: 2, students[1].id: 2, students[3].id: 5}, is_final=True)
+
+    # students[1]'s roll is already taken by students[0]; students[2] has none; both follow roll 5 in name order
+    assert allocate_inherited(october) == {students[0].id: 2, students[3].id: 5,
+                                           students[1].id: 6, students[2].id: 7}
+
+
+def test_inherit_ignores_rankings_that_are_not_final(database, two_months):
+    teacher, students, september, october = two_months
+    add_rankings(database, september, {students[0].id: 4})
+
+    assert allocate_inherited(october) == {student.id: index + 1 for index, student in enumerate(students)}
+
+
+def test_position_rule_stores_the_ranking_positions(database, two_months, client_as):
+    teacher, students, september, october = two_months
+    (paper,) = october.individual_exams
+    response = client_as(teacher).post(f'/api/monthly-exams/{october.id}/individual-exams/{paper.id}/marks', json={
+        'students': [{'user_id': student.id, 'marks_obtained': marks}
+                     for student, marks in zip(students, (60, 90, 75, 40))]
+    })
+    assert response.status_code == 200, response.get_json()
+
+    assert allocate_roll_numbers(october, rule='position') == 4
+    database.session.commit()
+
+    _, rankings = get_ranking_snapshot(october)
+    positions = {rank['user_id']: rank['position'] for rank in rankings}
+    assert positions == {students[1].id: 1, students[2].id: 2, students[0].id: 3, students[3].id: 4}
+    stored = {ranking.user_id: (ranking.roll_number, ranking.position) for ranking in MonthlyRanking.query.all()}
+    assert stored == {user_id: (position, position) for user_id, position in positions.items()}
+
+
+def test_unknown_rule(two_months):
+    teacher, students, september, october = two_months
+    with pytest.raises(RollNumberError):
+        allocate_roll_numbers(october, rule='alphabetical')
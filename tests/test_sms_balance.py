@@ -0,0 +1,123 @@
+"""
+SMS balance ledger: reservations, settlement and compaction keep the balance exact
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models import Settings, SmsBalanceEntry, SmsOutbox
+from services import sms_outbox
+from services.sms_balance import (DEFAULT_OPENING_BALANCE, LEGACY_BALANCE_KEY, compact_ledger, get_sms_balance,
+                                  reserve_sms_credits, set_sms_balance, settle_sms_credits)
+from services.sms_outbox import MAX_ATTEMPTS, create_sms_job, dispatch_pending, enqueue_sms
+
+
+class FakeGateway:
+    """Fails every message to a number in failing"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def send_many(self, messages):
+        return [{'success': phone not in self.failing, 'error': 'rejected'} for phone, message in messages]
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    fake = FakeGateway()
+    monkeypatch.setattr(sms_outbox, 'get_gateway', lambda: fake)
+    return fake
+
+
+def queue_job(database, messages):
+    """One SMS job with (phone, cost) messages, reserved as the routes do"""
+    job = create_sms_job()
+    for phone, cost in messages:
+        enqueue_sms(phone, 'Hello', job=job, cost=cost)
+    reserved = reserve_sms_credits(job)
+    database.session.commit()
+    return job, reserved
+
+
+def drain(database):
+    """Dispatch until every message is sent or has failed, skipping retry backoff"""
+    while SmsOutbox.query.filter(SmsOutbox.status.in_(('pending', 'sending'))).count():
+        SmsOutbox.query.filter_by(status='pending').update({'next_attempt_at': datetime.utcnow()})
+        database.session.commit()
+        dispatch_pending()
+
+
+def test_opening_balance_comes_from_legacy_setting(database):
+    database.session.add(Settings(key=LEGACY_BALANCE_KEY, value={'balance': 250}, category='sms'))
+    database.session.commit()
+    assert get_sms_balance() == 250
+    assert SmsBalanceEntry.query.one().kind == 'opening'
+
+
+def test_reservation_is_spent_until_settled(database):
+    job, reserved = queue_job(database, [('01710000001', 1), ('01710000002', 2)])
+    assert reserved == 3
+    assert get_sms_balance() == DEFAULT_OPENING_BALANCE - 3
+
+
+def test_settle_returns_credits_of_undelivered_messages(database, gateway):
+    gateway.failing.add('01710000002')
+    job, reserved = queue_job(database, [('01710000001', 1), ('01710000002', 2), ('01710000003', 3)])
+    drain(database)
+
+    assert SmsOutbox.query.filter_by(status='failed').one().attempts == MAX_ATTEMPTS
+    settle = SmsBalanceEntry.query.filter_by(job_id=job.id, kind='settle').one()
+    assert settle.delta == 2
+    assert get_sms_balance() == DEFAULT_OPENING_BALANCE - 4
+    assert job.result['credits_used'] == 4
+
+
+def test_job_is_settled_only_once(database, gateway):
+    job, reserved = queue_job(database, [('01710000001', 1)])
+    drain(database)
+
+    with pytest.raises(IntegrityError):
+        settle_sms_credits(job.id)
+        database.session.flush()
+    database.session.rollback()
+    assert get_sms_balance() == DEFAULT_OPENING_BALANCE - 1
+
+
+def test_messages_outside_jobs_are_debited_when_sent(database, gateway):
+    enqueue_sms('01710000001', 'Hello', cost=2)
+    database.session.commit()
+    assert get_sms_balance() == DEFAULT_OPENING_BALANCE
+
+    drain(database)
+    assert get_sms_balance() == DEFAULT_OPENING_BALANCE - 2
+
+
+def test_adjustment_sets_balance(database):
+    assert set_sms_balance(100) == 100
+    assert SmsBalanceEntry.query.filter_by(kind='adjustment').one().delta == 100 - DEFAULT_OPENING_BALANCE
+
+
+def test_compaction_keeps_balance_and_open_reservations(database, gateway):
+    settled_job, _ = queue_job(database, [('01710000001', 1)])
+    drain(database)
+    open_job, _ = queue_job(database, [('01710000002', 5)])
+    set_sms_balance(500)
+    balance = get_sms_balance()
+
+    SmsBalanceEntry.query.update({'created_at': datetime.utcnow() - timedelta(days=2)})
+    database.session.commit()
+    assert compact_ledger() > 1
+
+    assert get_sms_balance() == balance
+    assert SmsBalanceEntry.query.filter_by(job_id=open_job.id, kind='reserve').count() == 1
+    assert SmsBalanceEntry.query.filter_by(job_id=settled_job.id).count() == 0
+
+
+def test_balance_route_reads_ledger(database, make_batch, client_as):
+    teacher, batch, students = make_batch(0)
+    set_sms_balance(321)
+
+    response = client_as(teacher).get('/api/sms/balance')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['balance'] == 321
@@ -0,0 +1,108 @@
+"""
+Coalescing: siblings sharing a guardian phone get one SMS, never more credits than separate messages
+"""
+from models import Settings, SmsOutbox
+from services.sms_coalesce import SmsDraft, coalesce_sms, join_values
+from services.sms_segments import sms_segments
+from services.sms_templates import DEFAULT_SMS_TEMPLATES, SAVED_TEMPLATE_PREFIX
+
+ABSENT = '{student_name} absent on {date} ({batch_name})'
+GUARDIAN = '01810000001'
+
+
+def absent(name, user_id, phone=GUARDIAN, batch='Physics'):
+    return SmsDraft(phone, ABSENT, {'student_name': name, 'date': '05/10/2025', 'batch_name': batch}, user_id)
+
+
+def test_join_values():
+    assert join_values(['Rahim']) == 'Rahim'
+    assert join_values(['Rahim', 'Karim']) == 'Rahim & Karim'
+    assert join_values(['Rahim', 'Karim', 'Rahim', 'Salma']) == 'Rahim, Karim & Salma'
+
+
+def test_siblings_share_one_message():
+    (sms,) = coalesce_sms([absent('Rahim', 1), absent('Karim', 2)], max_segments=2)
+    assert sms.phone == GUARDIAN
+    assert sms.message == 'Rahim & Karim absent on 05/10/2025 (Physics)'
+    assert sms.user_ids == [1, 2] and sms.user_id == 1
+    assert sms.cost == sms_segments(sms.message) == 1
+
+
+def test_phone_formats_of_one_number_are_grouped():
+    messages = coalesce_sms([absent('Rahim', 1, '01810000001'), absent('Karim', 2, '+8801810000001')],
+                            max_segments=2)
+    assert len(messages) == 1
+    assert messages[0].phone == '01810000001'
+
+
+def test_other_numbers_are_not_merged_and_keep_order():
+    messages = coalesce_sms([absent('Rahim', 1, '01810000002'), absent('Salma', 3, '01810000001'),
+                             absent('Karim', 2, '01810000002')], max_segments=2)
+    assert [(sms.phone, sms.user_ids) for sms in messages] == [('01810000002', [1, 2]), ('01810000001', [3])]
+
+
+def test_identical_messages_are_sent_once():
+    (sms,) = coalesce_sms([absent('Rahim', 1), absent('Rahim', 1)], max_segments=2)
+    assert sms.message == 'Rahim absent on 05/10/2025 (Physics)'
+    assert sms.user_ids == [1]
+
+
+def test_two_differing_placeholders_are_joined_by_line():
+    (sms,) = coalesce_sms([absent('Rahim', 1, batch='Physics'), absent('Karim', 2, batch='Chemistry')],
+                          max_segments=2)
+    assert sms.message == ('Rahim absent on 05/10/2025 (Physics)\n'
+                           'Karim absent on 05/10/2025 (Chemistry)')
+    assert sms.user_ids == [1, 2]
+    assert sms.cost == 1
+
+
+def test_messages_beyond_budget_stay_separate():
+    names = [f'Student number {index} with a rather long name' for index in range(6)]
+    drafts = [absent(name, index) for index, name in enumerate(names)]
+    messages = coalesce_sms(drafts, max_segments=1)
+
+    assert len(messages) > 1
+    assert all(sms.cost == sms_segments(sms.message) <= 1 for sms in messages)
+    assert sorted(user_id for sms in messages for user_id in sms.user_ids) == list(range(6))
+    assert sum(sms.cost for sms in messages) <= len(drafts)
+
+
+def test_bulk_send_queues_one_sms_per_guardian(database, make_batch, client_as):
+    teacher, batch, students = make_batch(3)
+    for student in students[:2]:
+        student.phoneNumber = GUARDIAN
+    students[2].phoneNumber = '01810000002'
+    database.session.commit()
+
+    response = client_as(teacher).post('/api/sms/send-bulk', json={
+        'batch_id': batch.id, 'recipient_type': 'individual', 'student_ids': [student.id for student in students],
+        'use_custom_message': True, 'custom_message': '{student_name} has an exam tomorrow'
+    })
+    assert response.status_code == 202, response.get_json()
+    data = response.get_json()['data']
+    assert (data['queued'], data['total_recipients'], data['credits_reserved']) == (2, 3, 2)
+
+    messages = {outbox.phone_number: outbox.message for outbox in SmsOutbox.query.all()}
+    assert messages == {GUARDIAN: 'Student0 & Student1 has an exam tomorrow',
+                        '01810000002': 'Student2 has an exam tomorrow'}
+
+
+def test_attendance_sms_use_resolved_templates(database, make_batch, client_as):
+    teacher, batch, students = make_batch(2, guardian_phones=[GUARDIAN, GUARDIAN])
+    database.session.add(Settings(key=f'{SAVED_TEMPLATE_PREFIX}attendance_absent',
+                                  value={'message': '{student_name} missed {batch_name} on {date}'}))
+    database.session.commit()
+
+    response = client_as(teacher).post('/api/attendance/bulk', json={
+        'batchId': batch.id, 'date': '2025-10-06', 'sendSms': True,
+        'attendanceData': [{'userId': students[0].id, 'status': 'present'},
+                           {'userId': students[1].id, 'status': 'absent'}]
+    })
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['sms_queued'] == 3
+
+    present = DEFAULT_SMS_TEMPLATES['attendance_present'].format(student_name='Student0 Test', batch_name=batch.name)
+    absent = f'Student1 Test missed {batch.name} on 06/10/2025'
+    messages = {outbox.phone_number: outbox.message for outbox in SmsOutbox.query.all()}
+    assert messages == {students[0].phoneNumber: present, students[1].phoneNumber: absent,
+                        GUARDIAN: present + '\n' + absent}
@@ -0,0 +1,85 @@
+"""
+SMS log keyset pages: following next_cursor visits every log once, newest first
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import SmsLog, SmsStatus
+from routes.sms import decode_log_cursor, encode_log_cursor
+
+START = datetime(2025, 10, 1, 9, 0)
+
+
+@pytest.fixture
+def logs(database, make_batch):
+    """25 logs in groups of three sharing a created_at, alternating sent and failed"""
+    teacher, batch, students = make_batch(0)
+    rows = [SmsLog(phone_number=f'0171{index:07d}', message=f'Message {index}', sent_by=teacher.id,
+                   status=SmsStatus.SENT if index % 2 else SmsStatus.FAILED,
+                   created_at=START + timedelta(seconds=index // 3, microseconds=0 if index % 6 < 3 else 500))
+            for index in range(25)]
+    database.session.add_all(rows)
+    database.session.commit()
+    return teacher, rows
+
+
+def newest_first(rows):
+    return [log.id for log in sorted(rows, key=lambda log: (log.created_at, log.id), reverse=True)]
+
+
+def walk(client, per_page, **filters):
+    """Ids of every page reached by following next_cursor"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = dict(filters, per_page=per_page, **({'cursor': cursor} if cursor else {}))
+        response = client.get('/api/sms/logs', query_string=params)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        ids.extend(log['id'] for log in body['data'])
+        pages += 1
+        cursor = body['pagination']['next_cursor']
+        assert body['pagination']['has_next'] == (cursor is not None)
+        if cursor is None:
+            return ids, pages
+
+
+def test_cursor_round_trip(logs):
+    teacher, rows = logs
+    for log in rows:
+        assert decode_log_cursor(encode_log_cursor(log)) == (log.created_at, log.id)
+
+
+@pytest.mark.parametrize('per_page', [1, 4, 6, 25, 100])
+def test_pages_have_no_duplicates_or_gaps(logs, client_as, per_page):
+    teacher, rows = logs
+    ids, pages = walk(client_as(teacher), per_page)
+    assert ids == newest_first(rows)
+    assert pages == max(1, -(-len(rows) // per_page))
+
+
+def test_filtered_pages(logs, client_as):
+    teacher, rows = logs
+    ids, pages = walk(client_as(teacher), 4, status='sent')
+    assert ids == newest_first([log for log in rows if log.status == SmsStatus.SENT])
+
+
+def test_new_logs_do_not_shift_later_pages(database, logs, client_as):
+    teacher, rows = logs
+    client = client_as(teacher)
+    first = client.get('/api/sms/logs', query_string={'per_page': 10}).get_json()
+
+    database.session.add(SmsLog(phone_number='01719999999', message='Newer', sent_by=teacher.id,
+                                status=SmsStatus.SENT, created_at=START + timedelta(days=1)))
+    database.session.commit()
+
+    second = client.get('/api/sms/logs', query_string={
+        'per_page': 10, 'cursor': first['pagination']['next_cursor']
+    }).get_json()
+    assert [log['id'] for log in first['data'] + second['data']] == newest_first(rows)[:20]
+
+
+def test_invalid_cursor(logs, client_as):
+    teacher, rows = logs
+    response = client_as(teacher).get('/api/sms/logs', query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
@@ -0,0 +1,119 @@
+"""
+Outbox delivery: each due message is claimed once, failures retry with exponential backoff
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import SmsLog, SmsOutbox, SmsStatus
+from services import sms_outbox
+from services.sms_outbox import (BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, CLAIM_TIMEOUT, MAX_ATTEMPTS,
+                                 claim_due_messages, dispatch_pending, enqueue_sms, get_backoff)
+
+
+class FakeGateway:
+    """Records what was sent; succeeds unless the phone number is in failing"""
+
+    def __init__(self):
+        self.sent = []
+        self.failing = set()
+
+    def send_many(self, messages):
+        self.sent.extend(messages)
+        return [{'success': False, 'error': 'gateway down'} if phone in self.failing else {'success': True}
+                for phone, message in messages]
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    fake = FakeGateway()
+    monkeypatch.setattr(sms_outbox, 'get_gateway', lambda: fake)
+    return fake
+
+
+def queue(database, *phones):
+    rows = [enqueue_sms(phone, f'Hello {phone}') for phone in phones]
+    database.session.commit()
+    return [row.id for row in rows]
+
+
+def make_due(database, outbox_id):
+    """Move a retry's next attempt into the past, as if its backoff had elapsed"""
+    outbox = database.session.get(SmsOutbox, outbox_id)
+    outbox.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    database.session.commit()
+
+
+def test_backoff_doubles_and_is_capped():
+    assert get_backoff(1) == timedelta(seconds=BACKOFF_BASE_SECONDS)
+    assert get_backoff(2) == timedelta(seconds=BACKOFF_BASE_SECONDS * 2)
+    assert get_backoff(4) == timedelta(seconds=BACKOFF_BASE_SECONDS * 8)
+    assert get_backoff(20) == timedelta(seconds=BACKOFF_MAX_SECONDS)
+
+
+def test_due_messages_are_claimed_once(database):
+    ids = queue(database, '01710000001', '01710000002', '01710000003')
+
+    first = claim_due_messages(limit=2)
+    second = claim_due_messages()
+    assert [outbox.id for outbox in first] == ids[:2]
+    assert [outbox.id for outbox in second] == ids[2:]
+    assert claim_due_messages() == []
+    assert {outbox.status for outbox in SmsOutbox.query.all()} == {'sending'}
+
+
+def test_stale_claim_is_reclaimed(database):
+    (outbox_id,) = queue(database, '01710000001')
+    (claimed,) = claim_due_messages()
+    token = claimed.claim_token
+
+    claimed.claimed_at = datetime.utcnow() - CLAIM_TIMEOUT - timedelta(seconds=1)
+    database.session.commit()
+    (reclaimed,) = claim_due_messages()
+    assert reclaimed.id == outbox_id
+    assert reclaimed.claim_token != token
+
+
+def test_successful_send(database, gateway):
+    queue(database, '01710000001')
+    assert dispatch_pending() == 1
+
+    outbox = SmsOutbox.query.one()
+    assert (outbox.status, outbox.attempts, outbox.claim_token) == ('sent', 1, None)
+    assert outbox.sms_log.status == SmsStatus.SENT
+    assert gateway.sent == [('01710000001', 'Hello 01710000001')]
+    assert dispatch_pending() == 0
+
+
+def test_failure_retries_with_backoff_until_max_attempts(database, gateway):
+    (outbox_id,) = queue(database, '01710000001')
+    gateway.failing.add('01710000001')
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        before = datetime.utcnow()
+        assert dispatch_pending() == 1
+        outbox = database.session.get(SmsOutbox, outbox_id)
+        assert (outbox.status, outbox.attempts, outbox.last_error) == ('pending', attempt, 'gateway down')
+        assert outbox.next_attempt_at >= before + get_backoff(attempt)
+        assert outbox.next_attempt_at <= datetime.utcnow() + get_backoff(attempt)
+
+        assert dispatch_pending() == 0  # Not due again until the backoff has passed
+        make_due(database, outbox_id)
+
+    assert dispatch_pending() == 1
+    outbox = database.session.get(SmsOutbox, outbox_id)
+    assert (outbox.status, outbox.attempts) == ('failed', MAX_ATTEMPTS)
+    assert SmsLog.query.one().status == SmsStatus.FAILED
+    assert len(gateway.sent) == MAX_ATTEMPTS
+
+
+def test_retry_that_succeeds(database, gateway):
+    (outbox_id,) = queue(database, '01710000001')
+    gateway.failing.add('01710000001')
+    dispatch_pending()
+
+    gateway.failing.clear()
+    make_due(database, outbox_id)
+    assert dispatch_pending() == 1
+    outbox = database.session.get(SmsOutbox, outbox_id)
+    assert (outbox.status, outbox.attempts, outbox.last_error) == ('sent', 2, None)
@@ -0,0 +1,90 @@
+"""
+SMS segments: GSM-7 / UCS-2 lengths and part limits, and templates measured without rendering
+"""
+import pytest
+
+from services.sms_segments import (GSM7, UCS2, SmsTemplateMeter, cost_sms_batch, get_template_meter, measure_sms,
+                                   sms_segments)
+from services.sms_templates import render_sms_template
+
+
+@pytest.mark.parametrize('text, units, segments', [
+    ('', 0, 0),
+    ('a' * 160, 160, 1),
+    ('a' * 161, 161, 2),
+    ('a' * 306, 306, 2),
+    ('a' * 307, 307, 3),
+])
+def test_gsm7_boundaries(text, units, segments):
+    stats = measure_sms(text)
+    assert (stats['encoding'], stats['units'], stats['segments']) == (GSM7, units, segments)
+
+
+@pytest.mark.parametrize('text, units, segments', [
+    ('অ' * 70, 70, 1),
+    ('অ' * 71, 71, 2),
+    ('অ' * 134, 134, 2),
+    ('অ' * 135, 135, 3),
+])
+def test_ucs2_boundaries(text, units, segments):
+    stats = measure_sms(text)
+    assert (stats['encoding'], stats['units'], stats['segments']) == (UCS2, units, segments)
+
+
+def test_gsm7_extension_characters_take_two_septets():
+    stats = measure_sms('a' * 158 + '€')
+    assert (stats['encoding'], stats['units'], stats['char_count'], stats['segments']) == (GSM7, 160, 159, 1)
+    assert measure_sms('a' * 159 + '€')['segments'] == 2
+    assert measure_sms('{}[]~|^\\')['units'] == 16
+    # A character outside GSM-7 switches the whole message to UCS-2, where extensions are single units
+    assert measure_sms('€ ৳')['encoding'] == UCS2
+    assert measure_sms('€ ৳')['units'] == 3
+
+
+def test_surrogate_pairs_count_as_two_units():
+    stats = measure_sms('😀' * 35)
+    assert (stats['encoding'], stats['units'], stats['char_count'], stats['segments']) == (UCS2, 70, 35, 1)
+    assert measure_sms('😀' * 36)['segments'] == 2
+    assert measure_sms('অ' * 69 + '😀')['segments'] == 2
+
+
+def test_remaining_and_credits():
+    assert measure_sms('a' * 150)['remaining'] == 10
+    assert measure_sms('a' * 200)['remaining'] == 306 - 200
+    assert measure_sms('a' * 200)['limit_per_sms'] == 153
+    assert sms_segments('') == 1
+    assert sms_segments('অ' * 71) == 2
+
+
+@pytest.mark.parametrize('template, values', [
+    ('{student_name} absent on {date} ({batch_name})',
+     {'student_name': 'Rahim', 'date': '05/10/2025', 'batch_name': 'Physics'}),
+    ('{student_name} absent on {date} ({batch_name})',
+     {'student_name': 'রহিম', 'date': '05/10/2025', 'batch_name': 'Physics'}),
+    ('{student_name} উপস্থিত ({batch_name})', {'student_name': 'Rahim', 'batch_name': 'HSC 2025'}),
+    ('Fee {amount} due [{student_name}] {note}', {'amount': 1500, 'student_name': 'Karim', 'note': '€ ~'}),
+    ('{message}', {'message': 'a' * 152 + '{'}),
+    ('{name} {name} sent {emoji}', {'name': 'Salma', 'emoji': '😀' * 30}),
+    ('Missing {student_name} and {date}', {'student_name': 'Rahim'}),
+    ('No placeholders at all', {}),
+])
+def test_meter_matches_measuring_the_rendered_message(template, values):
+    meter = SmsTemplateMeter(template)
+    assert meter.measure(**values) == measure_sms(render_sms_template(template, values))
+    assert meter.segments(**values) == sms_segments(render_sms_template(template, values))
+    assert get_template_meter(template).measure(**values) == meter.measure(**values)
+
+
+def test_cost_sms_batch_mixes_texts_and_templates():
+    summary = cost_sms_batch([
+        'Hello',
+        'a' * 161,
+        ('{student_name} উপস্থিত', {'student_name': 'Rahim'}),
+        '',
+    ])
+    assert summary == {
+        'messages': 4,
+        'segments': 1 + 2 + 1 + 1,
+        'by_encoding': {GSM7: {'messages': 3, 'segments': 4}, UCS2: {'messages': 1, 'segments': 1}},
+    }
+    assert cost_sms_batch([]) == {'messages': 0, 'segments': 0, 'by_encoding': {}}
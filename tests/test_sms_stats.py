@@ -0,0 +1,85 @@
+"""
+SMS daily statistics: the rollup kept by the dispatcher matches a rebuild from sms_logs
+"""
+from datetime import datetime
+
+import pytest
+
+from models import SmsDailyStat, SmsLog, SmsOutbox, SmsStatus
+from services import sms_outbox
+from services.sms_outbox import dispatch_pending, enqueue_sms
+from services.sms_stats import NO_SENDER, add_sms_stats, backfill_sms_stats
+
+
+class FakeGateway:
+    """Fails every message to a number in failing"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def send_many(self, messages):
+        return [{'success': phone not in self.failing, 'error': 'rejected'} for phone, message in messages]
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    fake = FakeGateway()
+    monkeypatch.setattr(sms_outbox, 'get_gateway', lambda: fake)
+    return fake
+
+
+def rollup():
+    return {(stat.day, stat.sent_by, stat.status): (stat.count, stat.cost) for stat in SmsDailyStat.query.all()}
+
+
+def drain(database):
+    """Dispatch until every message is sent or has failed, skipping retry backoff"""
+    while SmsOutbox.query.filter(SmsOutbox.status.in_(('pending', 'sending'))).count():
+        SmsOutbox.query.filter_by(status='pending').update({'next_attempt_at': datetime.utcnow()})
+        database.session.commit()
+        dispatch_pending()
+
+
+def test_dispatcher_rollup_matches_backfill(database, make_batch, gateway):
+    teacher, batch, students = make_batch(0)
+    gateway.failing.add('01710000003')
+    for index in range(1, 6):
+        enqueue_sms(f'0171000000{index}', 'Hello', sent_by=teacher.id, cost=index)
+    enqueue_sms('01710000009', 'System notice', cost=2)
+    database.session.commit()
+    drain(database)
+
+    today = datetime.utcnow().date()
+    live = rollup()
+    assert live == {
+        (today, teacher.id, 'sent'): (4, 1 + 2 + 4 + 5),
+        (today, teacher.id, 'failed'): (1, 0),
+        (today, NO_SENDER, 'sent'): (1, 2),
+    }
+
+    backfill_sms_stats()
+    assert rollup() == live
+
+
+def test_pending_logs_are_not_counted(database):
+    log = SmsLog(phone_number='01710000001', message='Hello', status=SmsStatus.PENDING, cost=1)
+    database.session.add(log)
+    assert add_sms_stats([log]) == 0
+    database.session.commit()
+    assert rollup() == {}
+
+
+def test_statistics_route_reads_rollup(database, make_batch, client_as, gateway):
+    teacher, batch, students = make_batch(0)
+    gateway.failing.add('01710000002')
+    for phone in ('01710000001', '01710000002', '01710000003'):
+        enqueue_sms(phone, 'Hello', sent_by=teacher.id)
+    database.session.commit()
+    drain(database)
+
+    response = client_as(teacher).get('/api/sms/statistics')
+    assert response.status_code == 200, response.get_json()
+    statistics = response.get_json()['data']['statistics']
+    assert (statistics['total_sent'], statistics['total_failed']) == (2, 1)
+    assert statistics['success_rate'] == round(2 / 3 * 100, 2)
+    assert statistics['top_senders'] == [{'name': teacher.full_name, 'count': 2}]
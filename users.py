@@ -7,6 +7,7 @@ from flask_bcrypt import generate_password_hash
 from models import db, User, UserRole, Batch, user_batches, exam_batches
 from utils.auth import login_required, require_role, get_current_user, check_user_access
 from utils.response import success_response, error_response, paginated_response, serialize_user
+from services.ranking_service import invalidate_rankings_for_batches
 from sqlalchemy import or_
 import re
 from datetime import datetime
@@ -210,6 +211,9 @@ def update_user(user_id):
         if not data:
             return error_response('Request data is required', 400)
         
+        # Rankings of the user's batches show their name and status
+        ranked_batch_ids = {batch.id for batch in user.batches}
+        
         # Update allowed fields
         updatable_fields = ['first_name', 'last_name', 'email', 'date_of_birth', 
                            'address', 'guardian_phone', 'emergency_contact', 'profile_image']
@@ -251,6 +255,7 @@ def update_user(user_id):
             user.batches.clear()
             user.batches.extend(batches)
         
+        invalidate_rankings_for_batches(ranked_batch_ids | {batch.id for batch in user.batches})
         db.session.commit()
         
         user_data = serialize_user(user)
@@ -279,6 +284,7 @@ def delete_user(user_id):
         # Soft delete by deactivating
         user.is_active = False
         user.updated_at = datetime.utcnow()
+        invalidate_rankings_for_batches([batch.id for batch in user.batches])
         
         db.session.commit()
         
@@ -610,7 +616,7 @@ def get_student_monthly_exams():
         
         # Get monthly exams for student's batches
         monthly_exams = (MonthlyExam.query
-                       .filter(MonthlyExam.batch_id.in_(user_batch_ids))
+                       .filter(MonthlyExam.batch_id.in_(user_batch_ids), MonthlyExam.is_deleted == False)
                        .order_by(MonthlyExam.exam_date.desc())
                        .all())
         
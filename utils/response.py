@@ -52,6 +52,22 @@ def paginated_response(data, page, per_page, total, message="Data retrieved succ
     
     return jsonify(response), 200
 
+def cursor_paginated_response(data, per_page, next_cursor, message="Data retrieved successfully"):
+    """Create a keyset-paginated response; pass next_cursor back as ?cursor= for the next page"""
+    response = {
+        'success': True,
+        'message': message,
+        'data': serialize_data(data),
+        'pagination': {
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None
+        },
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    
+    return jsonify(response), 200
+
 def serialize_data(data):
     """Serialize data for JSON response"""
     if isinstance(data, (datetime, date)):